@@ -4,5 +4,16 @@ import logging
 # Set default logging handler to avoid "No handler found" warnings.
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 
+from .artifacts import *
 from .bot_click import *
+from .cache import *
+from .context import *
+from .displays import *
+from .inputs import *
+from .metrics import *
 from .mixins import *
+from .ocr import *
+from .preprocess import *
+from .recorder import *
+from .screen import *
+from .tracing import *
@@ -0,0 +1,41 @@
+"""Lazily imported heavy dependencies.
+cv2, numpy, pytesseract以及PIL在首次访问其属性时才真正import,
+所以import bot_click很快，且不依赖于可连接的$DISPLAY.
+仅处理录制frame的CLI/worker进程也不会为未用到的模块付出import时间.
+>>> from ._lazy import cv, np
+"""
+from __future__ import annotations
+
+import importlib.util
+import sys
+from types import ModuleType
+from typing import TYPE_CHECKING
+
+
+def lazy_import(name: str) -> ModuleType:
+    """返回module name,其代码在首次访问属性时才执行.已import的module直接返回."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+if TYPE_CHECKING:
+    import cv2 as cv
+    import numpy as np
+    import pytesseract
+    from PIL import Image, ImageGrab
+else:
+    cv = lazy_import("cv2")
+    np = lazy_import("numpy")
+    pytesseract = lazy_import("pytesseract")
+    Image = lazy_import("PIL.Image")
+    ImageGrab = lazy_import("PIL.ImageGrab")
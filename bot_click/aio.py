@@ -0,0 +1,240 @@
+"""asyncio API of bot_click.
+与bot_click module中的同名函数参数一致，但均为coroutine:
+等待时用asyncio.sleep而不阻塞event loop,截屏，图像匹配，Tesseract ocr以及键盘鼠标输入
+通过asyncio.to_thread在executor中执行(会复制当前contextvars).
+这样一个进程中的一个event loop即可同时驱动多个bot.
+>>> from bot_click import aio
+>>> point = await aio.locate_word("Username", confidence=0.5, timeout=30)
+>>> await aio.click(point)
+>>> index, point = await aio.wait_any(
+...     [NeedleWordCriteria("Save password?"), NeedleIMGCriteria(close_png, 0.8)],
+...     timeout=60,
+... )
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence, Tuple
+
+from . import bot_click
+from ._lazy import cv, np
+from .bot_click import (
+    _DEFAULT_CHECK_INTERVAL,
+    _DEFAULT_TIMEOUT,
+    NeedleIMGCriteria,
+    NeedleNotFoundError,
+    NeedleWordCriteria,
+    Point,
+)
+from .inputs import KeyTiming
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+
+async def click(
+    point: Optional[Point] = None, duration: Optional[float] = None
+) -> None:
+    """沿human-like轨迹移动鼠标到指定位置，并点击.
+    point:为None时，则为当前鼠标所在位置."""
+    await asyncio.to_thread(bot_click.click, point, duration)
+
+
+async def double_click(
+    point: Optional[Point] = None, duration: Optional[float] = None
+) -> None:
+    """沿human-like轨迹移动鼠标到指定位置，并双击.
+    point:为None时，则为当前鼠标所在位置."""
+    await asyncio.to_thread(bot_click.double_click, point, duration)
+
+
+async def send_keys(
+    message: str | List[str],
+    append_enter: bool = False,
+    log_screenshot_folder: Optional[Path] = None,
+    timing: Optional[KeyTiming] = None,
+    paste: bool = False,
+) -> None:
+    """向当前鼠标位置发送按键,参数见bot_click.send_keys."""
+    await asyncio.to_thread(
+        bot_click.send_keys,
+        message,
+        append_enter,
+        log_screenshot_folder,
+        timing=timing,
+        paste=paste,
+    )
+
+
+async def locate_img(
+    needle_path: Path,
+    confidence: float = 0.7,
+    timeout: int = _DEFAULT_TIMEOUT,
+    check_interval: int = _DEFAULT_CHECK_INTERVAL,
+) -> Point:
+    """在当前屏幕可见区域，查找与needle图像匹配度 >= confidence 的区域,返回中心点.
+    Raises: NeedleNotFoundException"""
+    template = await asyncio.to_thread(bot_click._load_needle, needle_path)
+    end = time.time() + timeout
+    while time.time() < end:
+        found, point = await asyncio.to_thread(
+            bot_click._is_img_onscreen, template, confidence, end
+        )
+        logger.info(f"wait for ({needle_path, confidence}) on screen: {found}")
+        if found:
+            logger.info(f"locate {needle_path} with {confidence} at {point}")
+            return point
+        await asyncio.sleep(check_interval)
+    raise NeedleNotFoundError(f"wait for ({needle_path, confidence}) timeout")
+
+
+async def click_by_img(
+    needle_path: Path,
+    confidence: float = 0.7,
+    duration: Optional[float] = None,
+    timeout: int = _DEFAULT_TIMEOUT,
+    check_interval: int = _DEFAULT_CHECK_INTERVAL,
+) -> None:
+    """查找needle图像并点击匹配区域中心,参数见bot_click.click_by_img.
+    Raises: NeedleNotFoundException"""
+    point = await locate_img(needle_path, confidence, timeout, check_interval)
+    await click(point, duration)
+
+
+async def locate_word(
+    text: str,
+    confidence: float = 0.7,
+    timeout: int = _DEFAULT_TIMEOUT,
+    ocr_config: str = "",
+    preprocess: Optional[Callable[[cv.Mat], cv.Mat]] = None,
+    check_interval: int = _DEFAULT_CHECK_INTERVAL,
+    min_similarity: float = 1.0,
+) -> Point:
+    """在当前屏幕可见区域查找单个单词（以空格分隔),返回confidence最高的.
+    参数见bot_click.locate_word.
+    Raises: NeedleNotFoundException"""
+    end = time.time() + timeout
+    while time.time() < end:
+        found, img = await asyncio.to_thread(
+            bot_click._is_word_onscreen,
+            text,
+            ocr_config,
+            preprocess,
+            end,
+            min_similarity,
+        )
+        logger.info(f"wait for {text} on screen: {found}")
+        if found:
+            boxes = await asyncio.to_thread(
+                bot_click._match_word_boxes,
+                img,
+                text,
+                confidence,
+                ocr_config,
+                min_similarity,
+            )
+            return bot_click._boxes_center(text, boxes)
+        await asyncio.sleep(check_interval)
+    raise NeedleNotFoundError(f"wait for {text} timeout")
+
+
+async def click_by_word(
+    text: str,
+    confidence: float = 0.7,
+    timeout: int = _DEFAULT_TIMEOUT,
+    duration: Optional[float] = None,
+    ocr_config: str = "",
+    preprocess: Optional[Callable[[cv.Mat], cv.Mat]] = None,
+    check_interval: int = _DEFAULT_CHECK_INTERVAL,
+    min_similarity: float = 1.0,
+) -> None:
+    """查找单词并点击,参数见bot_click.click_by_word.
+    Raises: NeedleNotFoundException"""
+    point = await locate_word(
+        text,
+        confidence,
+        timeout,
+        ocr_config,
+        preprocess,
+        check_interval,
+        min_similarity,
+    )
+    await click(point, duration)
+
+
+async def _check_once(
+    criteria: NeedleIMGCriteria | NeedleWordCriteria,
+    template: Optional[cv.Mat],
+    deadline: Optional[float] = None,
+    frame: Optional[NDArray[np.uint8]] = None,
+) -> Optional[Point]:
+    """对单个needle检查一次，在屏幕上则返回中心点，否则返回None.
+    template:图像needle事先加载好的模板.
+    deadline: 所属wait的timeout时刻，用于scheduler排序.
+    frame: 已截取的frame,为None时截屏."""
+    if isinstance(criteria, NeedleWordCriteria):
+        found, img = await asyncio.to_thread(
+            bot_click._is_word_onscreen,
+            criteria.text,
+            criteria.ocr_config,
+            criteria.preprocess,
+            deadline,
+            criteria.min_similarity,
+            frame,
+        )
+        if not found:
+            return None
+        try:
+            boxes = await asyncio.to_thread(
+                bot_click._match_word_boxes,
+                img,
+                criteria.text,
+                criteria.confidence,
+                criteria.ocr_config,
+                criteria.min_similarity,
+            )
+        except NeedleNotFoundError:
+            return None
+        return bot_click._boxes_center(criteria.text, boxes)
+    assert template is not None
+    found, point = await asyncio.to_thread(
+        bot_click._is_img_onscreen, template, criteria.confidence, deadline, frame
+    )
+    return point if found else None
+
+
+async def wait_any(
+    needles: Sequence[NeedleIMGCriteria | NeedleWordCriteria],
+    timeout: int = _DEFAULT_TIMEOUT,
+    check_interval: int = _DEFAULT_CHECK_INTERVAL,
+) -> Tuple[int, Point]:
+    """在指定时限内，等待任意一个needle出现在屏幕可见区域.
+    每一轮截屏一次，所有needle的检查在同一frame上并发执行，
+    相同的预处理(如Pipeline的公共前缀以及图像needle的BGR转换)只计算一次.
+    needles: NeedleIMGCriteria(图像)或者NeedleWordCriteria(文字)
+    return: (出现的needle在needles中的index, 中心点)，多个同时出现时取index最小的.
+    Raises: NeedleNotFoundError"""
+    templates = [
+        await asyncio.to_thread(bot_click._load_needle, needle.path)
+        if isinstance(needle, NeedleIMGCriteria)
+        else None
+        for needle in needles
+    ]
+    end = time.time() + timeout
+    while time.time() < end:
+        frame = await asyncio.to_thread(bot_click._screenshot_ndarray)
+        points = await asyncio.gather(
+            *(_check_once(n, t, end, frame) for n, t in zip(needles, templates))
+        )
+        for index, point in enumerate(points):
+            if point is not None:
+                logger.info(f"wait_any matched {needles[index]} at {point}")
+                return index, point
+        logger.info(f"wait for any of {needles} on screen: False")
+        await asyncio.sleep(check_interval)
+    raise NeedleNotFoundError(f"wait for any of {needles} timeout")
@@ -0,0 +1,293 @@
+"""Debug artifacts writer.
+ArtifactWriter 在后台thread中对已截取的frame描绘crosshair,编码并写入磁盘,
+队列是有界的，队列满时丢弃新的artifact而不阻塞bot的操作.
+编码格式可配置:PNG(压缩级别),JPEG(质量),WebP(质量).
+VideoArtifactWriter 将所有artifact写入同一个视频文件(cv.VideoWriter),并生成sidecar
+JSON索引(每个artifact对应的frame号)，存储与写入带宽远小于逐个图片文件.
+>>> set_artifact_writer(ArtifactWriter(JPEG(quality=80)))
+>>> set_artifact_writer(VideoArtifactWriter(Path(".debug/session.mp4")))
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from ._lazy import cv, np
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+
+class ImageFormat:
+    """artifact的编码格式."""
+
+    ext = "png"
+
+    def params(self) -> List[int]:
+        """cv.imencode所需的参数."""
+        return []
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.params()})"
+
+
+class PNG(ImageFormat):
+    """无损PNG.level:[0, 9],越大越小越慢."""
+
+    ext = "png"
+
+    def __init__(self, level: int = 3) -> None:
+        """level:压缩级别."""
+        self.level = level
+
+    def params(self) -> List[int]:
+        """cv.IMWRITE_PNG_COMPRESSION."""
+        return [cv.IMWRITE_PNG_COMPRESSION, self.level]
+
+
+class JPEG(ImageFormat):
+    """有损JPEG.quality:[0, 100]."""
+
+    ext = "jpg"
+
+    def __init__(self, quality: int = 90) -> None:
+        """quality:质量."""
+        self.quality = quality
+
+    def params(self) -> List[int]:
+        """cv.IMWRITE_JPEG_QUALITY."""
+        return [cv.IMWRITE_JPEG_QUALITY, self.quality]
+
+
+class WebP(ImageFormat):
+    """WebP.quality:[1, 100],大于100时为无损."""
+
+    ext = "webp"
+
+    def __init__(self, quality: int = 80) -> None:
+        """quality:质量."""
+        self.quality = quality
+
+    def params(self) -> List[int]:
+        """cv.IMWRITE_WEBP_QUALITY."""
+        return [cv.IMWRITE_WEBP_QUALITY, self.quality]
+
+
+def draw_crosshairs(
+    frame: NDArray[np.uint8], points: Sequence[Tuple[int, int]]
+) -> NDArray[np.uint8]:
+    """在frame上描绘crosshair(会修改frame)."""
+    for x, y in points:
+        cv.drawMarker(
+            frame,
+            (int(x), int(y)),
+            color=(255, 0, 255),
+            markerType=cv.MARKER_CROSS,
+            markerSize=40,
+            thickness=2,
+        )
+    return frame
+
+
+_Job = Tuple[Path, "NDArray[np.uint8]", Sequence[Tuple[int, int]], str]
+
+
+class ArtifactWriter:
+    """后台写入debug artifact.
+    format: 编码格式，默认PNG(3).
+    maxsize: 队列长度,满时丢弃新的artifact."""
+
+    def __init__(self, format: Optional[ImageFormat] = None, maxsize: int = 32) -> None:
+        """后台thread在首次submit时才启动."""
+        self.format = format or PNG()
+        self._queue: queue.Queue[Optional[_Job]] = queue.Queue(maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(
+        self,
+        file_path: Path,
+        frame: NDArray[np.uint8],
+        points: Sequence[Tuple[int, int]] = (),
+        label: str = "",
+    ) -> Optional[Path]:
+        """提交一个artifact:frame(RGB)上描绘points后，写入file_path.
+        frame在提交后不应再被修改.
+        label: artifact对应的操作，如'click'.
+        return: 写入的文件路径(后缀由format决定)，队列满被丢弃时返回None."""
+        file_path = self._target(file_path)
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((file_path, frame, points, label))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Artifact queue is full, drop {file_path}")
+            return None
+        return file_path
+
+    def _target(self, file_path: Path) -> Path:
+        """artifact实际写入的文件路径."""
+        return file_path.with_suffix(f".{self.format.ext}")
+
+    def flush(self) -> None:
+        """等待队列中所有artifact写入完成."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """写完队列中的artifact并停止后台thread."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="bot_click-artifacts", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(*job)
+            except Exception:
+                logger.exception(f"Failed to write artifact {job and job[0]}")
+            finally:
+                self._queue.task_done()
+
+    def _write(
+        self,
+        file_path: Path,
+        frame: NDArray[np.uint8],
+        points: Sequence[Tuple[int, int]],
+        label: str,
+    ) -> None:
+        img = np.asarray(cv.cvtColor(frame, cv.COLOR_RGB2BGR), np.uint8)
+        draw_crosshairs(img, points)
+        ok, encoded = cv.imencode(f".{self.format.ext}", img, self.format.params())
+        if not ok:
+            raise ValueError(f"Failed to encode {file_path} with {self.format}")
+        file_path.parent.mkdir(exist_ok=True, parents=True)
+        file_path.write_bytes(encoded.tobytes())
+        logger.info(f"save the artifact to {file_path}")
+
+
+class VideoArtifactWriter(ArtifactWriter):
+    """将artifact依次作为frame写入一个视频文件，并在close时写入sidecar JSON索引.
+    video_path: 视频文件路径，索引为同名的.json文件.
+    fps: 视频的帧率.每个artifact一帧，故fps决定回放时每一步停留的时间.
+    fourcc: 编码，默认mp4v.
+    所有frame会被缩放为第一帧的尺寸."""
+
+    def __init__(
+        self,
+        video_path: Path,
+        fps: float = 2,
+        fourcc: str = "mp4v",
+        maxsize: int = 32,
+    ) -> None:
+        """视频文件在写入第一帧时才创建."""
+        super().__init__(maxsize=maxsize)
+        self.video_path = video_path
+        self.fps = fps
+        self.fourcc = fourcc
+        self._video: Optional[cv.VideoWriter] = None
+        self._size: Optional[Tuple[int, int]] = None
+        self._index: List[Dict[str, Any]] = []
+
+    @property
+    def index_path(self) -> Path:
+        """sidecar JSON索引的路径."""
+        return self.video_path.with_suffix(".json")
+
+    def _target(self, file_path: Path) -> Path:
+        return self.video_path
+
+    def _write(
+        self,
+        file_path: Path,
+        frame: NDArray[np.uint8],
+        points: Sequence[Tuple[int, int]],
+        label: str,
+    ) -> None:
+        bgr = np.asarray(cv.cvtColor(frame, cv.COLOR_RGB2BGR), np.uint8)
+        img = draw_crosshairs(bgr, points)
+        if self._video is None:
+            self.video_path.parent.mkdir(exist_ok=True, parents=True)
+            self._size = (img.shape[1], img.shape[0])
+            self._video = cv.VideoWriter(
+                str(self.video_path),
+                cv.VideoWriter.fourcc(*self.fourcc),
+                self.fps,
+                self._size,
+            )
+            if not self._video.isOpened():
+                raise ValueError(f"Failed to open {self.video_path} ({self.fourcc})")
+        if (img.shape[1], img.shape[0]) != self._size:
+            self._video.write(cv.resize(img, self._size, interpolation=cv.INTER_AREA))
+        else:
+            self._video.write(img)
+        self._index.append(
+            {
+                "frame": len(self._index),
+                "time": time.time(),
+                "label": label,
+                "points": [[int(x), int(y)] for x, y in points],
+            }
+        )
+
+    def close(self) -> None:
+        """写完队列，关闭视频文件并写入sidecar JSON索引."""
+        super().close()
+        if self._video is None:
+            return
+        self._video.release()
+        self._video = None
+        index = {"video": self.video_path.name, "fps": self.fps, "frames": self._index}
+        self.index_path.write_text(json.dumps(index, indent=2, ensure_ascii=False))
+        logger.info(f"save the video {self.video_path} and index {self.index_path}")
+
+
+_writer: Optional[ArtifactWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_artifact_writer() -> ArtifactWriter:
+    """进程级的ArtifactWriter,首次调用时才新建,进程退出前会写完队列."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ArtifactWriter()
+                atexit.register(_writer.close)
+    return _writer
+
+
+def set_artifact_writer(writer: ArtifactWriter) -> None:
+    """替换进程级的ArtifactWriter,原writer会先写完队列."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            atexit.unregister(_writer.close)
+        _writer = writer
+        atexit.register(writer.close)
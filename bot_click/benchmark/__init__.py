@@ -0,0 +1,8 @@
+"""Offline benchmark of the lookups over recorded or synthetic screens.
+>>> python -m bot_click.benchmark generate /tmp/corpus --frames 20 --seed 1
+>>> python -m bot_click.benchmark run /tmp/corpus --psm 3 6 11 \\
+...     --preprocess none adaptive --confidence 0.5 0.7 --output report.json
+>>> python -m bot_click.benchmark run /tmp/corpus --baseline report.json
+"""
+from .harness import *
+from .synthetic import *
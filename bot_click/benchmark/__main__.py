@@ -0,0 +1,70 @@
+"""Command line entry: python -m bot_click.benchmark {generate,run}."""
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from .harness import PREPROCESS, compare, configs, format_reports, run_benchmark
+from .synthetic import generate_corpus
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """return: exit code,有regression时为1."""
+    parser = argparse.ArgumentParser(prog="python -m bot_click.benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="generate a synthetic corpus")
+    gen.add_argument("folder", type=Path)
+    gen.add_argument("--frames", type=int, default=20)
+    gen.add_argument("--width", type=int, default=1280)
+    gen.add_argument("--height", type=int, default=800)
+    gen.add_argument("--seed", type=int, default=None)
+
+    run = sub.add_parser("run", help="replay a corpus through the lookups")
+    run.add_argument("folder", type=Path)
+    run.add_argument("--psm", type=int, nargs="+", default=[3])
+    run.add_argument(
+        "--preprocess", nargs="+", default=["none"], choices=sorted(PREPROCESS)
+    )
+    run.add_argument("--confidence", type=float, nargs="+", default=[0.7])
+    run.add_argument("--repeat", type=int, default=1)
+    run.add_argument("--output", type=Path, help="write the JSON report")
+    run.add_argument("--baseline", type=Path, help="fail on regression against it")
+    run.add_argument("--tolerance", type=float, default=0.2)
+    run.add_argument("--accuracy-drop", type=float, default=0.0)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    if args.command == "generate":
+        cases = generate_corpus(
+            args.folder, args.frames, (args.width, args.height), seed=args.seed
+        )
+        print(f"corpus written to {cases}")
+        return 0
+
+    reports = run_benchmark(
+        args.folder,
+        configs(args.psm, args.preprocess, args.confidence),
+        repeat=args.repeat,
+    )
+    print(format_reports(reports))
+    if args.output:
+        args.output.write_text(json.dumps(reports, indent=2))
+    if args.baseline:
+        regressions = compare(
+            reports,
+            json.loads(args.baseline.read_text()),
+            args.tolerance,
+            args.accuracy_drop,
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
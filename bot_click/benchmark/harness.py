@@ -0,0 +1,274 @@
+"""Offline benchmark harness.
+将corpus中的frame通过FrameSource回放给真实的查找代码(_is_word_onscreen,
+_match_word_boxes, _is_img_onscreen,与bot_click.aio相同的单次检查路径，不含sleep),
+对每个配置(psm, preprocess, confidence)统计latency percentile, Tesseract调用次数,
+内存high-water mark以及准确率.
+内存high-water mark按配置分别统计:Linux上每个配置开始前重置进程的VmHWM,
+其它平台用tracemalloc统计Python/NumPy分配的峰值.
+"""
+from __future__ import annotations
+
+import collections
+import itertools
+import json
+import logging
+import time
+import tracemalloc
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Type
+
+import cv2 as cv
+import numpy as np
+from numpy.typing import NDArray
+from PIL import Image
+
+from .. import bot_click
+from ..bot_click import NeedleNotFoundError, Point
+from ..context import BotContext, use_context
+from ..metrics import Metrics, disable_metrics, enable_metrics, get_metrics
+from ..preprocess import NAMED_PIPELINES, get_frame_cache
+from ..screen import FrameSource
+
+logger = logging.getLogger(__name__)
+
+Case = collections.namedtuple("Case", ["frame", "kind", "query", "box"])
+BenchConfig = collections.namedtuple(
+    "BenchConfig", ["kind", "ocr_config", "preprocess", "confidence"]
+)
+
+
+# print_enhance_ocr_tip中推荐的预处理
+PREPROCESS: Dict[str, Optional[Callable[[cv.Mat], cv.Mat]]] = {
+    "none": None,
+    **NAMED_PIPELINES,
+}
+
+
+def load_corpus(folder: Path) -> List[Case]:
+    """读取folder下的cases.json."""
+    items = json.loads((folder / "cases.json").read_text())
+    return [
+        Case(folder / item["frame"], item["kind"], item["query"], tuple(item["box"]))
+        for item in items
+    ]
+
+
+def configs(
+    psms: Sequence[int] = (3,),
+    preprocesses: Sequence[str] = ("none",),
+    confidences: Sequence[float] = (0.7,),
+) -> List[BenchConfig]:
+    """配置矩阵:文字为psm * preprocess * confidence,图像仅为confidence."""
+    word = [
+        BenchConfig("word", f"--psm {psm}", name, confidence)
+        for psm, name, confidence in itertools.product(psms, preprocesses, confidences)
+    ]
+    img = [BenchConfig("img", "", "none", confidence) for confidence in confidences]
+    return word + img
+
+
+def _lookup_once(
+    case: Case, config: BenchConfig, template: Optional[cv.Mat]
+) -> Optional[Point]:
+    """用真实的查找代码检查一次，找到时返回中心点.
+    template: 图像case事先加载好的模板(与locate_img相同，不计入latency)."""
+    if case.kind == "img":
+        assert template is not None
+        found, point = bot_click._is_img_onscreen(template, config.confidence)
+        return point if found else None
+    preprocess = PREPROCESS[config.preprocess]
+    found, img = bot_click._is_word_onscreen(case.query, config.ocr_config, preprocess)
+    if not found:
+        return None
+    try:
+        boxes = bot_click._match_word_boxes(
+            img, case.query, config.confidence, config.ocr_config
+        )
+    except NeedleNotFoundError:
+        return None
+    return bot_click._boxes_center(case.query, boxes)
+
+
+def _inside(point: Point, box: Sequence[int]) -> bool:
+    x, y, w, h = box
+    return bool(x <= point.x <= x + w and y <= point.y <= y + h)
+
+
+_PROC_STATUS = Path("/proc/self/status")
+_PROC_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+
+def _proc_rss_kb() -> Dict[str, int]:
+    """/proc/self/status中的VmRSS与VmHWM(KB)."""
+    fields = {}
+    for line in _PROC_STATUS.read_text().splitlines():
+        name, _, value = line.partition(":")
+        if name in ("VmRSS", "VmHWM"):
+            fields[name] = int(value.split()[0])
+    return fields
+
+
+class _PeakMemory:
+    """with block期间的内存high-water mark(KB).
+    peak_kb: 期间的峰值.growth_kb: 峰值与开始时的差.
+    Linux 4.0+通过/proc/self/clear_refs将VmHWM重置为当前RSS,
+    不支持时用tracemalloc(只统计Python/NumPy的分配，且会拖慢分配)."""
+
+    def __init__(self) -> None:
+        self.peak_kb = self.growth_kb = 0
+        self._start_kb = 0
+        self._tracemalloc = False
+        self._started_tracing = False
+
+    def __enter__(self) -> _PeakMemory:
+        try:
+            _PROC_CLEAR_REFS.write_text("5")
+            self._start_kb = _proc_rss_kb()["VmRSS"]
+        except (OSError, KeyError):
+            self._tracemalloc = True
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._start_kb = tracemalloc.get_traced_memory()[0] // 1024
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        if self._tracemalloc:
+            self.peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+            if self._started_tracing:
+                tracemalloc.stop()
+        else:
+            self.peak_kb = _proc_rss_kb()["VmHWM"]
+        self.growth_kb = max(self.peak_kb - self._start_kb, 0)
+
+
+def run_benchmark(
+    folder: Path, bench_configs: Iterable[BenchConfig], repeat: int = 1
+) -> List[Dict[str, Any]]:
+    """对每个配置回放corpus,返回每个配置的报告.
+    repeat: 每个case重复的次数，用于稳定latency."""
+    cases = load_corpus(folder)
+    frames: Dict[Path, NDArray[np.uint8]] = {}
+    for case in cases:
+        if case.frame not in frames:
+            frames[case.frame] = np.array(Image.open(case.frame).convert("RGB"))
+    source = FrameSource()
+    context = BotContext(screen=source)
+    previous = get_metrics()
+    reports = []
+    try:
+        for config in bench_configs:
+            selected = [case for case in cases if case.kind == config.kind]
+            if not selected:
+                continue
+            metrics = enable_metrics(Metrics())
+            latencies: List[float] = []
+            found = correct = 0
+            with use_context(context), _PeakMemory() as memory:
+                for case, _ in itertools.product(selected, range(repeat)):
+                    source.frame = frames[case.frame]
+                    template = (
+                        bot_click._load_needle(folder / case.query)
+                        if case.kind == "img"
+                        else None
+                    )
+                    # 真实的查找每次都是新的frame,不使用上一次的预处理结果
+                    get_frame_cache().clear()
+                    start = time.perf_counter()
+                    point = _lookup_once(case, config, template)
+                    latencies.append(time.perf_counter() - start)
+                    if point is not None:
+                        found += 1
+                        correct += _inside(point, case.box)
+            reports.append(_report(config, latencies, found, correct, metrics, memory))
+            logger.info(f"benchmark {config}: {reports[-1]}")
+    finally:
+        if previous is None:
+            disable_metrics()
+        else:
+            enable_metrics(previous)
+    return reports
+
+
+def _report(
+    config: BenchConfig,
+    latencies: List[float],
+    found: int,
+    correct: int,
+    metrics: Metrics,
+    memory: _PeakMemory,
+) -> Dict[str, Any]:
+    p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99])
+    runs = len(latencies)
+    return {
+        "config": config._asdict(),
+        "runs": runs,
+        "p50": float(p50),
+        "p90": float(p90),
+        "p95": float(p95),
+        "p99": float(p99),
+        "mean": float(np.mean(latencies)),
+        "tesseract_calls": metrics.total("ocr_calls"),
+        "found_rate": found / runs,
+        "accuracy": correct / runs,
+        "peak_kb": memory.peak_kb,
+        "peak_growth_kb": memory.growth_kb,
+    }
+
+
+def _key(report: Dict[str, Any]) -> str:
+    return json.dumps(report["config"], sort_keys=True)
+
+
+def compare(
+    reports: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    tolerance: float = 0.2,
+    accuracy_drop: float = 0.0,
+) -> List[str]:
+    """与baseline对比，返回regression的说明(空list表示没有regression).
+    tolerance: p95 latency允许的增幅比例.
+    accuracy_drop: accuracy允许的下降值."""
+    previous = {_key(report): report for report in baseline}
+    regressions = []
+    for report in reports:
+        base = previous.get(_key(report))
+        if base is None:
+            continue
+        if report["p95"] > base["p95"] * (1 + tolerance):
+            regressions.append(
+                f"{report['config']}: p95 {base['p95']:.3f}s -> {report['p95']:.3f}s"
+            )
+        if report["accuracy"] < base["accuracy"] - accuracy_drop:
+            regressions.append(
+                f"{report['config']}: accuracy "
+                f"{base['accuracy']:.2%} -> {report['accuracy']:.2%}"
+            )
+    return regressions
+
+
+def format_reports(reports: List[Dict[str, Any]]) -> str:
+    """以表格形式输出报告."""
+    header = (
+        f"{'kind':<5} {'ocr_config':<10} {'preprocess':<10} {'conf':>5} "
+        f"{'p50':>7} {'p95':>7} {'p99':>7} {'ocr':>5} {'found':>6} {'acc':>6} "
+        f"{'peak_kb':>8} {'growth':>8}"
+    )
+    lines = [header]
+    for r in reports:
+        c = r["config"]
+        lines.append(
+            f"{c['kind']:<5} {c['ocr_config']:<10} {c['preprocess']:<10} "
+            f"{c['confidence']:>5.2f} {r['p50']:>7.3f} {r['p95']:>7.3f} "
+            f"{r['p99']:>7.3f} {r['tesseract_calls']:>5.0f} "
+            f"{r['found_rate']:>6.1%} {r['accuracy']:>6.1%} "
+            f"{r['peak_kb']:>8} {r['peak_growth_kb']:>8}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,187 @@
+"""Synthetic screens for the benchmark.
+在已知位置渲染文字(cv.putText)以及图标needle,生成带ground truth的corpus,
+无需浏览器，Xvfb或者字体文件，可在任何Linux主机上运行.
+corpus目录结构:
+    frames/frame_000000.png ...
+    needles/needle_000000.png ...
+    cases.json: [{"frame", "kind": "word"|"img", "query", "box": [x, y, w, h]}]
+"""
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+VOCABULARY = (
+    "Login",
+    "Username",
+    "Password",
+    "Submit",
+    "Cancel",
+    "Settings",
+    "Address",
+    "Search",
+    "Download",
+    "Welcome",
+    "Connection",
+    "Desktop",
+    "Browser",
+    "Continue",
+    "SetUserCookie",
+    "Close",
+)
+
+_Box = Tuple[int, int, int, int]
+
+
+def _overlaps(box: _Box, boxes: List[_Box], margin: int = 12) -> bool:
+    x, y, w, h = box
+    for bx, by, bw, bh in boxes:
+        if (
+            x < bx + bw + margin
+            and bx < x + w + margin
+            and y < by + bh + margin
+            and by < y + h + margin
+        ):
+            return True
+    return False
+
+
+def _place(
+    rng: np.random.Generator,
+    size: Tuple[int, int],
+    w: int,
+    h: int,
+    boxes: List[_Box],
+) -> Optional[_Box]:
+    """在不与boxes重叠的随机位置放置w*h的box."""
+    width, height = size
+    for _ in range(100):
+        x = int(rng.integers(8, width - w - 8))
+        y = int(rng.integers(8, height - h - 8))
+        if not _overlaps((x, y, w, h), boxes):
+            return x, y, w, h
+    return None
+
+
+def _background(rng: np.random.Generator, size: Tuple[int, int]) -> NDArray[np.uint8]:
+    """浅色背景以及若干色块(模拟窗口/面板)."""
+    width, height = size
+    base = int(rng.integers(215, 250))
+    img = np.full((height, width, 3), base, dtype=np.uint8)
+    for _ in range(int(rng.integers(3, 8))):
+        x0, y0 = int(rng.integers(0, width)), int(rng.integers(0, height))
+        x1 = min(width, x0 + int(rng.integers(80, width // 2)))
+        y1 = min(height, y0 + int(rng.integers(40, height // 2)))
+        color = tuple(int(c) for c in rng.integers(190, 255, 3))
+        cv.rectangle(img, (x0, y0), (x1, y1), color, -1)
+    return img
+
+
+def _icon(rng: np.random.Generator, side: int) -> NDArray[np.uint8]:
+    """随机生成的图标(RGB)."""
+    icon = np.full((side, side, 3), 255, dtype=np.uint8)
+    for _ in range(4):
+        color = tuple(int(c) for c in rng.integers(0, 200, 3))
+        center = tuple(int(c) for c in rng.integers(4, side - 4, 2))
+        if rng.random() < 0.5:
+            cv.circle(icon, center, int(rng.integers(3, side // 3)), color, -1)
+        else:
+            corner = tuple(int(c) for c in rng.integers(0, side, 2))
+            cv.rectangle(icon, center, corner, color, -1)
+    cv.rectangle(icon, (0, 0), (side - 1, side - 1), (60, 60, 60), 1)
+    return icon
+
+
+def render_screen(
+    rng: np.random.Generator,
+    size: Tuple[int, int] = (1280, 800),
+    words: int = 12,
+    icons: int = 2,
+    icon_side: int = 40,
+) -> Tuple[NDArray[np.uint8], List[Dict[str, Any]], List[NDArray[np.uint8]]]:
+    """渲染一个screen(RGB).
+    return: (frame, 文字以及图标的ground truth, 图标needle列表).
+    ground truth中图标的query为其在needle列表中的index."""
+    img = _background(rng, size)
+    boxes: List[_Box] = []
+    truth: List[Dict[str, Any]] = []
+    needles: List[NDArray[np.uint8]] = []
+    chosen = rng.choice(
+        len(VOCABULARY), size=min(words, len(VOCABULARY)), replace=False
+    )
+    for index in chosen:
+        text = VOCABULARY[int(index)]
+        scale = float(rng.uniform(0.7, 1.2))
+        (w, h), baseline = cv.getTextSize(text, cv.FONT_HERSHEY_DUPLEX, scale, 1)
+        box = _place(rng, size, w, h + baseline, boxes)
+        if box is None:
+            continue
+        boxes.append(box)
+        x, y, _, _ = box
+        color = tuple(int(c) for c in rng.integers(0, 80, 3))
+        cv.putText(
+            img,
+            text,
+            (x, y + h),
+            cv.FONT_HERSHEY_DUPLEX,
+            scale,
+            color,
+            1,
+            cv.LINE_AA,
+        )
+        truth.append({"kind": "word", "query": text, "box": list(box)})
+    for _ in range(icons):
+        box = _place(rng, size, icon_side, icon_side, boxes)
+        if box is None:
+            continue
+        boxes.append(box)
+        x, y, w, h = box
+        bottom, right = y + h, x + w
+        icon = _icon(rng, icon_side)
+        img[y:bottom, x:right] = icon
+        truth.append({"kind": "img", "query": len(needles), "box": list(box)})
+        needles.append(icon)
+    return img, truth, needles
+
+
+def generate_corpus(
+    folder: Path,
+    frames: int = 20,
+    size: Tuple[int, int] = (1280, 800),
+    words_per_case: int = 2,
+    seed: Optional[int] = None,
+) -> Path:
+    """在folder下生成frames个synthetic screen以及cases.json.
+    每个frame选取words_per_case个单词以及所有图标作为查找case.
+    return: cases.json的路径"""
+    rng = np.random.default_rng(seed)
+    (folder / "frames").mkdir(parents=True, exist_ok=True)
+    (folder / "needles").mkdir(parents=True, exist_ok=True)
+    cases: List[Dict[str, Any]] = []
+    for index in range(frames):
+        img, truth, needles = render_screen(rng, size)
+        frame_name = f"frames/frame_{index:06d}.png"
+        cv.imwrite(str(folder / frame_name), cv.cvtColor(img, cv.COLOR_RGB2BGR))
+        words = [t for t in truth if t["kind"] == "word"]
+        picks = rng.choice(len(words), min(words_per_case, len(words)), replace=False)
+        for picked in picks:
+            cases.append({"frame": frame_name, **words[int(picked)]})
+        for item in truth:
+            if item["kind"] != "img":
+                continue
+            needle_name = f"needles/needle_{index:06d}_{item['query']}.png"
+            needle = cv.cvtColor(needles[item["query"]], cv.COLOR_RGB2BGR)
+            cv.imwrite(str(folder / needle_name), needle)
+            cases.append({**item, "frame": frame_name, "query": needle_name})
+    cases_path = folder / "cases.json"
+    cases_path.write_text(json.dumps(cases, indent=2))
+    logger.info(f"generate {frames} frames with {len(cases)} cases in {folder}")
+    return cases_path
@@ -1,36 +1,55 @@
 """Core module of bot_click. It provides utility to do ocr and image recognition.
 若使用class的话，推荐使用mixins module中提供的Mixin类。
-由于pyautogui依赖包中需要DISPLAY,若使用VirtualDisplay的话，需要先建Display.
+截屏以及键盘鼠标输入均作用于当前的BotContext(见context module),默认使用$DISPLAY.
+若要驱动指定的display(如VirtualDisplay),用BotContext(display=...)即可.
 >>> import bot_click
 >>> # New Display and start some UI app
 >>> bot_click.click_by_word(text, confidence=0.7, timeout=30)
 >>> # OCR with customization
 >>> bot_click.click_by_word(text, confidence=0.7, timeout=30,preprocess=somefunction)
+>>> bot_click.click_by_word(text, preprocess=Gray() | AdaptiveThreshold(11, 2))
 >>> bot_click.click_by_img(img_path,confidence=0.8,timeout=10)
 >>> bot_click.click_and_send_keys('hello')
 >>> bot_click.screenshot(folder_path)
 """
+from __future__ import annotations
+
 import collections
+import functools
 import logging
 import os
 import time
 from datetime import datetime
 from pathlib import Path
-from statistics import mean
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from ._lazy import Image, cv, np, pytesseract
+from .artifacts import get_artifact_writer
+from .context import get_context
+from .inputs import FixedInterval, KeyTiming
+from .metrics import count, observe, stage
+from .ocr import OcrResult, fuzzy_contains
+from .preprocess import BGR, preprocess_frame
+from .scheduler import schedule
+from .tracing import traced
 
-import cv2 as cv
-import numpy as np
-import pyautogui
-import pytesseract
-from numpy.typing import NDArray
-from PIL import Image, ImageGrab
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
 
 Point = collections.namedtuple("Point", ["x", "y"])
 NeedleIMGCriteria = collections.namedtuple("NeedleIMGCriteria", ["path", "confidence"])
-_TesseractMatchResult = collections.namedtuple(
-    "_TesseractMatchResult",
-    ["text", "block_num", "confidence", "left", "top", "width", "height"],
+NeedleWordCriteria = collections.namedtuple(
+    "NeedleWordCriteria",
+    ["text", "confidence", "ocr_config", "preprocess", "min_similarity"],
+    defaults=[0.7, "", None, 1.0],
 )
 
 _DEFAULT_TIMEOUT = int(os.environ.get("DEFAULT_TIMEOUT", "60"))  # in sec
@@ -52,27 +71,56 @@ class NeedleNotFoundError(BotClickError):
     pass
 
 
-def click(point: Optional[Point] = None, duration: float = 0.4) -> None:
-    """以指定速率移动鼠标到指定位置，并点击.
+@traced
+def click(point: Optional[Point] = None, duration: Optional[float] = None) -> None:
+    """沿human-like轨迹移动鼠标到指定位置，并点击.
     point:为None时，则为当前鼠标所在位置.
+    duration:移动时长(s),None时按距离自适应(Fitts' law).
     """
     point = point or position()
-    pyautogui.click(x=point.x, y=point.y, duration=duration)
+    _move_along_trajectory(point, duration)
+    _record_event("click", point=point)
+    with stage("input"):
+        get_context().input.click(point.x, point.y, 0)
     logger.info(f"click at point={point}")
 
 
-def double_click(point: Optional[Point] = None, duration: float = 0.4) -> None:
-    """以指定速率移动鼠标到指定位置，并双击.
+@traced
+def double_click(
+    point: Optional[Point] = None, duration: Optional[float] = None
+) -> None:
+    """沿human-like轨迹移动鼠标到指定位置，并双击.
     point:为None时，则为当前鼠标所在位置.
+    duration:移动时长(s),None时按距离自适应(Fitts' law).
     """
     point = point or position()
-    pyautogui.doubleClick(x=point.x, y=point.y, duration=duration)
+    _move_along_trajectory(point, duration)
+    _record_event("double_click", point=point)
+    with stage("input"):
+        get_context().input.click(point.x, point.y, 0, clicks=2)
     logger.info(f"doubleclick at point={point}")
 
 
+@traced
+def move_to(point: Point, duration: Optional[float] = None) -> None:
+    """沿human-like轨迹移动鼠标到指定位置.
+    duration:移动时长(s),None时按距离自适应(Fitts' law)."""
+    _move_along_trajectory(point, duration)
+
+
+def _move_along_trajectory(point: Point, duration: Optional[float]) -> None:
+    """用当前context的trajectory生成轨迹，并一次性交给input backend注入."""
+    context = get_context()
+    start = context.input.position()
+    points, times = context.trajectory.plan(start, (point.x, point.y), duration)
+    logger.debug(f"move {start}->{point}: {len(points)} points in {times[-1]:.3f}s")
+    with stage("input"):
+        context.input.move_path(points, times)
+
+
 def position() -> Point:
     """当前鼠标位置."""
-    return Point(*pyautogui.position())
+    return Point(*get_context().input.position())
 
 
 def centroid(points: List[Point]) -> Point:
@@ -84,43 +132,70 @@ def centroid(points: List[Point]) -> Point:
     return result
 
 
+@traced
 def hotkey(keys: Iterable[str]) -> None:
     """发送组合键."""
-    pyautogui.hotkey(keys=keys)
+    keys = list(keys)
+    _record_event("hotkey", keys=keys)
+    with stage("input"):
+        get_context().input.hotkey(keys)
 
 
+@traced
 def send_keys(
     message: str | List[str],
     append_enter: bool = False,
     log_screenshot_folder: Optional[Path] = None,
+    timing: Optional[KeyTiming] = None,
+    paste: bool = False,
 ) -> None:
     """向当前鼠标位置发送按键.
     screenshot_folder:输入后screenshot的保存位置,默认不保存.
     append_enter: 是否需要在字串后面追回回车键.
+    timing: 键盘输入的时间模型,默认为FixedInterval(0.1).HumanInterval()模拟人的节奏，
+    Instant()尽可能快，仅适用于不做键盘行为检查的输入框.
+    paste: 为True且message为str时，通过剪贴板(ctrl+v)输入，适用于很长的字串.
     如:
     send_keys('abc',True): 生成键盘事件:['a','b','c','enter']
     send_keys('abc',False):生成键盘事件:['a','b','c']
     send_keys(['a','b','c','enter']):生成键盘事件:['a','b','c','enter']"""
-    tosend = message
-    # 为True时，转为list传送.转换规则为：
-    # 1.原message为str，则变为list(message)+['enter']
-    # 2.原message为List[str]时，则[message]+['enter']
-    if append_enter:
-        if type(message) == str:
-            tosend = list(message) + ["enter"]
-        else:
-            tosend += ["enter"]  # type: ignore
-    logger.info(f"to enter {tosend}")
-    pyautogui.write(message=tosend, interval=0.1)
+    timing = timing or FixedInterval(0.1)
+    context = get_context()
+    # 输入的可能是密码，故仅记录长度
+    _record_event("send_keys", length=len(message), paste=paste, enter=append_enter)
+    if paste and isinstance(message, str):
+        logger.info(f"to paste {message}")
+        with stage("input"):
+            context.set_clipboard(message)
+            context.input.hotkey(["ctrl", "v"])
+            if append_enter:
+                context.input.write(["enter"], timing)
+    else:
+        tosend = message
+        # 为True时，转为list传送.转换规则为：
+        # 1.原message为str，则变为list(message)+['enter']
+        # 2.原message为List[str]时，则[message]+['enter']
+        if append_enter:
+            if isinstance(message, str):
+                tosend = list(message) + ["enter"]
+            else:
+                tosend += ["enter"]  # type: ignore
+        logger.info(f"to enter {tosend} with {timing}")
+        with stage("input"):
+            context.input.write(tosend, timing)
     if log_screenshot_folder:
-        file_path = log_screenshot_folder / gen_filename()
-        screenshot(file_path)
+        file_path = get_artifact_writer().submit(
+            log_screenshot_folder / gen_filename(),
+            _screenshot_ndarray(),
+            label="send_keys",
+        )
         logger.info(f"Screenshot saved to {file_path}")
 
 
+@traced
 def screenshot(file_path: str | Path) -> None:
     """Take screenshot and save to file."""
-    ImageGrab.grab().save(file_path)
+    get_context().grab().save(file_path)
 
 
 def gen_filename(ext: str = "png") -> str:
@@ -139,45 +214,86 @@ def gen_filename(ext: str = "png") -> str:
     return filename
 
 
-def _draw_crosshair(img_cv: cv.Mat, point: Point) -> cv.Mat:
-    """在给定opencv兼容的画板image上的指定点，描绘x,返回描绘后的Mat图像."""
-    cv.drawMarker(
-        img_cv,
-        point,
-        color=(255, 0, 255),
-        markerType=cv.MARKER_CROSS,
-        markerSize=40,
-        thickness=2,
-    )
-    return img_cv
+def _record_event(action: str, **detail: Any) -> None:
+    """若当前context启用了FlightRecorder,则记录event."""
+    recorder = get_context().recorder
+    if recorder is not None:
+        recorder.record_event(action, **detail)
 
 
 def _screenshot_ndarray() -> NDArray[np.uint8]:
     """Take screenshot并转换成opencv格式."""
-    return np.array(ImageGrab.grab())
-
-
-def mark_crosshairs(folder: Path, points: List[Point]) -> Path:
-    """将当前屏幕以及点击区域描述并保存到指定文件夹."""
-    cv_img = _screenshot_ndarray()
-    for point in points:
-        cv_img = _draw_crosshair(cv_img, point)
-    folder.mkdir(exist_ok=True, parents=True)
-    file_path = folder.absolute() / gen_filename()
-    cv.imwrite(str(file_path), cv_img)
+    return get_context().screenshot_ndarray()
+
+
+@traced
+def screen_fingerprint(tag: str = "") -> str:
+    """当前屏幕的fingerprint,由分辨率以及调用方给定的tag(如页面/场景名)组成.
+    相同fingerprint下，同一个元素的位置应该是恒定的."""
+    height, width = _screenshot_ndarray().shape[:2]
+    return f"{tag}@{width}x{height}"
+
+
+def crop_patch(img: NDArray[np.uint8], point: Point, radius: int) -> NDArray[np.uint8]:
+    """以point为中心，截取边长为2*radius的小图(超出图像边界部分会被裁掉)."""
+    height, width = img.shape[:2]
+    top, bottom = max(point.y - radius, 0), min(point.y + radius, height)
+    left, right = max(point.x - radius, 0), min(point.x + radius, width)
+    return img[top:bottom, left:right].copy()
+
+
+@traced
+def verify_patch(
+    point: Point,
+    patch: NDArray[np.uint8],
+    confidence: float = 0.9,
+    slack: int = 4,
+    img: Optional[NDArray[np.uint8]] = None,
+) -> bool:
+    """在point附近很小的区域内验证patch是否仍然存在,用于廉价地确认cache的坐标.
+    patch:之前以point为中心用crop_patch截取的小图.
+    slack:允许的偏移像素.
+    img:已截取的屏幕图像，默认为None，即重新截屏."""
+    ph, pw = patch.shape[:2]
+    if ph == 0 or pw == 0:
+        return False
+    radius = max(ph, pw) // 2 + slack
+    img = _screenshot_ndarray() if img is None else img
+    window = crop_patch(img, point, radius)
+    if window.shape[0] < ph or window.shape[1] < pw:
+        return False
+    with stage("match"):
+        result = cv.matchTemplate(window, patch, cv.TM_CCOEFF_NORMED)
+    score = float(np.nan_to_num(result).max())
+    logger.debug(f"verify patch at {point}: {score}")
+    return score >= confidence
+
+
+@traced
+def mark_crosshairs(folder: Path, points: List[Point]) -> Optional[Path]:
+    """将当前屏幕以及点击区域描述并保存到指定文件夹.
+    优先使用刚才用于匹配的frame,由后台ArtifactWriter描绘与写入，不阻塞.
+    return: 文件路径,artifact队列满被丢弃时返回None."""
+    frame = get_context().recent_frame()
+    if frame is None:
+        frame = _screenshot_ndarray()
+    file_path = get_artifact_writer().submit(
+        folder.absolute() / gen_filename(), frame, points, label="crosshair"
+    )
     logger.info(f"save the crosshair to {file_path}")
     return file_path
 
 
-def mark_crosshair(folder: Path, point: Point) -> Path:
+def mark_crosshair(folder: Path, point: Point) -> Optional[Path]:
     """将当前屏幕以及点击区域描述并保存到指定文件夹."""
     return mark_crosshairs(folder, [point])
 
 
+@traced
 def click_by_img(
     needle_path: Path,
     confidence: float = 0.7,
-    duration: float = 0.4,
+    duration: Optional[float] = None,
     timeout: int = _DEFAULT_TIMEOUT,
     check_interval: int = _DEFAULT_CHECK_INTERVAL,
 ) -> None:
@@ -185,7 +301,7 @@ def click_by_img(
     定位image的时候，参考locate_img。
 
     confidence: [0, 1.0],
-    duration: 移动鼠标时的速率
+    duration: 移动鼠标的时长(s),None时按距离自适应(Fitts' law)
     check_interval: 以s的间隔去检查
     Raises: NeedleNotFoundException
     Reference:
@@ -196,22 +312,60 @@ def click_by_img(
     click(point, duration)
 
 
-def _is_img_onscreen(template_bgr: cv.Mat, confidence: float) -> Tuple[bool, Point]:
-    """cv.TM_CCOEFF_NORMED 去matchTemplate"""
-    _, w, h = template_bgr.shape[::-1]
-    img = cv.cvtColor(_screenshot_ndarray(), cv.COLOR_RGB2BGR)
+def _match_template(
+    img: NDArray[Any], template_bgr: cv.Mat, confidence: float
+) -> Tuple[float, Optional[Tuple[int, int]]]:
+    """return: (最高的匹配度, 第一个匹配度 > confidence的位置，没有时为None)."""
+    with stage("match"):
+        result = cv.matchTemplate(img, template_bgr, cv.TM_CCOEFF_NORMED)
+    match_indices = np.flatnonzero(result > confidence)
+    if match_indices.size == 0:
+        return float(result.max()), None
+    y, x = np.unravel_index(match_indices[0], result.shape)
+    return float(result.max()), (int(x), int(y))
 
-    result = cv.matchTemplate(img, template_bgr, cv.TM_CCOEFF_NORMED)
-    match_indices = np.arange(result.size)[(result > confidence).flatten()]
-    matches = np.unravel_index(match_indices[:1], result.shape)
-    if len(matches[0]) == 0:
+
+def _is_img_onscreen(
+    template_bgr: cv.Mat,
+    confidence: float,
+    deadline: Optional[float] = None,
+    frame: Optional[NDArray[np.uint8]] = None,
+) -> Tuple[bool, Point]:
+    """cv.TM_CCOEFF_NORMED 去matchTemplate
+    deadline: 所属wait的timeout时刻，用于scheduler排序.
+    frame: 已截取的frame,为None时截屏."""
+    _, w, h = template_bgr.shape[::-1]
+    if frame is None:
+        frame = _screenshot_ndarray()
+    with stage("preprocess"):
+        img = preprocess_frame(frame, BGR)
+    score, match = schedule(
+        lambda: _match_template(img, template_bgr, confidence),
+        deadline,
+        "match_template",
+        confidence,
+        img,
+        template_bgr,
+    )
+    if match is None:
+        _record_event(
+            "match_img",
+            template_size=(w, h),
+            confidence=confidence,
+            score=score,
+            found=False,
+        )
         return False, Point(-1, -1)
-    matchx, matchy = matches[1], matches[0]
-    points: List[Point] = []
-    for x, y in zip(matchx, matchy):
-        points.append(Point(x, y))
-        points.append(Point(x + w, y + h))
-    point = centroid(points)
+    x, y = match
+    point = centroid([Point(x, y), Point(x + w, y + h)])
+    _record_event(
+        "match_img",
+        template_size=(w, h),
+        confidence=confidence,
+        score=score,
+        found=True,
+        point=point,
+    )
     return True, point
 
 
@@ -222,6 +376,17 @@ def _load_pil_cv(file_path: Path) -> cv.Mat:
     return cv.cvtColor(img_array, cv.COLOR_RGB2BGR)
 
 
+def _load_needle(file_path: Path) -> cv.Mat:
+    """读取needle图像，按文件路径以及修改时间cache,长时间运行的进程无需重复读取与转换."""
+    path = Path(file_path).absolute()
+    return _load_needle_cached(str(path), path.stat().st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=256)
+def _load_needle_cached(path: str, mtime_ns: int) -> cv.Mat:
+    return _load_pil_cv(Path(path))
+
+
 def _wait_img_onscreen(
     needle_path: Path,
     confidence: float,
@@ -232,16 +397,25 @@ def _wait_img_onscreen(
     Raises: NeedleNotFoundError"""
     end = time.time() + timeout
     found = False
-    template = _load_pil_cv(needle_path)
-    while time.time() < end and found is False:
-        found, point = _is_img_onscreen(template, confidence)
-        logger.info(f"wait for ({needle_path, confidence}) on screen: {found}")
-        if found:
-            return point
-        time.sleep(check_interval)
-    raise NeedleNotFoundError(f"wait for ({needle_path, confidence}) timeout")
-
-
+    template = _load_needle(needle_path)
+    polls = 0
+    count("lookups", kind="img")
+    try:
+        while time.time() < end and found is False:
+            polls += 1
+            found, point = _is_img_onscreen(template, confidence, end)
+            logger.info(f"wait for ({needle_path, confidence}) on screen: {found}")
+            if found:
+                return point
+            with stage("sleep"):
+                time.sleep(check_interval)
+        count("lookup_timeouts", kind="img")
+        raise NeedleNotFoundError(f"wait for ({needle_path, confidence}) timeout")
+    finally:
+        observe("lookup_polls", polls, kind="img")
+
+
+@traced
 def locate_img(
     needle_path: Path,
     confidence: float = 0.7,
@@ -257,23 +431,31 @@ def locate_img(
     return point
 
 
+@traced
 def click_by_word(
     text: str,
     confidence: float = 0.7,
     timeout: int = _DEFAULT_TIMEOUT,
-    duration: float = 0.4,
+    duration: Optional[float] = None,
     ocr_config: str = "",
     preprocess: Optional[Callable[[cv.Mat], cv.Mat]] = None,
+    min_similarity: float = 1.0,
 ) -> None:
     """在当前屏幕可见区域查找单个单词（以空格分隔)，并点击.
     定位方法与规则见locate_word的参数说明
     Raises: NeedleNotFoundException"""
     point = locate_word(
-        text, confidence, timeout, ocr_config=ocr_config, preprocess=preprocess
+        text,
+        confidence,
+        timeout,
+        ocr_config=ocr_config,
+        preprocess=preprocess,
+        min_similarity=min_similarity,
     )
     click(point, duration=duration)
 
 
+@traced
 def locate_word(
     text: str,
     confidence: float = 0.7,
@@ -281,22 +463,37 @@ def locate_word(
     ocr_config: str = "",
     preprocess: Optional[Callable[[cv.Mat], cv.Mat]] = None,
     check_interval: int = _DEFAULT_CHECK_INTERVAL,
+    min_similarity: float = 1.0,
 ) -> Point:
     """在当前屏幕可见区域查找单个单词（以空格分隔),返回confidence最高的.
     匹配前会按preprocess做图像预处理
     preprocess:默认为空，即默认不做特殊处理.处理后的必须是opencv可识别的，
     opencv使用BGR而不是RGB，所以，如果原图是RGB，则需要使用
     cv.cvtColor(image, cv.COLOR_RGB2BGR)或者转换为GRAY。
+    推荐使用Pipeline(如Gray() | AdaptiveThreshold(11, 2)),同一frame上相同的前缀只计算一次,
+    见preprocess module.
     ocr_config:默认自动识别.用于调整psm，如果主要是文字，且默认识别不高时，可--psm 4 或者
     --psm 6,或者是 --psm 11
     check_interval: 以s间隔去检查屏幕
+    min_similarity: 小于1时为模糊匹配,OCR识别出的单词与text中单词的编辑距离相似度
+    不小于min_similarity即可(如0.75时"Usemame"可匹配"Username"),
+    避免个别字符识别错误导致一直等待到timeout.排序时综合相似度与confidence.
     Raises: NeedleNotFoundException"""
     boxes = _locate_word(
-        text, confidence, timeout, ocr_config, preprocess, check_interval
+        text,
+        confidence,
+        timeout,
+        ocr_config,
+        preprocess,
+        check_interval,
+        min_similarity,
     )
-    top_lefts = [Point(box.left, box.top) for box in boxes]
-    bottom_rights = [Point(box.left + box.width, box.top + box.height) for box in boxes]
-    point = centroid(top_lefts + bottom_rights)
+    return _boxes_center(text, boxes)
+
+
+def _boxes_center(text: str, boxes: OcrResult) -> Point:
+    """返回匹配到的一组单词box的中心点."""
+    point = Point(*boxes.center())
     logger.info(f"top match for {text}: {point}")
     return point
 
@@ -308,12 +505,8 @@ def print_enhance_ocr_tip() -> None:
     1. preprocess: 如果原图的图像颜色很丰富或者字样过浅，考虑先做color space转为gray，
     以及做按需调整threshold.
     如:Guacamole web login页面中，placeholder的颜色识别不出来，将threshold用THRESH_BINARY设置
-    threshold为200.用def _img_preprocess(img):
-        image = cv.cvtColor(img, cv.COLOR_RGB2GRAY)
-        return cv.threshold(image, 200, 255, cv.THRESH_BINARY)[1]
-    或者：调整threshold采用cv.adaptiveThreshold(
-        img, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C, cv.THRESH_BINARY, 11, 2
-    )
+    threshold为200.用preprocess=Gray() | Threshold(200)
+    或者：调整threshold采用preprocess=Gray() | AdaptiveThreshold(11, 2)
     2. 调整psm. 默认为3.可以按需设置为常用值4,6,11. 如ocr_config='--psm 4'"""
     )
 
@@ -325,126 +518,98 @@ def _locate_word(
     ocr_config: str,
     preprocess: Optional[Callable[[cv.Mat], cv.Mat]],
     check_interval: int,
-) -> List[_TesseractMatchResult]:
+    min_similarity: float = 1.0,
+) -> OcrResult:
     """在当前屏幕可见区域查找字串,返回confidence最高的.
     Raises:
     NeedleNotFoundException: 如果文字未出现或confidence不满足匹配条件"""
-    img = _wait_word_onscreen(text, timeout, ocr_config, preprocess, check_interval)
-    ocr_result = _ocr_result(img, ocr_config)
-    ocr_result = _filter_ocr_result(ocr_result, text, confidence)
-    word_block_nums = _ocr_same_row(ocr_result)
-    top_match = _ocr_top_match(word_block_nums, ocr_result)
-    return top_match
+    img = _wait_word_onscreen(
+        text, timeout, ocr_config, preprocess, check_interval, min_similarity
+    )
+    return _match_word_boxes(img, text, confidence, ocr_config, min_similarity)
 
 
-def _filter_ocr_result(
-    result: Dict[str, Any], words: str, confidence: float
-) -> Dict[str, List[_TesseractMatchResult]]:
-    """从Tesseract返回的result中，过滤满足条件(包括字串以及满足confidence).
+def _match_word_boxes(
+    img: cv.Mat,
+    text: str,
+    confidence: float,
+    ocr_config: str,
+    min_similarity: float = 1.0,
+) -> OcrResult:
+    """对已确认包含text的图像做ocr,返回同一行中包含text所有单词且得分最高的一组单词.
+    min_similarity: 小于1时为模糊匹配，见OcrResult.match.
     Raises: NeedleNotFoundException"""
-    # Tesseract返回的MatchResult 是用int百分来表示统一转换成百分率
-    word_list = words.split()
-    converted_confidence = min(int(confidence * 100), 100)
-    results = collections.defaultdict(list)
-    for text, block_num, conf, left, top, width, height in zip(
-        result["text"],
-        result["block_num"],
-        result["conf"],
-        result["left"],
-        result["top"],
-        result["width"],
-        result["height"],
-    ):
-        # text in word_list : 当前单词是否在匹配列表中
-        # words in text: 单个单词全匹配或者部分匹配
-        if ((text in word_list) or (words in text)) and _validate_confidence(
-            int(conf), converted_confidence, text
-        ):
-            results[text].append(
-                _TesseractMatchResult(text, block_num, conf, left, top, width, height)
-            )
-
-    if len(results.keys()) < len(word_list):
-        raise NeedleNotFoundError(f"no match for {text} with {confidence}: {results}")
-    logger.info(f"matched result for {text} with {confidence}: {results}")
-    # 转换成普通dict
-    return dict(results)
+    ocr_result = OcrResult.from_data(_ocr_result(img, ocr_config))
+    with stage("filter"):
+        top_match = ocr_result.match(text, confidence, min_similarity)
+    if top_match is None:
+        candidates = ocr_result.filter(text, 0, min_similarity)
+        raise NeedleNotFoundError(
+            f"no match for {text} with {confidence}: {candidates}"
+        )
+    logger.info(f"matched result for {text} with {confidence}: {top_match}")
+    _record_event(
+        "ocr_match", text=text, confidence=confidence, boxes=top_match.records()
+    )
+    return top_match
 
 
-def _validate_confidence(actual: float, expected: float, *args: Any) -> bool:
-    """Check if confidence match."""
-    if actual >= expected:
-        logger.info(f"Confidence match {args}")
-    else:
-        logger.warning(f"Actual: {actual} expected: {expected}, {args}")
-    return actual >= expected
-
-
-def _ocr_same_row(matches: Dict[str, List[_TesseractMatchResult]]) -> List[int]:
-    """找到所有单词的box的block_nums的交集.
-    根据TessearctResult，(page_num,par_num,line_num,block_num)
-    四元组，标识了单词属于同一行。
-    这里不考虑pdf等多page的情况，故目前仅筛选block_num"""
-    values = list(matches.values())
-    first, others = values[0], values[1:]
-    block_nums = set([result.block_num for result in first])
-    for results in others:
-        _block_nums = set([result.block_num for result in results])
-        block_nums &= _block_nums
-    return list(block_nums)
-
-
-def _ocr_top_match(
-    block_nums: List[int], matches: Dict[str, List[_TesseractMatchResult]]
-) -> List[_TesseractMatchResult]:
-    """根据block_nums，过滤满足条件confidence最高的的box data."""
-    flatten_matches = [
-        item
-        for sublist in matches.values()
-        for item in sublist
-        if item.block_num in block_nums
-    ]
-    if len(block_nums) <= 1:
-        return flatten_matches
-    max_mean = -1
-    for block_num in block_nums:
-        avg = mean(m.confidence for m in flatten_matches if m.block_num == block_num)
-        max_mean = max(max_mean, avg)
-        if max_mean == avg:
-            result = [m for m in flatten_matches if m.block_num == block_num]
-    return result
+def _ocr_result(
+    image: cv.Mat, ocr_config: str, deadline: Optional[float] = None
+) -> Any:
+    """用pytesseract识别image的所有单词,返回识别出来的box boundary.
+    deadline: 所属wait的timeout时刻，用于scheduler排序."""
 
+    def job() -> Any:
+        count("ocr_calls", kind="data")
+        with stage("ocr"):
+            return pytesseract.image_to_data(
+                image, output_type=pytesseract.Output.DICT, config=ocr_config
+            )
 
-def _ocr_result(image: cv.Mat, ocr_config: str) -> Any:
-    """用pytesseract识别image的所有单词,返回识别出来的box boundary."""
-    result = pytesseract.image_to_data(
-        image, output_type=pytesseract.Output.DICT, config=ocr_config
-    )
-    return result
+    return schedule(job, deadline, "image_to_data", ocr_config, image)
 
 
-def _screenshot_ocr(preprocess: Optional[Callable[[cv.Mat], cv.Mat]]) -> cv.Mat:
+def _screenshot_ocr(
+    preprocess: Optional[Callable[[cv.Mat], cv.Mat]],
+    frame: Optional[NDArray[np.uint8]] = None,
+) -> cv.Mat:
     """截屏为pytesseract支持的格式,并根据preprocess做图像预处理.
     图像空间最后需为BGR或者GRAY，不能是RGB格式
-    preprocess:默认为空，即默认不做特殊处理"""
-    img = _screenshot_ndarray()
-    if preprocess is None:
-        # COLOR_RGB2GRAY or COLOR_RGB2BGR
-        return cv.cvtColor(img, cv.COLOR_RGB2BGR)
-    return preprocess(img)
+    preprocess:默认为空，即默认不做特殊处理.Pipeline的结果按frame memoize
+    frame: 已截取的frame,为None时截屏."""
+    img = _screenshot_ndarray() if frame is None else frame
+    with stage("preprocess"):
+        image: cv.Mat = preprocess_frame(img, preprocess)
+    return image
 
 
 def _is_word_onscreen(
     search: str,
     ocr_config: str,
     preprocess: Optional[Callable[[cv.Mat], cv.Mat]],
+    deadline: Optional[float] = None,
+    min_similarity: float = 1.0,
+    frame: Optional[NDArray[np.uint8]] = None,
 ) -> Tuple[bool, cv.Mat]:
     """截图并根据preprocess函数对图像进行预处理，查找指定单词是否在屏幕可见区域.
-    preprocess:默认为空，即默认不做特殊处理"""
-    image = _screenshot_ocr(preprocess)
-    result = pytesseract.image_to_string(image, config=ocr_config)
+    preprocess:默认为空，即默认不做特殊处理
+    deadline: 所属wait的timeout时刻，用于scheduler排序.
+    min_similarity: 小于1时为模糊匹配，见ocr.fuzzy_contains.
+    frame: 已截取的frame,为None时截屏."""
+    image = _screenshot_ocr(preprocess, frame)
+
+    def job() -> str:
+        count("ocr_calls", kind="string")
+        with stage("ocr"):
+            text: str = pytesseract.image_to_string(image, config=ocr_config)
+        return text
+
+    result = schedule(job, deadline, "image_to_string", ocr_config, image)
     logger.debug(f"is_word_onscreen {search}: {result}")
-    return (search in result), image
+    found = fuzzy_contains(result, search, min_similarity)
+    _record_event("ocr_wait", search=search, found=found, ocr_text=result)
+    return found, image
 
 
 def _wait_word_onscreen(
@@ -453,6 +618,7 @@ def _wait_word_onscreen(
     ocr_config: str,
     preprocess: Optional[Callable[[cv.Mat], cv.Mat]],
     check_interval: int,
+    min_similarity: float = 1.0,
 ) -> cv.Mat:
     """在指定时限内，等待直到指定单词出现在屏幕可见区域.
     匹配前会根据preprocess对图像做预处理.
@@ -460,12 +626,22 @@ def _wait_word_onscreen(
     return: processed image
     Raises: NeedleNotFoundError"""
     end = time.time() + timeout
-    while time.time() < end:
-        found, img = _is_word_onscreen(search, ocr_config, preprocess=preprocess)
-        logger.info(f"wait for {search} on screen: {found}")
-        if found:
-            return img
-        # 因为文字识别通过subprocess去调用Tesseract,不要过于频繁
-        # Hardcode 为5
-        time.sleep(check_interval)
-    raise NeedleNotFoundError(f"wait for {search} timeout")
+    polls = 0
+    count("lookups", kind="word")
+    try:
+        while time.time() < end:
+            polls += 1
+            found, img = _is_word_onscreen(
+                search, ocr_config, preprocess, end, min_similarity
+            )
+            logger.info(f"wait for {search} on screen: {found}")
+            if found:
+                return img
+            # 因为文字识别通过subprocess去调用Tesseract,不要过于频繁
+            # Hardcode 为5
+            with stage("sleep"):
+                time.sleep(check_interval)
+        count("lookup_timeouts", kind="word")
+        raise NeedleNotFoundError(f"wait for {search} timeout")
+    finally:
+        observe("lookup_polls", polls, kind="word")
@@ -0,0 +1,289 @@
+"""Cache for located elements.
+LocationCache: 以SQLite持久化(跨进程，跨run)保存 screen fingerprint + query 到 Point的映射.
+命中cache后，先在cache坐标附近用小图(patch)做局部template匹配来确认，
+确认失败时才做完整的查找.
+located_property: page object中"定位得到的坐标"属性，按实例cache,
+屏幕分辨率变化，局部确认失败或者显式invalidate_located时重新定位.
+>>> cache = LocationCache("/tmp/.bot_click/locations.sqlite")
+>>> point = cache.locate(
+...     "guaca:Username",
+...     lambda: bot_click.locate_word("Username", timeout=60),
+...     fingerprint=bot_click.screen_fingerprint("guaca_login"),
+... )
+"""
+from __future__ import annotations
+
+import collections
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple
+
+from ._lazy import cv, np
+from . import bot_click
+from .bot_click import Point
+from .context import use_context
+from .metrics import count
+from .tracing import traced
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+_LOCATED_ATTR = "_located_cache_"
+_LocatedEntry = collections.namedtuple("_LocatedEntry", ["point", "shape", "patch"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS locations (
+    fingerprint TEXT NOT NULL,
+    query TEXT NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    patch BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    mismatches INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (fingerprint, query)
+)
+"""
+
+
+class LocationCache:
+    """持久化的元素位置cache.
+    max_age: entry的最长有效时间(s)，过期后会重新查找.
+    max_mismatches: 局部确认失败的累计次数超过该值后，entry被删除并重新建立.
+    patch_radius: 保存在cache中用于确认的小图半径.
+    confidence: 局部确认时，matchTemplate(TM_CCOEFF_NORMED)需要达到的匹配度."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_age: float = 7 * 24 * 3600,
+        max_mismatches: int = 3,
+        patch_radius: int = 16,
+        confidence: float = 0.9,
+    ) -> None:
+        """path:SQLite文件路径，父目录不存在时会自动创建."""
+        self.path = Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.max_age = max_age
+        self.max_mismatches = max_mismatches
+        self.patch_radius = patch_radius
+        self.confidence = confidence
+        self._lock = threading.Lock()
+        # 多个bot进程可能共用同一个cache文件，WAL模式下读写互不阻塞
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    @traced
+    def locate(
+        self,
+        query: str,
+        locate: Callable[[], Point],
+        fingerprint: Optional[str] = None,
+    ) -> Point:
+        """返回query对应的坐标.
+        先查cache并在屏幕上做局部确认，确认失败或者没有cache时，调用locate做完整查找，
+        并将结果写回cache.
+        fingerprint:默认为bot_click.screen_fingerprint().
+        Raises: 同locate"""
+        fingerprint = fingerprint or bot_click.screen_fingerprint()
+        point = self._lookup(fingerprint, query)
+        if point is not None:
+            return point
+        point = locate()
+        self._store(fingerprint, query, point)
+        return point
+
+    def _lookup(self, fingerprint: str, query: str) -> Optional[Point]:
+        """查找并确认cache中的坐标，无效时返回None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT x, y, patch, created_at, mismatches FROM locations "
+                "WHERE fingerprint=? AND query=?",
+                (fingerprint, query),
+            ).fetchone()
+        if row is None:
+            logger.info(f"location cache miss: {fingerprint} {query}")
+            count("cache_misses", cache="location")
+            return None
+        x, y, blob, created_at, mismatches = row
+        if time.time() - created_at > self.max_age:
+            logger.info(f"location cache expired: {fingerprint} {query}")
+            self.invalidate(query, fingerprint)
+            count("cache_misses", cache="location")
+            return None
+        point = Point(x, y)
+        decoded = cv.imdecode(np.frombuffer(blob, np.uint8), cv.IMREAD_UNCHANGED)
+        patch: Optional[NDArray[np.uint8]] = (
+            None if decoded is None else np.asarray(decoded, np.uint8)
+        )
+        if patch is not None and bot_click.verify_patch(point, patch, self.confidence):
+            self._execute(
+                "UPDATE locations SET hits=hits+1 WHERE fingerprint=? AND query=?",
+                (fingerprint, query),
+            )
+            logger.info(f"location cache hit: {fingerprint} {query} at {point}")
+            count("cache_hits", cache="location")
+            return point
+        logger.info(f"location cache mismatch: {fingerprint} {query} at {point}")
+        count("cache_mismatches", cache="location")
+        if mismatches + 1 > self.max_mismatches:
+            self.invalidate(query, fingerprint)
+        else:
+            self._execute(
+                "UPDATE locations SET mismatches=mismatches+1 "
+                "WHERE fingerprint=? AND query=?",
+                (fingerprint, query),
+            )
+        return None
+
+    def _store(self, fingerprint: str, query: str, point: Point) -> None:
+        """截取point附近的小图，并与坐标一起写入cache.
+        已存在的entry保留其mismatches计数，以便不稳定的entry最终会被淘汰."""
+        patch = bot_click.crop_patch(
+            bot_click._screenshot_ndarray(), point, self.patch_radius
+        )
+        ok, encoded = cv.imencode(".png", patch)
+        if not ok:
+            logger.warning(f"Failed to encode patch for {query}, skip caching")
+            return
+        self._execute(
+            "INSERT INTO locations (fingerprint, query, x, y, patch, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(fingerprint, query) DO UPDATE SET "
+            "x=excluded.x, y=excluded.y, patch=excluded.patch, "
+            "created_at=excluded.created_at",
+            (
+                fingerprint,
+                query,
+                int(point.x),
+                int(point.y),
+                encoded.tobytes(),
+                time.time(),
+            ),
+        )
+
+    def invalidate(
+        self, query: Optional[str] = None, fingerprint: Optional[str] = None
+    ) -> None:
+        """删除cache entry.query与fingerprint均为None时，清空整个cache."""
+        clauses: List[str] = []
+        params: List[str] = []
+        if query is not None:
+            clauses.append("query=?")
+            params.append(query)
+        if fingerprint is not None:
+            clauses.append("fingerprint=?")
+            params.append(fingerprint)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        self._execute(f"DELETE FROM locations{where}", tuple(params))
+
+    def purge(self) -> None:
+        """删除所有过期的entry."""
+        self._execute(
+            "DELETE FROM locations WHERE created_at < ?",
+            (time.time() - self.max_age,),
+        )
+
+    def close(self) -> None:
+        """关闭SQLite连接."""
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql: str, params: Tuple[Any, ...]) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+
+
+class located_property:
+    """Decorator:将page object中定位元素的方法变为按实例cache的只读属性.
+    再次访问时，先检查屏幕分辨率是否变化，再在cache坐标附近做局部确认，
+    均通过时直接返回cache的坐标，否则重新定位.
+    >>> class LoginScreen(TextClickerMixin):
+    ...     @located_property
+    ...     def username(self) -> Point:
+    ...         return self.locate_word("Username")
+    ...     @located_property(verify=False)
+    ...     def logo(self) -> Point:
+    ...         return self.locate_img(logo_path)
+    verify:是否做局部确认.为False时，仅在分辨率变化或invalidate_located后重新定位."""
+
+    def __init__(
+        self,
+        func: Optional[Callable[[Any], Point]] = None,
+        *,
+        verify: bool = True,
+        patch_radius: int = 16,
+        confidence: float = 0.9,
+    ) -> None:
+        """支持@located_property以及@located_property(verify=False)两种用法."""
+        self.verify = verify
+        self.patch_radius = patch_radius
+        self.confidence = confidence
+        self._name = ""
+        self._func: Optional[Callable[[Any], Point]] = None
+        if func is not None:
+            self(func)
+
+    def __call__(self, func: Callable[[Any], Point]) -> located_property:
+        self._func = func
+        self._name = func.__name__
+        self.__doc__ = func.__doc__
+        return self
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self._name = name
+
+    def __get__(self, obj: Any, objtype: Optional[type] = None) -> Any:
+        if obj is None:
+            return self
+        # 与Mixin方法相同，截屏以及定位都在实例的bot_context中进行
+        with use_context(getattr(obj, "bot_context", None)):
+            return self._locate(obj)
+
+    def _locate(self, obj: Any) -> Any:
+        assert self._func is not None
+        cache = obj.__dict__.setdefault(_LOCATED_ATTR, {})
+        entry = cache.get(self._name)
+        if entry is not None:
+            frame = bot_click._screenshot_ndarray()
+            if entry.shape != frame.shape[:2]:
+                logger.info(f"screen resized, relocate {self._name}")
+            elif not self.verify or bot_click.verify_patch(
+                entry.point, entry.patch, self.confidence, img=frame
+            ):
+                count("cache_hits", cache="located")
+                return entry.point
+            else:
+                logger.info(f"verify {self._name} at {entry.point} failed, relocate")
+        count("cache_misses", cache="located")
+        point = self._func(obj)
+        # 定位之后的屏幕才与point对应
+        frame = bot_click._screenshot_ndarray()
+        patch = (
+            bot_click.crop_patch(frame, point, self.patch_radius)
+            if self.verify
+            else None
+        )
+        cache[self._name] = _LocatedEntry(point, frame.shape[:2], patch)
+        return point
+
+
+def invalidate_located(obj: Any, *names: str) -> None:
+    """清除obj上located_property的cache.names为空时，清除所有."""
+    cache = obj.__dict__.get(_LOCATED_ATTR)
+    if not cache:
+        return
+    if not names:
+        cache.clear()
+    for name in names:
+        cache.pop(name, None)
@@ -0,0 +1,197 @@
+"""Per-display bot context.
+BotContext 拥有截屏以及键盘鼠标输入所需的X连接，bot_click中的函数以及mixins
+均作用于当前的BotContext.默认的BotContext使用$DISPLAY以及pyautogui,
+与未引入BotContext时的行为一致.
+截屏来源可通过screen指定(见screen module),如回放录制的session.
+一个进程中可以为多个Xvfb display各建一个BotContext,并在不同的thread/asyncio task中
+通过use_context同时驱动:
+>>> with BotContext(display=":5") as ctx:
+...     bot_click.click_by_word("Login")
+restrict返回限定于屏幕某个区域的context,查找只在该区域中进行，坐标相对于该区域:
+>>> with ctx.restrict(Region(0, 120, 1440, 780)):
+...     bot_click.click_by_img(needle)
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from types import TracebackType
+from typing import TYPE_CHECKING, Iterator, List, Optional, Type
+
+from ._lazy import Image, np
+from .inputs import InputBackend, OffsetInput, PyAutoGUIInput, XTestInput
+from .metrics import stage
+from .recorder import FlightRecorder
+from .screen import CroppedScreen, Region, ScreenSource, XScreen, get_default_screen
+from .trajectory import Trajectory
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+
+class BotContext:
+    """一个display的截屏与输入.
+    display: X display,如':5'.为None时使用$DISPLAY,并以pyautogui作为输入backend.
+    input: 指定输入backend,默认根据display选择PyAutoGUIInput或者XTestInput.
+    input backend在首次使用时才建立连接.
+    trajectory: 鼠标轨迹生成器,默认为Trajectory().
+    recorder: 启用FlightRecorder时，每次截屏以及操作都会记录在其ring buffer中.
+    screen: 截屏来源，默认为全局的ScreenSource(set_default_screen)或者XScreen(display)."""
+
+    def __init__(
+        self,
+        display: Optional[str] = None,
+        input: Optional[InputBackend] = None,
+        trajectory: Optional[Trajectory] = None,
+        recorder: Optional[FlightRecorder] = None,
+        screen: Optional[ScreenSource] = None,
+    ) -> None:
+        """不会立即连接display."""
+        self.display = display
+        self.trajectory = trajectory or Trajectory()
+        self.recorder = recorder
+        self._input = input
+        self._screen = screen
+        self._live_screen = XScreen(display)
+        # 最近一次截屏，用于debug artifact等，避免重复截屏
+        self.last_frame: Optional[NDArray[np.uint8]] = None
+        self._last_frame_at = 0.0
+        self._lock = threading.Lock()
+        self._tokens: List[contextvars.Token[Optional[BotContext]]] = []
+
+    @property
+    def input(self) -> InputBackend:
+        """键盘鼠标输入backend."""
+        if self._input is None:
+            with self._lock:
+                if self._input is None:
+                    self._input = (
+                        PyAutoGUIInput()
+                        if self.display is None
+                        else XTestInput(self.display)
+                    )
+        return self._input
+
+    @property
+    def screen(self) -> ScreenSource:
+        """截屏来源."""
+        return self._screen or get_default_screen() or self._live_screen
+
+    def grab(self) -> Image.Image:
+        """截取整个屏幕."""
+        return Image.fromarray(self.screen.grab())
+
+    def screenshot_ndarray(self) -> NDArray[np.uint8]:
+        """截屏并转换成opencv格式(RGB)."""
+        with stage("capture"):
+            frame = self.screen.grab()
+        self.last_frame, self._last_frame_at = frame, time.monotonic()
+        if self.recorder is not None:
+            self.recorder.record_frame(frame)
+        return frame
+
+    def recent_frame(self, max_age: float = 10) -> Optional[NDArray[np.uint8]]:
+        """max_age(s)内最近一次截取的frame,没有时返回None."""
+        if time.monotonic() - self._last_frame_at > max_age:
+            return None
+        return self.last_frame
+
+    def set_clipboard(self, text: str) -> None:
+        """设置display的剪贴板(CLIPBOARD selection).
+        通过xclip/xsel实现，二者会在后台持有selection直到被其它程序替换.
+        Raises: RuntimeError 如果xclip与xsel均未安装"""
+        env = dict(os.environ)
+        if self.display:
+            env["DISPLAY"] = self.display
+        for cmd in (["xclip", "-selection", "clipboard"], ["xsel", "-b", "-i"]):
+            if shutil.which(cmd[0]):
+                subprocess.run(cmd, input=text.encode(), env=env, check=True)
+                return
+        raise RuntimeError("xclip or xsel is required to set the clipboard")
+
+    def restrict(self, region: Region) -> BotContext:
+        """限定于region的context:截屏只包含region,坐标相对于region的左上角.
+        与self共享输入连接，截屏来源，轨迹以及recorder,close时不会释放它们."""
+        return BotContext(
+            self.display,
+            OffsetInput(self.input, region.left, region.top),
+            self.trajectory,
+            self.recorder,
+            CroppedScreen(self.screen, region),
+        )
+
+    def close(self) -> None:
+        """释放输入backend所占用的连接以及指定的screen."""
+        with self._lock:
+            if self._input is not None:
+                self._input.close()
+                self._input = None
+            if self._screen is not None:
+                self._screen.close()
+
+    def __enter__(self) -> BotContext:
+        """将自身设为当前context."""
+        self._tokens.append(_current.set(self))
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """恢复之前的context,不会close."""
+        _current.reset(self._tokens.pop())
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(display={self.display!r})"
+
+
+_current: contextvars.ContextVar[Optional[BotContext]] = contextvars.ContextVar(
+    "bot_click_context", default=None
+)
+_default: Optional[BotContext] = None
+_default_lock = threading.Lock()
+
+
+def default_context() -> BotContext:
+    """进程级的默认context,首次调用时才新建."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = BotContext()
+    return _default
+
+
+def set_default_context(context: BotContext) -> None:
+    """替换进程级的默认context."""
+    global _default
+    with _default_lock:
+        _default = context
+
+
+def get_context() -> BotContext:
+    """当前thread/asyncio task所使用的context,未通过use_context指定时为默认context."""
+    return _current.get() or default_context()
+
+
+@contextlib.contextmanager
+def use_context(context: Optional[BotContext]) -> Iterator[Optional[BotContext]]:
+    """在with block中将context设为当前context.context为None时，保持当前context."""
+    if context is None:
+        yield None
+        return
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
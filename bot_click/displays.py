@@ -0,0 +1,205 @@
+"""Pre-warmed Xvfb display pool.
+启动Xvfb需要数秒，DisplayPool预先启动count个Xvfb,以lease的形式借出
+(display以及绑定该display的BotContext)，归还时清理后放回pool,
+scenario的启动不再包含X server的启动时间:
+>>> with DisplayPool(2, size=(1440, 900)) as pool:
+...     with pool.lease() as lease, lease.context:
+...         subprocess.Popen(["chromium", url], env=lease.env)
+...         bot_click.click_by_word("Login")
+归还时会断开display上残留的所有X client(如lease期间启动的浏览器)，
+清空root window并将鼠标移回左上角.不健康的Xvfb会被替换.
+"""
+from __future__ import annotations
+
+import contextlib
+import logging
+import queue
+import threading
+from types import TracebackType
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple, Type
+
+from .context import BotContext
+
+if TYPE_CHECKING:
+    from pyvirtualdisplay import Display
+
+logger = logging.getLogger(__name__)
+
+
+class DisplayLease:
+    """借出的display.
+    display: X display,如':5'.
+    context: 绑定该display的BotContext,归还时close."""
+
+    def __init__(self, vdisplay: Display) -> None:
+        """由DisplayPool.lease创建."""
+        self.vdisplay = vdisplay
+        self.display = f":{vdisplay.display}"
+        self.context = BotContext(display=self.display)
+
+    @property
+    def env(self) -> Dict[str, str]:
+        """在该display上启动程序所需的环境变量(包含当前进程的环境变量)."""
+        env: Dict[str, str] = self.vdisplay.env()
+        return env
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.display!r})"
+
+
+class DisplayPool:
+    """保持count个运行中的Xvfb.
+    size, color_depth: Xvfb的屏幕大小与色深.
+    use_xauth: 是否为每个Xvfb生成Xauthority文件.
+    Xvfb在start(或者进入with block)时启动."""
+
+    def __init__(
+        self,
+        count: int = 1,
+        size: Tuple[int, int] = (1440, 900),
+        color_depth: int = 24,
+        use_xauth: bool = False,
+    ) -> None:
+        """不会立即启动Xvfb."""
+        self.count = count
+        self.size = size
+        self.color_depth = color_depth
+        self.use_xauth = use_xauth
+        self._idle: queue.Queue[Display] = queue.Queue()
+        self._all: List[Display] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _new_display(self) -> Display:
+        from pyvirtualdisplay import Display
+
+        vdisplay = Display(
+            visible=False,
+            size=self.size,
+            color_depth=self.color_depth,
+            use_xauth=self.use_xauth,
+            manage_global_env=False,
+        )
+        vdisplay.start()
+        with self._lock:
+            self._all.append(vdisplay)
+        logger.info(f"start Xvfb :{vdisplay.display}")
+        return vdisplay
+
+    def _stop(self, vdisplay: Display) -> None:
+        with self._lock:
+            if vdisplay in self._all:
+                self._all.remove(vdisplay)
+        try:
+            vdisplay.stop()
+        except Exception:
+            logger.exception(f"failed to stop Xvfb :{vdisplay.display}")
+
+    def start(self) -> DisplayPool:
+        """启动count个Xvfb."""
+        self._closed = False
+        for _ in range(self.count - len(self._all)):
+            self._idle.put(self._new_display())
+        return self
+
+    @staticmethod
+    def healthy(vdisplay: Display) -> bool:
+        """Xvfb进程仍在运行并且可以连接."""
+        if not vdisplay.is_alive():
+            return False
+        from Xlib import display as xdisplay
+
+        try:
+            conn = xdisplay.Display(f":{vdisplay.display}")
+        except Exception:
+            return False
+        try:
+            conn.screen().root.get_geometry()
+            return True
+        except Exception:
+            return False
+        finally:
+            conn.close()
+
+    @staticmethod
+    def reset(vdisplay: Display) -> None:
+        """断开所有拥有top level window的X client,清空root window,鼠标移回(0, 0)."""
+        from Xlib import X
+        from Xlib import display as xdisplay
+
+        conn = xdisplay.Display(f":{vdisplay.display}")
+        try:
+            screen = conn.screen()
+            root = screen.root
+            for window in root.query_tree().children:
+                window.kill_client()
+            root.change_attributes(background_pixel=screen.black_pixel)
+            root.clear_area()
+            root.warp_pointer(0, 0)
+            conn.set_input_focus(X.PointerRoot, X.RevertToPointerRoot, X.CurrentTime)
+            conn.sync()
+        finally:
+            conn.close()
+
+    def check(self) -> None:
+        """检查所有空闲的Xvfb,替换不健康的."""
+        for _ in range(self._idle.qsize()):
+            try:
+                vdisplay = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._idle.put(self._checked(vdisplay))
+
+    def _checked(self, vdisplay: Display) -> Display:
+        if self.healthy(vdisplay):
+            return vdisplay
+        logger.warning(f"Xvfb :{vdisplay.display} is unhealthy, replace it")
+        self._stop(vdisplay)
+        return self._new_display()
+
+    def _release(self, vdisplay: Display) -> None:
+        if self._closed:
+            self._stop(vdisplay)
+            return
+        try:
+            self.reset(vdisplay)
+        except Exception:
+            logger.exception(f"failed to reset Xvfb :{vdisplay.display}")
+        self._idle.put(self._checked(vdisplay))
+
+    @contextlib.contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[DisplayLease]:
+        """借出一个健康的display,with block结束时归还.
+        Raises: queue.Empty 如果timeout(s)内没有空闲的display"""
+        if not self._all:
+            self.start()
+        vdisplay = self._checked(self._idle.get(timeout=timeout))
+        lease = DisplayLease(vdisplay)
+        logger.debug(f"lease {lease}")
+        try:
+            yield lease
+        finally:
+            lease.context.close()
+            self._release(vdisplay)
+
+    def close(self) -> None:
+        """停止所有Xvfb,包括借出的(归还时停止)."""
+        self._closed = True
+        while True:
+            try:
+                self._stop(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def __enter__(self) -> DisplayPool:
+        """启动Xvfb."""
+        return self.start()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """停止所有Xvfb."""
+        self.close()
@@ -0,0 +1,425 @@
+"""键盘鼠标输入的backend.
+PyAutoGUIInput: 通过pyautogui输入，绑定到$DISPLAY,为默认BotContext所用.
+XTestInput: 通过XTest extension向指定的X display注入输入事件，拥有自己的X连接，
+所以一个进程中可以同时驱动多个display.
+key的命名与pyautogui一致,如'enter','backspace','ctrl','a'.
+KeyTiming: 键盘输入的时间模型,决定key之间的间隔以及每个key按下的时长:
+FixedInterval(固定间隔), HumanInterval(模拟人的随机间隔), Instant(尽可能快).
+OffsetInput: 将相对于屏幕某个区域的坐标转换为屏幕坐标，见BotContext.restrict.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Iterable, List, Optional, Protocol, Tuple
+
+from ._lazy import np
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+
+class KeyTiming(ABC):
+    """键盘输入的时间模型,子类须实现schedule."""
+
+    @abstractmethod
+    def schedule(self, count: int) -> Tuple[NDArray[np.float64], NDArray[np.float64]]:
+        """返回(gaps, holds),单位为s,长度均为count.
+        gaps[i]: 第i个key按下前的等待时间. holds[i]: 第i个key按下到释放的时间."""
+
+
+class FixedInterval(KeyTiming):
+    """key之间固定间隔interval(s),与pyautogui.write(interval=...)一致."""
+
+    def __init__(self, interval: float = 0.1) -> None:
+        """interval:两个key之间的间隔(s)."""
+        self.interval = interval
+
+    def schedule(self, count: int) -> Tuple[NDArray[np.float64], NDArray[np.float64]]:
+        """第一个key立即按下，其余key之间间隔interval."""
+        gaps = np.full(count, self.interval, dtype=np.float64)
+        gaps[:1] = 0
+        return gaps, np.zeros(count, dtype=np.float64)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.interval})"
+
+
+class Instant(FixedInterval):
+    """尽可能快地输入，仅适用于不做键盘行为检查的输入框."""
+
+    def __init__(self) -> None:
+        """没有任何间隔."""
+        super().__init__(0)
+
+
+class HumanInterval(KeyTiming):
+    """模拟人的打字节奏:key间隔以及按下时长均服从log-normal分布.
+    mean/stddev:key间隔的均值与标准差(s).
+    hold/hold_stddev:按下时长的均值与标准差(s).
+    minimum:间隔与时长的下限(s).
+    seed:随机数种子，默认不固定."""
+
+    def __init__(
+        self,
+        mean: float = 0.12,
+        stddev: float = 0.05,
+        hold: float = 0.07,
+        hold_stddev: float = 0.02,
+        minimum: float = 0.02,
+        seed: Optional[int] = None,
+    ) -> None:
+        """参数见class说明."""
+        self.mean = mean
+        self.stddev = stddev
+        self.hold = hold
+        self.hold_stddev = hold_stddev
+        self.minimum = minimum
+        self._rng = np.random.default_rng(seed)
+
+    def _lognormal(self, mean: float, stddev: float, count: int) -> NDArray[np.float64]:
+        """按给定均值与标准差生成log-normal分布的样本."""
+        sigma2 = np.log1p((stddev / mean) ** 2)
+        mu = np.log(mean) - sigma2 / 2
+        samples = self._rng.lognormal(mu, np.sqrt(sigma2), count)
+        return np.maximum(samples, self.minimum)
+
+    def schedule(self, count: int) -> Tuple[NDArray[np.float64], NDArray[np.float64]]:
+        """一次生成所有key的间隔与按下时长."""
+        gaps = self._lognormal(self.mean, self.stddev, count)
+        gaps[:1] = 0
+        return gaps, self._lognormal(self.hold, self.hold_stddev, count)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(mean={self.mean}, stddev={self.stddev})"
+
+
+class InputBackend(Protocol):
+    """BotContext所使用的输入backend."""
+
+    def position(self) -> Tuple[int, int]:
+        """当前鼠标位置."""
+
+    def move_to(self, x: int, y: int, duration: float) -> None:
+        """以duration(s)移动鼠标到(x, y)."""
+
+    def move_path(self, points: NDArray[np.int64], times: NDArray[np.float64]) -> None:
+        """沿轨迹移动鼠标,times[i]为到达points[i]的时间(s,相对于开始移动)."""
+
+    def click(self, x: int, y: int, duration: float, clicks: int = 1) -> None:
+        """移动鼠标到(x, y)并点击clicks次."""
+
+    def hotkey(self, keys: Iterable[str]) -> None:
+        """按顺序按下keys,再逆序释放."""
+
+    def write(self, keys: Iterable[str], timing: KeyTiming) -> None:
+        """依次输入keys,key之间的间隔以及按下时长由timing决定."""
+
+    def close(self) -> None:
+        """释放backend所占用的资源."""
+
+
+class PyAutoGUIInput:
+    """通过pyautogui输入.pyautogui在import时绑定$DISPLAY,故在首次使用时才import."""
+
+    def __init__(self) -> None:
+        """pyautogui在此时才被import."""
+        import pyautogui
+
+        self._pyautogui = pyautogui
+
+    def position(self) -> Tuple[int, int]:
+        """当前鼠标位置."""
+        x, y = self._pyautogui.position()
+        return x, y
+
+    def move_to(self, x: int, y: int, duration: float) -> None:
+        """以duration(s)移动鼠标到(x, y)."""
+        self._pyautogui.moveTo(x=x, y=y, duration=duration)
+
+    def move_path(self, points: NDArray[np.int64], times: NDArray[np.float64]) -> None:
+        """沿轨迹移动鼠标,按times调度每一个点."""
+        start = time.perf_counter()
+        for (x, y), at in zip(points.tolist(), times.tolist()):
+            wait = at - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+            self._pyautogui.moveTo(x, y, _pause=False)
+
+    def click(self, x: int, y: int, duration: float, clicks: int = 1) -> None:
+        """移动鼠标到(x, y)并点击clicks次."""
+        self._pyautogui.click(x=x, y=y, clicks=clicks, duration=duration)
+
+    def hotkey(self, keys: Iterable[str]) -> None:
+        """按顺序按下keys,再逆序释放."""
+        self._pyautogui.hotkey(*keys)
+
+    def write(self, keys: Iterable[str], timing: KeyTiming) -> None:
+        """依次输入keys,key之间的间隔以及按下时长由timing决定."""
+        keys = list(keys)
+        gaps, holds = timing.schedule(len(keys))
+        for key, gap, hold in zip(keys, gaps, holds):
+            time.sleep(gap)
+            self._pyautogui.keyDown(key, _pause=False)
+            time.sleep(hold)
+            self._pyautogui.keyUp(key, _pause=False)
+
+    def close(self) -> None:
+        """pyautogui没有需要释放的资源."""
+
+
+# pyautogui key name 到 X keysym name的映射,未列出的按X keysym name处理
+_KEYSYM_NAMES = {
+    "enter": "Return",
+    "return": "Return",
+    "\n": "Return",
+    "\r": "Return",
+    "\t": "Tab",
+    "tab": "Tab",
+    "backspace": "BackSpace",
+    "\b": "BackSpace",
+    "delete": "Delete",
+    "del": "Delete",
+    "esc": "Escape",
+    "escape": "Escape",
+    "space": "space",
+    " ": "space",
+    "ctrl": "Control_L",
+    "ctrlleft": "Control_L",
+    "ctrlright": "Control_R",
+    "shift": "Shift_L",
+    "shiftleft": "Shift_L",
+    "shiftright": "Shift_R",
+    "alt": "Alt_L",
+    "altleft": "Alt_L",
+    "altright": "Alt_R",
+    "win": "Super_L",
+    "winleft": "Super_L",
+    "winright": "Super_R",
+    "up": "Up",
+    "down": "Down",
+    "left": "Left",
+    "right": "Right",
+    "home": "Home",
+    "end": "End",
+    "pageup": "Prior",
+    "pgup": "Prior",
+    "pagedown": "Next",
+    "pgdn": "Next",
+    "insert": "Insert",
+    "capslock": "Caps_Lock",
+    "!": "exclam",
+    '"': "quotedbl",
+    "#": "numbersign",
+    "$": "dollar",
+    "%": "percent",
+    "&": "ampersand",
+    "'": "apostrophe",
+    "(": "parenleft",
+    ")": "parenright",
+    "*": "asterisk",
+    "+": "plus",
+    ",": "comma",
+    "-": "minus",
+    ".": "period",
+    "/": "slash",
+    ":": "colon",
+    ";": "semicolon",
+    "<": "less",
+    "=": "equal",
+    ">": "greater",
+    "?": "question",
+    "@": "at",
+    "[": "bracketleft",
+    "\\": "backslash",
+    "]": "bracketright",
+    "^": "asciicircum",
+    "_": "underscore",
+    "`": "grave",
+    "{": "braceleft",
+    "|": "bar",
+    "}": "braceright",
+    "~": "asciitilde",
+}
+_FKEYS = {f"f{i}": f"F{i}" for i in range(1, 25)}
+
+
+class XTestInput:
+    """通过XTest向指定X display注入键盘鼠标事件.
+    每个实例拥有自己的X连接，调用是线程安全的.
+    键盘输入是批量注入的:所有key事件连同其延时(XTest的delay字段，由X server计时)
+    一次性发送，整个字串只需要一次round trip."""
+
+    _STEP_INTERVAL = 0.01  # 移动鼠标时，每一步的间隔(s)
+
+    def __init__(self, display: Optional[str] = None) -> None:
+        """display:如':5'.None时使用$DISPLAY."""
+        from Xlib import X, XK
+        from Xlib import display as xdisplay
+        from Xlib.ext import xtest
+
+        self._X = X
+        self._XK = XK
+        self._xtest = xtest
+        self._display = xdisplay.Display(display)
+        self._root = self._display.screen().root
+        self._lock = threading.Lock()
+        # keysym name -> (keycode, 是否需要shift)
+        self._keycodes: dict[str, Tuple[int, bool]] = {}
+
+    def position(self) -> Tuple[int, int]:
+        """当前鼠标位置."""
+        with self._lock:
+            pointer = self._root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def move_to(self, x: int, y: int, duration: float) -> None:
+        """以duration(s)线性移动鼠标到(x, y)."""
+        start_x, start_y = self.position()
+        steps = max(int(duration / self._STEP_INTERVAL), 1)
+        for step in range(1, steps + 1):
+            ratio = step / steps
+            self._motion(
+                round(start_x + (x - start_x) * ratio),
+                round(start_y + (y - start_y) * ratio),
+            )
+            if step < steps:
+                time.sleep(self._STEP_INTERVAL)
+
+    def move_path(self, points: NDArray[np.int64], times: NDArray[np.float64]) -> None:
+        """沿轨迹移动鼠标.
+        所有motion事件连同各自的delay批量发送，由X server计时，返回时已移动完成."""
+        delays = np.diff(np.rint(times * 1000).astype(int), prepend=0)
+        with self._lock:
+            for (x, y), delay in zip(points.tolist(), delays.tolist()):
+                self._xtest.fake_input(
+                    self._display, self._X.MotionNotify, x=x, y=y, time=delay
+                )
+            self._display.sync()
+
+    def click(self, x: int, y: int, duration: float, clicks: int = 1) -> None:
+        """移动鼠标到(x, y)并用左键点击clicks次."""
+        self.move_to(x, y, duration)
+        with self._lock:
+            for _ in range(clicks):
+                self._xtest.fake_input(self._display, self._X.ButtonPress, 1)
+                self._xtest.fake_input(self._display, self._X.ButtonRelease, 1)
+            self._display.sync()
+
+    def hotkey(self, keys: Iterable[str]) -> None:
+        """按顺序按下keys,再逆序释放."""
+        keycodes = [self._keycode(key)[0] for key in keys]
+        with self._lock:
+            for keycode in keycodes:
+                self._xtest.fake_input(self._display, self._X.KeyPress, keycode)
+            for keycode in reversed(keycodes):
+                self._xtest.fake_input(self._display, self._X.KeyRelease, keycode)
+            self._display.sync()
+
+    def write(self, keys: Iterable[str], timing: KeyTiming) -> None:
+        """依次输入keys,key之间的间隔以及按下时长由timing决定.
+        所有事件批量发送，由X server按各事件的delay依次处理，返回时已全部处理完."""
+        keys = list(keys)
+        gaps, holds = timing.schedule(len(keys))
+        gaps_ms = np.rint(gaps * 1000).astype(int)
+        holds_ms = np.rint(holds * 1000).astype(int)
+        taps = [self._keycode(key) for key in keys]
+        shift_keycode = self._keycode("shift")[0]
+        with self._lock:
+            for (keycode, shift), gap, hold in zip(taps, gaps_ms, holds_ms):
+                for event_type, code, delay in self._tap_events(
+                    keycode, shift, shift_keycode, int(gap), int(hold)
+                ):
+                    self._xtest.fake_input(self._display, event_type, code, time=delay)
+            self._display.sync()
+
+    def close(self) -> None:
+        """关闭X连接."""
+        with self._lock:
+            self._display.close()
+
+    def _motion(self, x: int, y: int) -> None:
+        with self._lock:
+            self._xtest.fake_input(self._display, self._X.MotionNotify, x=x, y=y)
+            self._display.sync()
+
+    def _tap_events(
+        self, keycode: int, shift: bool, shift_keycode: int, gap: int, hold: int
+    ) -> List[Tuple[Any, int, int]]:
+        """单个key按下并释放的事件列表(event_type, keycode, delay_ms).
+        需要shift时，shift在key之前按下，在key之后释放."""
+        press, release = self._X.KeyPress, self._X.KeyRelease
+        if not shift:
+            return [(press, keycode, gap), (release, keycode, hold)]
+        return [
+            (press, shift_keycode, gap),
+            (press, keycode, 0),
+            (release, keycode, hold),
+            (release, shift_keycode, 0),
+        ]
+
+    def _keycode(self, key: str) -> Tuple[int, bool]:
+        """将pyautogui的key name转换为(keycode, 是否需要shift).
+        Raises: ValueError 如果当前keyboard mapping中没有该key"""
+        cached = self._keycodes.get(key)
+        if cached is not None:
+            return cached
+        name = _KEYSYM_NAMES.get(key.lower() if len(key) > 1 else key)
+        name = name or _FKEYS.get(key.lower()) or key
+        keysym = self._XK.string_to_keysym(name)
+        with self._lock:
+            keycode = self._display.keysym_to_keycode(keysym)
+            # keycode的第一个keysym不是目标keysym时(如大写字母和符号)，需要shift
+            shift = keycode != 0 and self._display.keycode_to_keysym(keycode, 0) != (
+                keysym
+            )
+        if keysym == 0 or keycode == 0:
+            raise ValueError(f"Unsupported key {key!r} on this keyboard mapping")
+        self._keycodes[key] = (keycode, shift)
+        return keycode, shift
+
+
+class OffsetInput:
+    """坐标相对于(left, top)的输入backend,事件由backend注入.
+    backend由调用方所有，close时不会释放."""
+
+    def __init__(self, backend: InputBackend, left: int, top: int) -> None:
+        """backend: 实际注入事件的backend."""
+        self.backend = backend
+        self.left = left
+        self.top = top
+
+    def position(self) -> Tuple[int, int]:
+        """当前鼠标位置(相对于(left, top))."""
+        x, y = self.backend.position()
+        return x - self.left, y - self.top
+
+    def move_to(self, x: int, y: int, duration: float) -> None:
+        """以duration(s)移动鼠标到(x, y)."""
+        self.backend.move_to(x + self.left, y + self.top, duration)
+
+    def move_path(self, points: NDArray[np.int64], times: NDArray[np.float64]) -> None:
+        """沿轨迹移动鼠标."""
+        self.backend.move_path(points + np.array([self.left, self.top]), times)
+
+    def click(self, x: int, y: int, duration: float, clicks: int = 1) -> None:
+        """移动鼠标到(x, y)并点击clicks次."""
+        self.backend.click(x + self.left, y + self.top, duration, clicks)
+
+    def hotkey(self, keys: Iterable[str]) -> None:
+        """按顺序按下keys,再逆序释放."""
+        self.backend.hotkey(keys)
+
+    def write(self, keys: Iterable[str], timing: KeyTiming) -> None:
+        """依次输入keys."""
+        self.backend.write(keys, timing)
+
+    def close(self) -> None:
+        """backend由调用方释放."""
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.backend!r}, {self.left}, {self.top})"
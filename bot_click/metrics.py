@@ -0,0 +1,299 @@
+"""Per-stage latency metrics.
+记录每个阶段(capture, preprocess, ocr, filter, match, input, sleep)的耗时分布(histogram)
+以及计数(每次查找的轮询次数，OCR调用次数，cache命中等)，用于评估每台主机可运行的bot数.
+默认关闭，关闭时每个埋点只有一次全局变量检查.
+启用tracing时，stage同时记录为trace span(见tracing module).
+可导出为Prometheus text format(serve_metrics提供HTTP endpoint)或者JSON.
+>>> metrics = enable_metrics()
+>>> bot_click.click_by_word("Login")
+>>> print(metrics.to_prometheus())
+>>> serve_metrics(9464)
+"""
+from __future__ import annotations
+
+import bisect
+import contextlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from types import TracebackType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+from . import tracing
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+COUNT_BUCKETS = (1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 21.0, 34.0)
+
+_PREFIX = "bot_click_"
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """固定bucket的histogram,bucket为上界(le)."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """记录一个值."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Prometheus格式的累计bucket:[(le, count)],最后一个为+Inf."""
+        result, total = [], 0
+        for le, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += count
+            result.append((le, total))
+        return result
+
+
+class Metrics:
+    """一组histogram与counter,thread safe.
+    buckets: 指定histogram family的bucket,未指定的family使用TIME_BUCKETS."""
+
+    def __init__(self, buckets: Optional[Dict[str, Sequence[float]]] = None) -> None:
+        """默认lookup_polls使用COUNT_BUCKETS."""
+        self.buckets: Dict[str, Sequence[float]] = {"lookup_polls": COUNT_BUCKETS}
+        self.buckets.update(buckets or {})
+        self._histograms: Dict[Tuple[str, _Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, _Labels], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, family: str, value: float, **labels: str) -> None:
+        """在histogram family(如stage_seconds)中记录一个值."""
+        key = (family, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(self.buckets.get(family, TIME_BUCKETS))
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """counter加value."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def total(self, name: str) -> float:
+        """counter name在所有labels下的合计."""
+        with self._lock:
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    def timer(self, stage: str) -> _StageTimer:
+        """with block的耗时记录到stage_seconds{stage=...}."""
+        return _StageTimer(self, None, stage)
+
+    def reset(self) -> None:
+        """清空所有histogram与counter."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON可序列化的快照."""
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": h.count,
+                        "sum": h.sum,
+                        "buckets": dict(h.cumulative()),
+                    }
+                    for (name, labels), h in sorted(self._histograms.items())
+                ],
+            }
+
+    def dump(self, file_path: Path) -> None:
+        """将快照以JSON写入file_path."""
+        file_path.parent.mkdir(exist_ok=True, parents=True)
+        file_path.write_text(json.dumps(self.snapshot(), indent=2))
+        logger.info(f"save the metrics to {file_path}")
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            typed = set()
+            for (name, labels), value in counters:
+                metric = f"{_PREFIX}{name}_total"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+            for (name, labels), h in histograms:
+                metric = f"{_PREFIX}{name}"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} histogram")
+                for le, count in h.cumulative():
+                    bucket_labels = _format_labels(labels + (("le", le),))
+                    lines.append(f"{metric}_bucket{bucket_labels} {count}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {h.sum}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: _Labels) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{k}="{v}"' for k, v in labels)
+    return f"{{{pairs}}}"
+
+
+class _StageTimer:
+    """记录with block耗时的context manager,同时记录到metrics与tracer(如有)."""
+
+    __slots__ = ("_metrics", "_tracer", "_stage", "_start")
+
+    def __init__(
+        self, metrics: Optional[Metrics], tracer: Optional[tracing.Tracer], stage: str
+    ) -> None:
+        self._metrics = metrics
+        self._tracer = tracer
+        self._stage = stage
+        self._start = 0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter_ns()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        end = time.perf_counter_ns()
+        if self._metrics is not None:
+            elapsed = (end - self._start) / 1e9
+            self._metrics.observe("stage_seconds", elapsed, stage=self._stage)
+        if self._tracer is not None:
+            self._tracer.complete(self._stage, "stage", self._start, end, {})
+
+
+_metrics: Optional[Metrics] = None
+_NULL = contextlib.nullcontext()
+
+
+def get_metrics() -> Optional[Metrics]:
+    """进程级的Metrics,未启用时为None."""
+    return _metrics
+
+
+def enable_metrics(metrics: Optional[Metrics] = None) -> Metrics:
+    """启用(或替换)进程级的Metrics."""
+    global _metrics
+    _metrics = metrics or Metrics()
+    return _metrics
+
+
+def disable_metrics() -> None:
+    """关闭metrics,埋点恢复为no-op."""
+    global _metrics
+    _metrics = None
+
+
+def stage(name: str) -> ContextManager[None]:
+    """记录with block的耗时为stage name,metrics与tracing均未启用时为no-op."""
+    metrics, tracer = _metrics, tracing.get_tracer()
+    if metrics is None and tracer is None:
+        return _NULL
+    return _StageTimer(metrics, tracer, name)
+
+
+def count(name: str, value: float = 1, **labels: str) -> None:
+    """counter加value,未启用时为no-op."""
+    metrics = _metrics
+    if metrics is not None:
+        metrics.inc(name, value, **labels)
+
+
+def observe(family: str, value: float, **labels: str) -> None:
+    """在histogram family中记录一个值,未启用时为no-op."""
+    metrics = _metrics
+    if metrics is not None:
+        metrics.observe(family, value, **labels)
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """在后台thread中提供/metrics(Prometheus text)与/metrics.json(JSON快照).
+    return: server,调用shutdown()停止."""
+    # http.server(及其依赖的ssl等)仅在需要时import
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            metrics = _metrics or Metrics()
+            if self.path == "/metrics":
+                body = metrics.to_prometheus().encode()
+                content_type = "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body = json.dumps(metrics.snapshot()).encode()
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            logger.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, name="bot_click-metrics", daemon=True
+    )
+    thread.start()
+    logger.info(f"serve metrics at http://{host}:{server.server_port}/metrics")
+    return server
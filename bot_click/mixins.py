@@ -1,23 +1,50 @@
 """bot_click mixins Libary.
 本模块中的内容为bot_click的封装，目的是作为Mixin类扩展.
+Mixin的方法作用于实例的bot_context,未设置时作用于当前的BotContext.
 """
+from __future__ import annotations
+
 import os
+from functools import wraps
 from pathlib import Path
-from typing import Callable, Iterable, List, Optional
-
-import cv2 as cv
+from typing import Any, Callable, Iterable, List, Optional, TypeVar
 
 from . import bot_click
+from ._lazy import cv
 from .bot_click import Point
+from .context import BotContext, use_context
+from .inputs import KeyTiming
+from .tracing import span
 
 _DEFAULT_TIMEOUT = int(os.environ.get("DEFAULT_TIMEOUT", "60"))  # in sec
 _DEFAULT_CHECK_INTERVAL = 5
 
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def _in_bot_context(func: F) -> F:
+    """用于Mixin方法，在实例的bot_context中执行,并记录为trace span."""
+
+    @wraps(func)
+    def wrapper(self: _BotContextMixin, *args: Any, **kwargs: Any) -> Any:
+        with use_context(self.bot_context):
+            with span(f"{type(self).__name__}.{func.__name__}", "mixin"):
+                return func(self, *args, **kwargs)
+
+    return wrapper  # type: ignore
+
+
+class _BotContextMixin:
+    """所有Mixin的基类.bot_context为None时，使用当前的BotContext."""
 
-class _CrossHairsMixin:
+    bot_context: Optional[BotContext] = None
+
+
+class _CrossHairsMixin(_BotContextMixin):
     """作为Mixin去使用，用于在指定画板上面指定点描绘crosshair."""
 
-    def mark_crosshair(self, folder: Path, point: Point) -> Path:
+    @_in_bot_context
+    def mark_crosshair(self, folder: Path, point: Point) -> Optional[Path]:
         """将当前屏幕以及点击区域描述并保存到指定文件夹."""
         return bot_click.mark_crosshair(folder, point)
 
@@ -33,55 +60,66 @@ class _ClickWithCrossHairMixin(_CrossHairsMixin):
             return self.mark_crosshair(folder=folder_path, point=point)
         return None
 
+    @_in_bot_context
     def click(
         self,
         point: Point,
-        duration: float = 0.4,
+        duration: Optional[float] = None,
         log_screenshot_folder: Optional[Path] = None,
     ) -> None:
-        """以指定速率移动鼠标到指定位置，并点击.
+        """沿human-like轨迹移动鼠标到指定位置，并点击.
         在点击前，会根据log_screenshot_folder对screenshot并标注点击处"""
         self._handle_crosshair(log_screenshot_folder, point)
         bot_click.click(point, duration=duration)
 
+    @_in_bot_context
     def double_click(
         self,
         point: Point,
-        duration: float = 0.4,
+        duration: Optional[float] = None,
         log_screenshot_folder: Optional[Path] = None,
     ) -> None:
-        """以指定速率移动鼠标到指定位置，并双击.
+        """沿human-like轨迹移动鼠标到指定位置，并双击.
         在点击前，会根据log_screenshot_folder对screenshot并标注点击处"""
         self._handle_crosshair(log_screenshot_folder, point)
         bot_click.double_click(point, duration=duration)
 
 
-class ScreenshotMixin:
+class ScreenshotMixin(_BotContextMixin):
     """作为Mixin去使用,增加take screenshot功能."""
 
+    @_in_bot_context
     def screenshot(self, file_path: str | Path) -> None:
         """Take screenshot返回保存文件路径."""
         bot_click.screenshot(file_path)
 
 
-class _SendKeysMixin:
+class _SendKeysMixin(_BotContextMixin):
     """作为Mixin去使用，进行键盘输入."""
 
+    @_in_bot_context
     def send_keys(
         self,
         message: str | List[str],
         append_enter: bool = False,
         log_screenshot_folder: Optional[Path] = None,
+        timing: Optional[KeyTiming] = None,
+        paste: bool = False,
     ) -> None:
         """向当前鼠标位置发送按键.
         screenshot_folder:输入后screenshot的保存位置,默认不保存.
         append_enter: 是否需要在字串后面追回回车键.
+        timing: 键盘输入的时间模型,默认为FixedInterval(0.1),见bot_click.send_keys.
+        paste: 为True且message为str时，通过剪贴板输入.
         如:
         send_keys('abc',True): 生成键盘事件:['a','b','c','enter']
         send_keys('abc',False):生成键盘事件:['a','b','c']
         send_keys(['a','b','c','enter']):生成键盘事件:['a','b','c','enter']"""
-        bot_click.send_keys(message, append_enter, log_screenshot_folder)
+        bot_click.send_keys(
+            message, append_enter, log_screenshot_folder, timing=timing, paste=paste
+        )
 
+    @_in_bot_context
     def hotkey(self, *keys: Iterable[str]) -> None:
         """在当前位置控制组合键.
         Example: hotkey('ctrl', 'shift', 'c'):"Ctrl-Shift-C" shortcut press."""
@@ -91,6 +129,7 @@ class _SendKeysMixin:
 class ClickWithSendKeysMixin(_ClickWithCrossHairMixin, _SendKeysMixin):
     """带有Click以及键盘输入的Mixin."""
 
+    @_in_bot_context
     def click_and_send_keys(
         self,
         message: str | List[str],
@@ -98,41 +137,55 @@ class ClickWithSendKeysMixin(_ClickWithCrossHairMixin, _SendKeysMixin):
         append_enter: bool = False,
         clear_before: bool = False,
         log_screenshot_folder: Optional[Path] = None,
+        timing: Optional[KeyTiming] = None,
+        paste: bool = False,
     ) -> None:
         """在指定位置先点击，再输入字串.
         clear_before: 是否在输入字串之前，先点击编辑处，再发送ctl+a，以及backspace
         append_enter: 是否需要在字串后面追回回车键
-        log_screenshot_folder:click之前截图并crosshair"""
+        log_screenshot_folder:click之前截图并crosshair
+        timing/paste: 输入方式，见send_keys"""
         if clear_before:
             self.click(point, log_screenshot_folder=log_screenshot_folder)
             self.hotkey("ctrl", "a")
             self.send_keys(["backspace"])
         self.click(point, log_screenshot_folder=log_screenshot_folder)
-        self.send_keys(message, append_enter, log_screenshot_folder)
+        self.send_keys(
+            message, append_enter, log_screenshot_folder, timing=timing, paste=paste
+        )
 
 
 class TextClickerMixin(_ClickWithCrossHairMixin):
     """作为Mixin去使用，用于等待，定位，点击指定单词."""
 
+    @_in_bot_context
     def click_by_word(
         self,
         text: str,
         confidence: float = 0.7,
         timeout: int = _DEFAULT_TIMEOUT,
-        duration: float = 0.4,
+        duration: Optional[float] = None,
         log_screenshot_folder: Optional[Path] = None,
         ocr_config: str = "",
         preprocess: Optional[Callable[[cv.Mat], cv.Mat]] = None,
         check_interval: int = _DEFAULT_CHECK_INTERVAL,
+        min_similarity: float = 1.0,
     ) -> None:
         """在当前屏幕可见区域查找单个单词（以空格分隔)，并点击.
         定位方法与规则见locate_word的参数说明
         Raises: NeedleNotFoundException"""
         point = self.locate_word(
-            text, confidence, timeout, ocr_config, preprocess, check_interval
+            text,
+            confidence,
+            timeout,
+            ocr_config,
+            preprocess,
+            check_interval,
+            min_similarity,
         )
         self.click(point, duration, log_screenshot_folder)
 
+    @_in_bot_context
     def locate_word(
         self,
         text: str,
@@ -141,6 +194,7 @@ class TextClickerMixin(_ClickWithCrossHairMixin):
         ocr_config: str = "",
         preprocess: Optional[Callable[[cv.Mat], cv.Mat]] = None,
         check_interval: int = _DEFAULT_CHECK_INTERVAL,
+        min_similarity: float = 1.0,
     ) -> Point:
         """在当前屏幕可见区域查找单个单词（以空格分隔),返回confidence最高的.
         匹配前会按preprocess做图像预处理。处理后的必须是opencv可识别的，
@@ -158,17 +212,19 @@ class TextClickerMixin(_ClickWithCrossHairMixin):
             ocr_config=ocr_config,
             preprocess=preprocess,
             check_interval=check_interval,
+            min_similarity=min_similarity,
         )
 
 
 class ImgClickerMixin(_ClickWithCrossHairMixin):
     """作为Mixin去使用，用于等待，定位，点击指定图像needle."""
 
+    @_in_bot_context
     def click_by_img(
         self,
         needle_path: Path,
         confidence: float = 0.7,
-        duration: float = 0.4,
+        duration: Optional[float] = None,
         timeout: int = _DEFAULT_TIMEOUT,
         log_screenshot_folder: Optional[Path] = None,
         check_interval: int = _DEFAULT_CHECK_INTERVAL,
@@ -178,7 +234,7 @@ class ImgClickerMixin(_ClickWithCrossHairMixin):
         匹配时，参考locate_img
 
         confidence: [0, 1.0],
-        duration: 移动鼠标时的速率
+        duration: 移动鼠标的时长(s),None时按距离自适应(Fitts' law)
         log_screenshot_folder: 描述了点击区域的中间图像
         Raises: NeedleNotFoundException
         Reference:
@@ -188,6 +244,7 @@ class ImgClickerMixin(_ClickWithCrossHairMixin):
         point = self.locate_img(needle_path, confidence, timeout, check_interval)
         self.click(point, duration, log_screenshot_folder)
 
+    @_in_bot_context
     def locate_img(
         self,
         needle_path: Path,
@@ -201,6 +258,7 @@ class ImgClickerMixin(_ClickWithCrossHairMixin):
         Raises: NeedleNotFoundException"""
         return bot_click.locate_img(needle_path, confidence, timeout, check_interval)
 
+    @_in_bot_context
     def locate_imgs(
         self,
         img_needles: List[bot_click.NeedleIMGCriteria],
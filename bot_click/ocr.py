@@ -0,0 +1,206 @@
+"""Columnar OCR result.
+pytesseract.image_to_data的结果(每个字段一个list)转换为NumPy structured array,
+每个识别出的单词一行，文字过滤，confidence过滤，分行以及box计算都是向量化的.
+同一行由(page_num, block_num, par_num, line_num)四元组标识:
+>>> data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+>>> match = OcrResult.from_data(data).match("Save password?", confidence=0.5)
+>>> match.center() if match is not None else None
+min_similarity小于1时为模糊匹配:所有单词一起与query的各单词计算编辑距离相似度，
+个别字符识别错误(如"Passw0rd", "Usemame")的单词也能匹配，排序时综合相似度与confidence.
+"""
+from __future__ import annotations
+
+import logging
+import string
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from ._lazy import np
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+_LINE_FIELDS = ("page_num", "block_num", "par_num", "line_num")
+_INT_FIELDS = _LINE_FIELDS + ("word_num", "left", "top", "width", "height")
+# 模糊匹配时忽略单词首尾的标点，如"Usemame:"与"Username"
+_PUNCTUATION = string.punctuation + "“”‘’«»…–—·•"
+
+
+def edit_distance(tokens: Sequence[str] | NDArray[Any], word: str) -> NDArray[np.int64]:
+    """每个token与word的Levenshtein距离.
+    所有token按字符位置排成矩阵一起计算，只按word的字符循环，每次循环处理一整行DP."""
+    texts = np.asarray(tokens, dtype=str)
+    if len(texts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    width = max(int(np.char.str_len(texts).max()), 1)
+    # 每个字符一个uint32(UCS-4),不足width的部分为0
+    codes = texts.astype(f"U{width}").view(np.uint32).reshape(len(texts), width)
+    cols = np.arange(width + 1)
+    # row[:, j]: token[:j]与word[:i]的距离
+    row = np.tile(cols, (len(texts), 1))
+    for i, char in enumerate(word, 1):
+        step = np.empty_like(row)
+        step[:, 0] = i
+        step[:, 1:] = np.minimum(row[:, 1:] + 1, row[:, :-1] + (codes != ord(char)))
+        # 插入:row[j] = min(step[j], row[j-1] + 1),即step - j的前缀最小值 + j
+        row = np.minimum.accumulate(step - cols, axis=1) + cols
+    distance: NDArray[np.int64] = row[np.arange(len(texts)), np.char.str_len(texts)]
+    return distance
+
+
+def similarity(tokens: Sequence[str] | NDArray[Any], word: str) -> NDArray[np.float64]:
+    """每个token与word的相似度:1 - 编辑距离 / 二者中较长的长度,完全相同时为1.
+    token与word首尾的标点不参与比较."""
+    texts = np.char.strip(np.asarray(tokens, dtype=str), _PUNCTUATION)
+    word = word.strip(_PUNCTUATION)
+    longest = np.maximum(np.char.str_len(texts), len(word)).clip(min=1)
+    score: NDArray[np.float64] = 1 - edit_distance(texts, word) / longest
+    return score
+
+
+def fuzzy_contains(text: str, query: str, min_similarity: float = 1.0) -> bool:
+    """text中是否包含query.min_similarity小于1时，
+    query的每个单词都须与text中某个单词的相似度不小于min_similarity."""
+    if query in text:
+        return True
+    if min_similarity >= 1:
+        return False
+    tokens = text.split()
+    return bool(tokens) and all(
+        similarity(tokens, word).max() >= min_similarity for word in query.split()
+    )
+
+
+class OcrResult:
+    """一组识别出的单词.
+    words: structured array,字段为text(定长unicode,长度为最长的单词),conf(0-100),
+    page_num, block_num, par_num, line_num, word_num, left, top, width, height."""
+
+    def __init__(self, words: NDArray[Any]) -> None:
+        """words的dtype见from_data."""
+        self.words = words
+
+    @classmethod
+    def from_data(cls, data: Mapping[str, Sequence[Any]]) -> OcrResult:
+        """由image_to_data(output_type=DICT)的结果新建,只保留识别出文字的单词."""
+        text = np.asarray(data["text"], dtype=str)
+        conf = np.asarray(data["conf"], dtype=np.float32)
+        # page/block/par/line level的conf为-1,text为空
+        keep = (conf >= 0) & (np.char.strip(text) != "")
+        width = int(np.char.str_len(text[keep]).max(initial=1))
+        dtype = [("text", f"U{width}"), ("conf", np.float32)]
+        dtype += [(name, np.int32) for name in _INT_FIELDS]
+        words = np.empty(int(keep.sum()), dtype=dtype)
+        words["text"] = text[keep]
+        words["conf"] = conf[keep]
+        for name in _INT_FIELDS:
+            words[name] = np.asarray(data[name], dtype=np.int32)[keep]
+        return cls(words)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __getitem__(self, index: Any) -> OcrResult:
+        """按mask或者下标选取单词."""
+        return OcrResult(self.words[index])
+
+    @property
+    def text(self) -> List[str]:
+        """所有单词."""
+        texts: List[str] = self.words["text"].tolist()
+        return texts
+
+    def line_ids(self) -> NDArray[np.intp]:
+        """每个单词所在行的编号(0到行数-1),同一(page, block, par, line)的单词编号相同."""
+        keys = np.stack([self.words[name] for name in _LINE_FIELDS], axis=1)
+        inverse: NDArray[np.intp] = np.unique(keys, axis=0, return_inverse=True)[1]
+        return inverse.reshape(-1)
+
+    def boxes(self) -> NDArray[np.int32]:
+        """每个单词的box: (left, top, right, bottom)."""
+        left, top = self.words["left"], self.words["top"]
+        right, bottom = left + self.words["width"], top + self.words["height"]
+        return np.stack([left, top, right, bottom], axis=1)
+
+    def line_boxes(self) -> NDArray[np.int32]:
+        """每一行(按line_ids编号)所有单词的外接box: (left, top, right, bottom)."""
+        lines, boxes = self.line_ids(), self.boxes()
+        count = int(lines.max(initial=-1)) + 1
+        result = np.empty((count, 4), dtype=np.int32)
+        result[:, :2] = np.iinfo(np.int32).max
+        result[:, 2:] = np.iinfo(np.int32).min
+        np.minimum.at(result[:, :2], lines, boxes[:, :2])
+        np.maximum.at(result[:, 2:], lines, boxes[:, 2:])
+        return result
+
+    def scores(self, query: str, min_similarity: float = 1.0) -> NDArray[np.float64]:
+        """每个单词与query中各单词的相似度,shape为(单词数, query的单词数).
+        min_similarity为1时只判断是否完全相同(0或1),不计算编辑距离."""
+        tokens = self.words["text"]
+        word_list = query.split()
+        if min_similarity >= 1 or len(tokens) == 0 or not word_list:
+            exact: NDArray[np.float64] = (tokens[:, None] == np.array(word_list)) * 1.0
+            return exact.reshape(len(tokens), len(word_list))
+        return np.stack([similarity(tokens, word) for word in word_list], axis=1)
+
+    def filter(
+        self, query: str, confidence: float, min_similarity: float = 1.0
+    ) -> OcrResult:
+        """与query中某个单词相似度不小于min_similarity(默认为完全相同),
+        或者包含整个query的单词，且confidence满足.
+        confidence: [0, 1.0],Tesseract的conf为0-100."""
+        tokens = self.words["text"]
+        scores = self.scores(query, min_similarity)
+        hits = (scores >= min_similarity).any(axis=1)
+        hits |= np.char.find(tokens, query) >= 0
+        threshold = min(int(confidence * 100), 100)
+        return self[hits & (self.words["conf"] >= threshold)]
+
+    def match(
+        self, query: str, confidence: float, min_similarity: float = 1.0
+    ) -> Optional[OcrResult]:
+        """同一行中包含query的所有单词(或者有单词包含整个query)的各行中，
+        得分最高的一行所匹配的单词.没有时为None.
+        单词的得分为confidence * 相似度，行的得分为其匹配的单词得分的平均值,
+        完全匹配时即为平均confidence."""
+        matched = self.filter(query, confidence, min_similarity)
+        if len(matched) == 0:
+            return None
+        tokens = matched.words["text"]
+        scores = matched.scores(query, min_similarity)
+        whole_token = np.char.find(tokens, query) >= 0
+        lines = matched.line_ids()
+        count = int(lines.max()) + 1
+        # 每一行包含了query中的哪些单词
+        covered = np.zeros((count, scores.shape[1]), dtype=bool)
+        np.logical_or.at(covered, lines, scores >= min_similarity)
+        whole = np.zeros(count, dtype=bool)
+        np.logical_or.at(whole, lines, whole_token)
+        complete = covered.all(axis=1) | whole
+        if not complete.any():
+            return None
+        best_score = np.where(whole_token, 1.0, scores.max(axis=1, initial=0))
+        weight = matched.words["conf"] * best_score
+        mean = np.bincount(lines, weight, count) / np.bincount(lines, minlength=count)
+        best = int(np.argmax(np.where(complete, mean, -1)))
+        return matched[lines == best]
+
+    def center(self) -> Tuple[int, int]:
+        """所有单词box的左上角与右下角的中点."""
+        boxes = self.boxes()
+        x = int(boxes[:, [0, 2]].sum()) // (2 * len(boxes))
+        y = int(boxes[:, [1, 3]].sum()) // (2 * len(boxes))
+        return x, y
+
+    def records(self) -> List[Dict[str, Any]]:
+        """每个单词一个dict,用于记录以及JSON."""
+        names = self.words.dtype.names or ()
+        return [dict(zip(names, row)) for row in self.words.tolist()]
+
+    def __repr__(self) -> str:
+        words = ", ".join(
+            f"{text}({conf:.0f})"
+            for text, conf in zip(self.text, self.words["conf"].tolist())
+        )
+        return f"{self.__class__.__name__}([{words}])"
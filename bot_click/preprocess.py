@@ -0,0 +1,295 @@
+"""Declarative preprocess pipelines.
+locate_word等的preprocess除了任意callable之外，也可以是由stage组成的Pipeline:
+>>> bot_click.locate_word("Close All", preprocess=Gray() | AdaptiveThreshold(11, 2))
+Pipeline是声明式的，参数相同的stage相等，所以同一frame的处理结果可以memoize:
+每个前缀(如Gray())在同一frame上只计算一次，由多个查询(如aio.wait_any的各needle)
+以及OCR与模板匹配(默认均为BGR)共享，见preprocess_frame.
+直接调用Pipeline时不做memoize,阈值等逐像素的stage原地处理上一个stage的结果，
+最后的结果可以写入调用方复用的buffer(out).
+Pipeline可以表示为JSON(spec),如worker的RPC:[["Gray"], ["Threshold", 200]],
+常用的pipeline也可以用名称(NAMED_PIPELINES的key,如"adaptive")指定，见parse_pipeline.
+"""
+from __future__ import annotations
+
+import collections
+import logging
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+from ._lazy import cv
+from .metrics import count
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+_StageKey = Tuple[Any, ...]
+# 所有Stage子类，按类名，用于由spec新建pipeline
+_stage_types: Dict[str, Type[Stage]] = {}
+
+
+class Stage(ABC):
+    """Pipeline中的一步,由类名以及参数标识,子类须实现apply.
+    inplace: apply的dst可以是src本身(逐像素的处理)."""
+
+    inplace = False
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        _stage_types[cls.__name__] = cls
+
+    def __init__(self, *params: Any) -> None:
+        """params用于比较，memoize以及spec,须为hashable且与子类__init__的参数一致."""
+        self.params = params
+
+    @property
+    def key(self) -> _StageKey:
+        """类名以及参数."""
+        return (self.__class__.__name__,) + self.params
+
+    @abstractmethod
+    def apply(self, src: NDArray[Any], dst: Optional[NDArray[Any]] = None) -> Any:
+        """处理src,结果写入dst(为None时新分配)并返回."""
+
+    def __call__(self, img: NDArray[Any]) -> Any:
+        return self.apply(img)
+
+    def __or__(self, other: Stage | Pipeline) -> Pipeline:
+        return Pipeline([self]) | other
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Stage) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({', '.join(map(repr, self.params))})"
+
+
+class Bgr(Stage):
+    """RGB转为BGR,即不做特殊处理时OCR以及模板匹配所使用的图像."""
+
+    def __init__(self) -> None:
+        super().__init__()
+
+    def apply(self, src: NDArray[Any], dst: Optional[NDArray[Any]] = None) -> Any:
+        return cv.cvtColor(src, cv.COLOR_RGB2BGR, dst=dst)
+
+
+class Gray(Stage):
+    """RGB转为GRAY."""
+
+    def __init__(self) -> None:
+        super().__init__()
+
+    def apply(self, src: NDArray[Any], dst: Optional[NDArray[Any]] = None) -> Any:
+        return cv.cvtColor(src, cv.COLOR_RGB2GRAY, dst=dst)
+
+
+class Threshold(Stage):
+    """固定阈值的二值化，如Threshold(200)将浅色的placeholder变为白色.
+    type: cv.THRESH_*,默认为THRESH_BINARY."""
+
+    inplace = True
+
+    def __init__(self, thresh: float, maxval: float = 255, type: int = 0) -> None:
+        super().__init__(thresh, maxval, type)
+
+    def apply(self, src: NDArray[Any], dst: Optional[NDArray[Any]] = None) -> Any:
+        thresh, maxval, type = self.params
+        return cv.threshold(src, thresh, maxval, type, dst=dst)[1]
+
+
+class AdaptiveThreshold(Stage):
+    """自适应阈值的二值化(ADAPTIVE_THRESH_GAUSSIAN_C, THRESH_BINARY),输入须为GRAY.
+    block_size: 计算阈值的邻域大小(奇数).c: 从邻域加权平均值中减去的常数."""
+
+    inplace = True
+
+    def __init__(self, block_size: int, c: float, maxval: float = 255) -> None:
+        super().__init__(block_size, c, maxval)
+
+    def apply(self, src: NDArray[Any], dst: Optional[NDArray[Any]] = None) -> Any:
+        block_size, c, maxval = self.params
+        return cv.adaptiveThreshold(
+            src,
+            maxval,
+            cv.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv.THRESH_BINARY,
+            block_size,
+            c,
+            dst=dst,
+        )
+
+
+class Pipeline:
+    """依次执行的stage,用|组合:Gray() | Threshold(200)."""
+
+    def __init__(self, stages: Iterable[Stage]) -> None:
+        self.stages = tuple(stages)
+
+    @property
+    def key(self) -> Tuple[_StageKey, ...]:
+        """所有stage的key."""
+        return tuple(stage.key for stage in self.stages)
+
+    def __call__(self, img: NDArray[Any], out: Optional[NDArray[Any]] = None) -> Any:
+        """依次执行所有stage,不会修改img.
+        inplace的stage直接写入上一个stage的结果，不另外分配buffer.
+        out: 最后一个stage的结果写入的buffer(shape与dtype须与结果一致),用于多次调用间复用."""
+        result = img
+        for index, stage in enumerate(self.stages):
+            dst = None
+            if index == len(self.stages) - 1:
+                dst = out
+            elif stage.inplace and result is not img:
+                dst = result
+            result = stage.apply(result, dst)
+        return result
+
+    def spec(self) -> List[List[Any]]:
+        """JSON可表示的形式:每个stage为[类名, 参数...]."""
+        return [[stage.__class__.__name__, *stage.params] for stage in self.stages]
+
+    @classmethod
+    def from_spec(cls, spec: Sequence[Sequence[Any]]) -> Pipeline:
+        """由spec新建.
+        Raises: ValueError 如果有未知的stage"""
+        stages = []
+        for name, *params in spec:
+            stage_type = _stage_types.get(name)
+            if stage_type is None:
+                raise ValueError(f"unknown preprocess stage {name!r}")
+            stages.append(stage_type(*params))
+        return cls(stages)
+
+    def __or__(self, other: Stage | Pipeline) -> Pipeline:
+        stages = other.stages if isinstance(other, Pipeline) else (other,)
+        return Pipeline(self.stages + stages)
+
+    def __len__(self) -> int:
+        return len(self.stages)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Pipeline) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return " | ".join(map(repr, self.stages)) or f"{self.__class__.__name__}()"
+
+
+# 不做特殊处理时OCR以及模板匹配所使用的图像
+BGR = Pipeline([Bgr()])
+
+# print_enhance_ocr_tip中推荐的预处理
+NAMED_PIPELINES: Dict[str, Pipeline] = {
+    "gray": Pipeline([Gray()]),
+    "binary200": Gray() | Threshold(200),
+    "adaptive": Gray() | AdaptiveThreshold(11, 2),
+}
+
+
+def parse_pipeline(spec: str | Sequence[Sequence[Any]]) -> Pipeline:
+    """由名称(NAMED_PIPELINES的key)或者spec(见Pipeline.spec)新建pipeline.
+    Raises: ValueError 如果名称或者stage未知"""
+    if isinstance(spec, str):
+        pipeline = NAMED_PIPELINES.get(spec)
+        if pipeline is None:
+            raise ValueError(f"unknown preprocess pipeline {spec!r}")
+        return pipeline
+    return Pipeline.from_spec(spec)
+
+
+class _FrameEntry:
+    def __init__(self, frame: NDArray[Any]) -> None:
+        self.ref = weakref.ref(frame)
+        self.results: Dict[Tuple[_StageKey, ...], Any] = {}
+        self.lock = threading.Lock()
+
+
+class FrameCache:
+    """按frame memoize pipeline每个前缀的结果.
+    frame以identity区分(截屏每次返回新的ndarray),最多保留最近的max_frames个frame,
+    已被释放的frame的结果随之丢弃.结果被多个查询共享，调用方不能原地修改."""
+
+    def __init__(self, max_frames: int = 4) -> None:
+        self.max_frames = max_frames
+        self._entries: collections.OrderedDict[
+            int, _FrameEntry
+        ] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, frame: NDArray[Any]) -> _FrameEntry:
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.ref() is None]:
+                del self._entries[key]
+            entry = self._entries.get(id(frame))
+            if entry is None or entry.ref() is not frame:
+                entry = self._entries[id(frame)] = _FrameEntry(frame)
+            self._entries.move_to_end(id(frame))
+            while len(self._entries) > self.max_frames:
+                self._entries.popitem(last=False)
+            return entry
+
+    def run(self, frame: NDArray[Any], pipeline: Pipeline) -> Any:
+        """frame经过pipeline的结果，从已计算的最长前缀继续."""
+        entry = self._entry(frame)
+        keys = pipeline.key
+        with entry.lock:
+            done, result = 0, frame
+            for end in range(len(keys), 0, -1):
+                if keys[:end] in entry.results:
+                    done, result = end, entry.results[keys[:end]]
+                    break
+            count("preprocess_stages", done, cached="true")
+            count("preprocess_stages", len(keys) - done, cached="false")
+            for end in range(done + 1, len(keys) + 1):
+                result = pipeline.stages[end - 1].apply(result)
+                entry.results[keys[:end]] = result
+        return result
+
+    def clear(self) -> None:
+        """丢弃所有结果."""
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = FrameCache()
+
+
+def preprocess_frame(
+    frame: NDArray[Any],
+    preprocess: Optional[Callable[[Any], Any]] = None,
+) -> Any:
+    """对截屏的frame(RGB)做预处理.
+    preprocess为None时转为BGR,Stage与Pipeline的结果按frame memoize,
+    其余callable直接调用."""
+    if preprocess is None:
+        preprocess = BGR
+    elif isinstance(preprocess, Stage):
+        preprocess = Pipeline([preprocess])
+    if isinstance(preprocess, Pipeline):
+        return _cache.run(frame, preprocess)
+    return preprocess(frame)
+
+
+def get_frame_cache() -> FrameCache:
+    """preprocess_frame所使用的FrameCache."""
+    return _cache
@@ -0,0 +1,119 @@
+"""In-memory flight recorder.
+FlightRecorder 在内存中以ring buffer保存最近N个截屏frame(缩小并JPEG压缩)以及
+每个frame上的匹配/OCR结果与所执行的操作,仅在出现异常时才写入磁盘.
+平时几乎没有I/O开销，出错时却有完整的上下文.
+>>> context = BotContext(recorder=FlightRecorder(capacity=30))
+>>> try:
+...     ...
+... except BotClickError:
+...     context.recorder.dump(Path(os.environ["SCREENSHOTS_FOLDER"]))
+"""
+from __future__ import annotations
+
+import collections
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional
+
+from ._lazy import cv, np
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value: Any) -> Any:
+    """numpy标量转为python标量，其它无法序列化的值转为str."""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class _Record:
+    """一个frame及其后发生的events."""
+
+    __slots__ = ("index", "timestamp", "jpeg", "events")
+
+    def __init__(self, index: int, timestamp: float, jpeg: Optional[bytes]) -> None:
+        self.index = index
+        self.timestamp = timestamp
+        self.jpeg = jpeg
+        self.events: List[Dict[str, Any]] = []
+
+
+class FlightRecorder:
+    """保存最近capacity个frame以及events的ring buffer.
+    scale: frame的缩放比例.
+    quality: JPEG质量."""
+
+    def __init__(
+        self, capacity: int = 30, scale: float = 0.5, quality: int = 70
+    ) -> None:
+        """capacity:最多保存的frame数."""
+        self.capacity = capacity
+        self.scale = scale
+        self.quality = quality
+        self._records: Deque[_Record] = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def record_frame(self, frame: NDArray[np.uint8]) -> None:
+        """缩小并压缩frame(RGB)后放入ring buffer."""
+        img = cv.cvtColor(frame, cv.COLOR_RGB2BGR)
+        if self.scale != 1:
+            img = cv.resize(
+                img, None, fx=self.scale, fy=self.scale, interpolation=cv.INTER_AREA
+            )
+        ok, encoded = cv.imencode(".jpg", img, [cv.IMWRITE_JPEG_QUALITY, self.quality])
+        with self._lock:
+            self._count += 1
+            self._records.append(
+                _Record(self._count, time.time(), encoded.tobytes() if ok else None)
+            )
+
+    def record_event(self, action: str, **detail: Any) -> None:
+        """记录一个event(如匹配结果,点击),归属于最近的frame."""
+        event = {"time": time.time(), "action": action, **detail}
+        with self._lock:
+            if not self._records:
+                self._records.append(_Record(0, event["time"], None))
+            self._records[-1].events.append(event)
+
+    def clear(self) -> None:
+        """清空ring buffer."""
+        with self._lock:
+            self._records.clear()
+
+    def dump(self, folder: Path, reason: str = "") -> Path:
+        """将ring buffer写入folder下新建的子目录:每个frame一个jpg,以及events.json.
+        frame坐标已按scale缩放，events中的坐标为原始屏幕坐标.
+        return: 子目录路径"""
+        with self._lock:
+            records = list(self._records)
+        now = datetime.now()
+        target = folder / f"flight_{now:%Y%m%d-%H%M%S}-{now.microsecond // 1000:03d}"
+        target.mkdir(parents=True, exist_ok=True)
+        index = []
+        for record in records:
+            filename = None
+            if record.jpeg is not None:
+                filename = f"frame_{record.index:06d}.jpg"
+                (target / filename).write_bytes(record.jpeg)
+            index.append(
+                {
+                    "frame": filename,
+                    "time": record.timestamp,
+                    "events": record.events,
+                }
+            )
+        summary = {"reason": reason, "scale": self.scale, "records": index}
+        (target / "events.json").write_text(
+            json.dumps(summary, indent=2, ensure_ascii=False, default=_json_default)
+        )
+        logger.warning(f"Dump flight recorder to {target}: {reason}")
+        return target
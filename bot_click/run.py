@@ -0,0 +1,272 @@
+"""Parallel scenario runner.
+发现scenario函数(默认为test_*),调度到多个worker进程中执行.
+每个worker进程拥有自己的Xvfb(DisplayPool),每个scenario执行前display都会被reset.
+所有worker的OCR/匹配job经过同一个scheduler(见scheduler module),限制整个主机上的并发.
+失败的scenario可以重试，每次执行的耗时，各stage的耗时以及artifact汇总在report.json中:
+>>> python -m bot_click.run examples/test_browser_standalone.py
+...     examples/test_browser_in_guca.py::test_windows_browser
+...     --workers 4 --ocr-concurrency 4 --retries 1 --artifacts /tmp/run
+scenario若有screenshots参数，则传入该次执行的artifact目录，
+同时SCREENSHOTS_FOLDER也被设置为该目录.
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import collections
+import fnmatch
+import importlib.util
+import inspect
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from multiprocessing.util import Finalize
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .displays import DisplayPool
+from .metrics import Metrics, disable_metrics, enable_metrics
+from .scheduler import LocalScheduler, SchedulerClient, SchedulerServer, set_scheduler
+
+logger = logging.getLogger(__name__)
+
+Scenario = collections.namedtuple("Scenario", ["path", "name"])
+
+
+def _scenario_id(scenario: Scenario) -> str:
+    return f"{scenario.path}::{scenario.name}"
+
+
+def _functions(path: Path, pattern: str) -> List[str]:
+    """path中与pattern匹配的顶层函数，只解析不import."""
+    tree = ast.parse(path.read_text(), str(path))
+    return [
+        node.name
+        for node in tree.body
+        if isinstance(node, ast.FunctionDef) and fnmatch.fnmatch(node.name, pattern)
+    ]
+
+
+def discover(targets: Iterable[str], pattern: str = "test_*") -> List[Scenario]:
+    """target可以是file.py::function, file.py,或者目录(其中的test_*.py)."""
+    scenarios = []
+    for target in targets:
+        file_name, _, name = target.partition("::")
+        path = Path(file_name).absolute()
+        if name:
+            scenarios.append(Scenario(path, name))
+            continue
+        files = sorted(path.glob("test_*.py")) if path.is_dir() else [path]
+        for file_path in files:
+            scenarios.extend(
+                Scenario(file_path, n) for n in _functions(file_path, pattern)
+            )
+    return scenarios
+
+
+# worker进程的状态
+_displays: Optional[DisplayPool] = None
+_modules: Dict[Path, ModuleType] = {}
+
+
+def _init_worker(size: Tuple[int, int], scheduler: str, log_level: int) -> None:
+    """worker进程的initializer:启动该进程的Xvfb,接入scheduler."""
+    global _displays
+    logging.basicConfig(
+        level=log_level,
+        format="%(asctime)s | %(process)d | %(name)s | %(levelname)s | %(message)s",
+    )
+    set_scheduler(SchedulerClient(scheduler))
+    _displays = DisplayPool(1, size).start()
+    Finalize(_displays, _displays.close, exitpriority=10)
+
+
+def _load(path: Path) -> ModuleType:
+    """import scenario所在的文件，其目录加入sys.path(与直接运行该文件时相同)."""
+    module = _modules.get(path)
+    if module is None:
+        if str(path.parent) not in sys.path:
+            sys.path.insert(0, str(path.parent))
+        spec = importlib.util.spec_from_file_location(f"scenario_{path.stem}", path)
+        if spec is None or spec.loader is None:
+            raise ImportError(f"Failed to load {path}")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[path] = module
+    return module
+
+
+def _stage_seconds(metrics: Metrics) -> Dict[str, float]:
+    return {
+        h["labels"]["stage"]: h["sum"]
+        for h in metrics.snapshot()["histograms"]
+        if h["name"] == "stage_seconds"
+    }
+
+
+def _run_one(scenario: Scenario, attempt: int, folder: Path) -> Dict[str, Any]:
+    """在worker进程中执行scenario一次."""
+    if _displays is None:
+        raise RuntimeError("the worker is not initialized")
+    folder.mkdir(parents=True, exist_ok=True)
+    result: Dict[str, Any] = {
+        "scenario": _scenario_id(scenario),
+        "attempt": attempt,
+        "pid": os.getpid(),
+    }
+    metrics = enable_metrics(Metrics())
+    start = time.perf_counter()
+    try:
+        with _displays.lease() as lease, lease.context:
+            result["display"] = lease.display
+            os.environ["DISPLAY"] = lease.display
+            os.environ["SCREENSHOTS_FOLDER"] = str(folder)
+            func = getattr(_load(scenario.path), scenario.name)
+            params = inspect.signature(func).parameters
+            func(**({"screenshots": folder} if "screenshots" in params else {}))
+        result["status"] = "passed"
+    except Exception as exc:
+        logger.exception(f"{_scenario_id(scenario)} failed")
+        result["status"] = "failed"
+        result["error"] = repr(exc)
+        result["traceback"] = traceback.format_exc()
+    finally:
+        disable_metrics()
+    result["duration"] = time.perf_counter() - start
+    result["stages"] = _stage_seconds(metrics)
+    result["ocr_calls"] = metrics.total("ocr_calls")
+    result["artifacts"] = sorted(
+        str(p.relative_to(folder)) for p in folder.rglob("*") if p.is_file()
+    )
+    return result
+
+
+def run(
+    scenarios: List[Scenario],
+    artifacts: Path,
+    workers: int = 1,
+    ocr_concurrency: Optional[int] = None,
+    retries: int = 0,
+    size: Tuple[int, int] = (1440, 900),
+) -> List[Dict[str, Any]]:
+    """执行scenarios,返回每次执行的结果(包括重试)，并写入artifacts/report.json.
+    ocr_concurrency: 主机上OCR/匹配job的最大并发，默认为CPU核数."""
+    ctx = multiprocessing.get_context("spawn")
+    socket_path = Path(tempfile.mkdtemp(prefix="bot_click_run_"), "scheduler.sock")
+    server = SchedulerServer(socket_path, LocalScheduler(ocr_concurrency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    level = logging.getLogger().getEffectiveLevel()
+    results: List[Dict[str, Any]] = []
+    executor = ProcessPoolExecutor(
+        workers, ctx, initializer=_init_worker, initargs=(size, str(socket_path), level)
+    )
+    try:
+        pending: Dict[Future[Dict[str, Any]], Tuple[Scenario, int]] = {}
+
+        def submit(scenario: Scenario, attempt: int) -> None:
+            name = f"{scenario.path.stem}.{scenario.name}"
+            folder = artifacts / name / f"attempt_{attempt}"
+            pending[executor.submit(_run_one, scenario, attempt, folder)] = (
+                scenario,
+                attempt,
+            )
+
+        for scenario in scenarios:
+            submit(scenario, 1)
+        while pending:
+            done: Set[Future[Dict[str, Any]]] = wait(
+                pending, return_when=FIRST_COMPLETED
+            ).done
+            for future in done:
+                scenario, attempt = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    # worker进程异常退出时整个process pool都不可用，不再重试
+                    result = {
+                        "scenario": _scenario_id(scenario),
+                        "attempt": attempt,
+                        "status": "failed",
+                        "error": repr(exc),
+                        "crashed": True,
+                    }
+                results.append(result)
+                logger.info(
+                    f"{result['scenario']} #{attempt}: {result['status']} "
+                    f"in {result.get('duration', 0):.1f}s"
+                )
+                retry = result["status"] != "passed" and attempt <= retries
+                if retry and not result.get("crashed"):
+                    submit(scenario, attempt + 1)
+    finally:
+        executor.shutdown()
+        server.shutdown()
+        server.server_close()
+    artifacts.mkdir(parents=True, exist_ok=True)
+    (artifacts / "report.json").write_text(json.dumps(results, indent=2))
+    return results
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    """每个scenario最后一次执行的结果."""
+    final: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        previous = final.get(result["scenario"])
+        if previous is None or result["attempt"] > previous["attempt"]:
+            final[result["scenario"]] = result
+    lines = [f"{'status':<7} {'tries':>5} {'duration':>9} {'ocr':>5}  scenario"]
+    for name, r in sorted(final.items()):
+        lines.append(
+            f"{r['status']:<7} {r['attempt']:>5} {r.get('duration', 0):>9.1f} "
+            f"{r.get('ocr_calls', 0):>5.0f}  {name}"
+        )
+    passed = sum(r["status"] == "passed" for r in final.values())
+    lines.append(f"{passed}/{len(final)} passed")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """return: exit code,有scenario最终失败时为1."""
+    parser = argparse.ArgumentParser(prog="python -m bot_click.run")
+    parser.add_argument("targets", nargs="+", help="file.py[::function] or folder")
+    parser.add_argument("-k", "--pattern", default="test_*")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--ocr-concurrency", type=int, default=None)
+    parser.add_argument("--retries", type=int, default=0)
+    parser.add_argument("--size", default="1440x900", help="Xvfb size, WxH")
+    parser.add_argument("--artifacts", type=Path, default=Path("run_artifacts"))
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s | %(name)s | %(levelname)s | %(lineno)d | %(message)s",
+    )
+    scenarios = discover(args.targets, args.pattern)
+    if not scenarios:
+        print("no scenario found")
+        return 1
+    width, height = (int(v) for v in args.size.split("x"))
+    results = run(
+        scenarios,
+        args.artifacts,
+        args.workers,
+        args.ocr_concurrency,
+        args.retries,
+        (width, height),
+    )
+    print(format_results(results))
+    print(f"report written to {args.artifacts / 'report.json'}")
+    final = {r["scenario"]: r["status"] for r in results}
+    return 0 if all(status == "passed" for status in final.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
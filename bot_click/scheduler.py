@@ -0,0 +1,304 @@
+"""OCR/matching scheduler.
+同一主机上的多个bot各自按check_interval调用Tesseract,调用时间重叠时会超额使用CPU,
+导致latency尖峰以及误报的timeout.启用scheduler后，所有OCR以及模板匹配job
+都需要先获得slot(默认为CPU核数)才执行:
+- 等待中的job按deadline(所属wait的timeout时刻)排序，越接近timeout越先执行.
+- 对同一frame的相同job(相同的key)在执行中时，后来者直接共享其结果，不再重复执行.
+LocalScheduler作用于单个进程;SchedulerServer通过Unix socket为整个主机提供admission,
+各进程通过SchedulerClient接入(job仍在各自的进程中执行，只有key,deadline以及结果经过socket):
+>>> python -m bot_click.scheduler --socket /tmp/bot_click_scheduler.sock --slots 8
+>>> set_scheduler(SchedulerClient("/tmp/bot_click_scheduler.sock"))
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    TypeVar,
+)
+
+from ._lazy import np
+from .metrics import count, stage
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Scheduler(Protocol):
+    """执行OCR/匹配job的scheduler."""
+
+    def run(
+        self,
+        func: Callable[[], T],
+        key: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> T:
+        """获得slot后执行func.
+        key: 相同key的job在执行中时共享其结果，None时不共享.
+        deadline: 所属wait的timeout时刻(time.time()),None时为当前时刻."""
+
+
+class _Flight:
+    """执行中的job."""
+
+    __slots__ = ("done", "ok", "result")
+
+    def __init__(self) -> None:
+        self.done = False
+        self.ok = False
+        self.result: Any = None
+
+
+class LocalScheduler:
+    """进程内的scheduler,最多同时执行slots个job(默认为CPU核数).
+    SchedulerServer也用它为所有client做admission."""
+
+    def __init__(self, slots: Optional[int] = None) -> None:
+        """slots: 同时执行的job数."""
+        self.slots = slots or os.cpu_count() or 1
+        self._active = 0
+        self._queue: List[List[float]] = []
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, key: Hashable, deadline: Optional[float]) -> Tuple[bool, Any]:
+        """等待slot.
+        return: (True, None)表示获得slot,执行完成后须调用release;
+        (False, result)表示相同key的job已由其它调用方执行完成."""
+        priority = time.time() if deadline is None else deadline
+        entry: Optional[List[float]] = None
+        with self._cond:
+            while True:
+                flight = self._inflight.get(key)
+                if flight is not None:
+                    if entry is not None:
+                        self._queue.remove(entry)
+                        heapq.heapify(self._queue)
+                        entry = None
+                        self._cond.notify_all()
+                    while not flight.done:
+                        self._cond.wait()
+                    if flight.ok:
+                        return False, flight.result
+                    continue
+                if entry is None:
+                    entry = [priority, next(self._seq)]
+                    heapq.heappush(self._queue, entry)
+                if self._active < self.slots and self._queue[0] is entry:
+                    heapq.heappop(self._queue)
+                    self._active += 1
+                    self._inflight[key] = _Flight()
+                    self._cond.notify_all()
+                    return True, None
+                self._cond.wait()
+
+    def release(self, key: Hashable, ok: bool, result: Any) -> None:
+        """释放slot.ok为True时，等待相同key的调用方共享result,否则它们自行执行."""
+        with self._cond:
+            self._active -= 1
+            flight = self._inflight.pop(key)
+            flight.done, flight.ok, flight.result = True, ok, result
+            self._cond.notify_all()
+
+    def run(
+        self,
+        func: Callable[[], T],
+        key: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> T:
+        """见Scheduler.run."""
+        ticket: Hashable = object() if key is None else key
+        with stage("schedule"):
+            run_it, result = self.acquire(ticket, deadline)
+        if not run_it:
+            count("coalesced_jobs")
+            shared: T = result
+            return shared
+        try:
+            result = func()
+        except BaseException:
+            self.release(ticket, False, None)
+            raise
+        self.release(ticket, True, result)
+        return result
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """每个连接对应一个job:
+    client: {"key", "deadline"}
+    server: {"result": ...}(共享的结果)或者{"grant": true}
+    获得grant的client执行job后: {"result": ...}或者{"error": ...}"""
+
+    server: SchedulerServer
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        scheduler = self.server.scheduler
+        key: Hashable = request.get("key") or object()
+        run_it, result = scheduler.acquire(key, request.get("deadline"))
+        if not run_it:
+            self._send({"result": result})
+            return
+        ok, result = False, None
+        try:
+            self._send({"grant": True})
+            reply = self.rfile.readline()
+            if reply:
+                response = json.loads(reply)
+                ok, result = "result" in response, response.get("result")
+        finally:
+            # client断开时也释放slot
+            scheduler.release(key, ok, result)
+
+    def _send(self, response: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+        self.wfile.flush()
+
+
+class SchedulerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """为整个主机提供admission的Unix socket server."""
+
+    daemon_threads = True
+
+    def __init__(
+        self, socket_path: str | Path, scheduler: Optional[LocalScheduler] = None
+    ) -> None:
+        """已存在的socket文件会被删除."""
+        self.scheduler = scheduler or LocalScheduler()
+        self.socket_path = Path(socket_path)
+        self.socket_path.unlink(missing_ok=True)
+        super().__init__(str(self.socket_path), _Handler)
+
+    def server_close(self) -> None:
+        """关闭并删除socket文件."""
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+
+class SchedulerClient:
+    """通过SchedulerServer获得slot,job在当前进程执行.
+    无法连接server时直接执行job(并记录warning),scheduler不可用不会导致bot失败."""
+
+    def __init__(self, socket_path: str | Path) -> None:
+        """每个job使用一个新的连接，不会立即连接."""
+        self.socket_path = str(socket_path)
+
+    def run(
+        self,
+        func: Callable[[], T],
+        key: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> T:
+        """见Scheduler.run.共享的结果经过JSON,tuple会变为list."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as exc:
+            sock.close()
+            logger.warning(f"scheduler {self.socket_path} is unavailable: {exc}")
+            return func()
+        with sock, sock.makefile("rwb") as stream:
+            request = {"key": key, "deadline": deadline}
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            with stage("schedule"):
+                line = stream.readline()
+            response: Dict[str, Any] = json.loads(line) if line else {}
+            if "result" in response:
+                count("coalesced_jobs")
+                shared: T = response["result"]
+                return shared
+            try:
+                result = func()
+            except Exception as exc:
+                stream.write(json.dumps({"error": repr(exc)}).encode() + b"\n")
+                stream.flush()
+                raise
+            try:
+                reply = json.dumps({"result": result})
+            except TypeError:
+                reply = json.dumps({"error": "result is not JSON serializable"})
+            stream.write(reply.encode() + b"\n")
+            stream.flush()
+            return result
+
+
+def job_key(*parts: Any) -> str:
+    """由job的类型，参数以及图像内容生成key."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(f"{part.shape}{part.dtype}".encode())
+            digest.update(np.ascontiguousarray(part).data)
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+_scheduler: Optional[Scheduler] = None
+
+
+def get_scheduler() -> Optional[Scheduler]:
+    """进程级的scheduler,未设置时为None,即job直接执行."""
+    return _scheduler
+
+
+def set_scheduler(scheduler: Optional[Scheduler]) -> None:
+    """设置进程级的scheduler,None时job直接执行."""
+    global _scheduler
+    _scheduler = scheduler
+
+
+def schedule(func: Callable[[], T], deadline: Optional[float], *key: Any) -> T:
+    """通过进程级的scheduler执行func,未设置scheduler时直接执行.
+    key: 用于生成job key的job类型，参数以及图像."""
+    scheduler = _scheduler
+    if scheduler is None:
+        return func()
+    return scheduler.run(func, job_key(*key), deadline)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """python -m bot_click.scheduler的入口."""
+    parser = argparse.ArgumentParser(prog="python -m bot_click.scheduler")
+    parser.add_argument("--socket", default="/tmp/bot_click_scheduler.sock")
+    parser.add_argument("--slots", type=int, default=None, help="default: CPU cores")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    server = SchedulerServer(args.socket, LocalScheduler(args.slots))
+    server.socket_path.chmod(0o666)
+    logger.info(f"scheduler with {server.scheduler.slots} slots at {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
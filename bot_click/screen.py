@@ -0,0 +1,276 @@
+"""Screen sources.
+BotContext通过ScreenSource截屏，可按BotContext或者全局指定:
+XScreen: 截取X display(默认).
+FrameSource: 返回调用方设置的frame,用于benchmark等.
+ImageDirectory: 依次返回目录中的图片.
+VideoFile: 依次返回视频文件中的frame.
+RecordedSession: 回放FlightRecorder.dump的目录或者VideoArtifactWriter的索引.
+CroppedScreen: 只截取另一个source的某个区域(Region),见BotContext.restrict.
+序列类的source每次截屏前进一帧，结束后保持最后一帧(即静止的屏幕)，
+可以在没有display的情况下以全速对录制的session做OCR与匹配:
+>>> with BotContext(screen=RecordedSession(Path("/tmp/.debug/flight_xxx"))):
+...     bot_click.locate_word("Login", timeout=1, check_interval=0)
+"""
+from __future__ import annotations
+
+import collections
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional, Protocol, Tuple
+
+from ._lazy import Image, ImageGrab, cv, np
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+Region = collections.namedtuple("Region", ["left", "top", "width", "height"])
+
+
+class ScreenSource(Protocol):
+    """BotContext所使用的截屏来源."""
+
+    def grab(self) -> NDArray[np.uint8]:
+        """截取整个屏幕(RGB)."""
+
+    def close(self) -> None:
+        """释放source所占用的资源."""
+
+
+class XScreen:
+    """截取X display.display为None时使用$DISPLAY."""
+
+    def __init__(self, display: Optional[str] = None) -> None:
+        """不会立即连接display."""
+        self.display = display
+
+    def grab(self) -> NDArray[np.uint8]:
+        """截取整个display."""
+        return np.array(ImageGrab.grab(xdisplay=self.display))
+
+    def close(self) -> None:
+        """ImageGrab每次截屏都会新建连接，无需释放."""
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.display!r})"
+
+
+class FrameSource:
+    """返回调用方设置的frame(RGB)."""
+
+    def __init__(self, frame: Optional[NDArray[np.uint8]] = None) -> None:
+        """frame可在之后通过属性设置."""
+        self.frame = frame
+
+    def grab(self) -> NDArray[np.uint8]:
+        """当前的frame.
+        Raises: RuntimeError 如果尚未设置frame"""
+        if self.frame is None:
+            raise RuntimeError("FrameSource has no frame")
+        return self.frame
+
+    def close(self) -> None:
+        """无需释放."""
+
+
+class CroppedScreen:
+    """截取source中的region.source由调用方所有，close时不会释放."""
+
+    def __init__(self, source: ScreenSource, region: Region) -> None:
+        """region超出屏幕的部分被忽略."""
+        self.source = source
+        self.region = region
+
+    def grab(self) -> NDArray[np.uint8]:
+        """截取region."""
+        left, top, width, height = self.region
+        bottom, right = top + height, left + width
+        return self.source.grab()[top:bottom, left:right]
+
+    def close(self) -> None:
+        """source由调用方释放."""
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.source!r}, {self.region})"
+
+
+def detect_viewport(
+    before: NDArray[np.uint8],
+    after: NDArray[np.uint8],
+    threshold: int = 32,
+    min_fraction: float = 0.5,
+    min_size: Tuple[int, int] = (100, 100),
+) -> Optional[Region]:
+    """对比窗口内容切换前后的两个frame,检测内容所在的区域,如浏览器中的远程桌面canvas.
+    浏览器的tab,地址栏等只有少量像素变化，而内容区域的大部分像素都发生变化:
+    超过min_fraction的像素变化(任一通道之差大于threshold)的行与列即为内容区域.
+    return: 内容区域，小于min_size(width, height)或者frame大小不一致时为None."""
+    if before.shape != after.shape:
+        return None
+    diff = np.abs(after.astype(np.int16) - before.astype(np.int16)) > threshold
+    changed = diff.reshape(diff.shape[0], diff.shape[1], -1).max(axis=2)
+    rows = np.flatnonzero(changed.mean(axis=1) >= min_fraction)
+    if len(rows) == 0:
+        return None
+    top, bottom = int(rows[0]), int(rows[-1]) + 1
+    cols = np.flatnonzero(changed[top:bottom].mean(axis=0) >= min_fraction)
+    if len(cols) == 0:
+        return None
+    left, right = int(cols[0]), int(cols[-1]) + 1
+    if right - left < min_size[0] or bottom - top < min_size[1]:
+        return None
+    return Region(left, top, right - left, bottom - top)
+
+
+class _SequenceSource(ABC):
+    """每次grab前进一帧，结束后保持最后一帧.loop为True时从头开始.
+    子类以_iter_frames给出所有frame."""
+
+    def __init__(self, loop: bool = False) -> None:
+        self.loop = loop
+        self.position = 0
+        self._frames: Optional[Iterator[NDArray[np.uint8]]] = None
+        self._last: Optional[NDArray[np.uint8]] = None
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _iter_frames(self) -> Iterator[NDArray[np.uint8]]:
+        """从头迭代所有frame(RGB)."""
+
+    @property
+    def exhausted(self) -> bool:
+        """是否已经返回了最后一帧."""
+        return self._frames is None and self._last is not None
+
+    def grab(self) -> NDArray[np.uint8]:
+        """下一帧，结束后为最后一帧.
+        Raises: ValueError 如果source中没有任何frame"""
+        with self._lock:
+            if self._frames is None and self._last is None:
+                self._frames = self._iter_frames()
+            if self._frames is not None:
+                frame = next(self._frames, None)
+                if frame is None and self.loop and self._last is not None:
+                    self._frames = self._iter_frames()
+                    frame = next(self._frames, None)
+                if frame is not None:
+                    self._last = frame
+                    self.position += 1
+                    return frame
+                self._frames = None
+            if self._last is None:
+                raise ValueError(f"{self} has no frame")
+            return self._last
+
+    def close(self) -> None:
+        """停止迭代."""
+        with self._lock:
+            self._frames = None
+
+
+class ImageDirectory(_SequenceSource):
+    """依次返回folder中与pattern匹配的图片(按文件名排序)."""
+
+    def __init__(
+        self, folder: Path, pattern: str = "*.png", loop: bool = False
+    ) -> None:
+        """图片在grab时才读取."""
+        super().__init__(loop)
+        self.folder = folder
+        self.paths = sorted(folder.glob(pattern))
+
+    def _iter_frames(self) -> Iterator[NDArray[np.uint8]]:
+        for path in self.paths:
+            with Image.open(path) as img:
+                yield np.array(img.convert("RGB"))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({str(self.folder)!r})"
+
+
+class VideoFile(_SequenceSource):
+    """依次返回视频文件中的frame.
+    step: 每次前进的帧数，用于跳过相似的frame."""
+
+    def __init__(self, path: Path, step: int = 1, loop: bool = False) -> None:
+        """视频在首次grab时才打开."""
+        super().__init__(loop)
+        self.path = path
+        self.step = step
+
+    def _iter_frames(self) -> Iterator[NDArray[np.uint8]]:
+        capture = cv.VideoCapture(str(self.path))
+        if not capture.isOpened():
+            raise ValueError(f"Failed to open {self.path}")
+        try:
+            index = 0
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                if index % self.step == 0:
+                    yield np.asarray(cv.cvtColor(frame, cv.COLOR_BGR2RGB), np.uint8)
+                index += 1
+        finally:
+            capture.release()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({str(self.path)!r})"
+
+
+class RecordedSession(_SequenceSource):
+    """回放录制的session.
+    path: FlightRecorder.dump生成的目录(frame缩放回原始屏幕坐标)，
+    或者VideoArtifactWriter生成的.json索引/视频文件."""
+
+    def __init__(self, path: Path, loop: bool = False) -> None:
+        """frame在grab时才读取."""
+        super().__init__(loop)
+        self.path = path
+        self._video: Optional[VideoFile] = None
+        if not path.is_dir():
+            index = path.with_suffix(".json")
+            video = path
+            if index.exists():
+                video = path.parent / json.loads(index.read_text())["video"]
+            self._video = VideoFile(video)
+
+    def _iter_frames(self) -> Iterator[NDArray[np.uint8]]:
+        if self._video is not None:
+            yield from self._video._iter_frames()
+            return
+        summary = json.loads((self.path / "events.json").read_text())
+        scale = summary.get("scale", 1) or 1
+        for record in summary["records"]:
+            if record["frame"] is None:
+                continue
+            img = cv.imread(str(self.path / record["frame"]))
+            if img is None:
+                logger.warning(f"Failed to read {record['frame']}, skip")
+                continue
+            if scale != 1:
+                img = cv.resize(
+                    img, None, fx=1 / scale, fy=1 / scale, interpolation=cv.INTER_LINEAR
+                )
+            yield np.asarray(cv.cvtColor(img, cv.COLOR_BGR2RGB), np.uint8)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({str(self.path)!r})"
+
+
+_default: Optional[ScreenSource] = None
+
+
+def get_default_screen() -> Optional[ScreenSource]:
+    """全局的ScreenSource,未设置时为None,即各BotContext截取其display."""
+    return _default
+
+
+def set_default_screen(screen: Optional[ScreenSource]) -> None:
+    """设置全局的ScreenSource,用于未指定screen的BotContext.None时恢复截取display."""
+    global _default
+    _default = screen
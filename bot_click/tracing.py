@@ -0,0 +1,197 @@
+"""Chrome trace-event timeline.
+Tracer 将bot_click的公开函数，mixin方法以及内部阶段(capture, ocr, match, sleep等)
+记录为嵌套的span,导出为Chrome trace-event JSON,可在Perfetto或者chrome://tracing中查看
+单次场景的时间线.每个span带有thread以及display.
+默认关闭，关闭时每个埋点只有一次全局变量检查.
+>>> enable_tracing(Path("/tmp/.debug/trace.json"))
+>>> bot_click.click_by_word("Login")
+>>> get_tracer().save()
+"""
+from __future__ import annotations
+
+import atexit
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+from types import TracebackType
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    ParamSpec,
+    Type,
+    TypeVar,
+)
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+class _Span:
+    """记录with block为一个complete event("X")."""
+
+    __slots__ = ("_tracer", "_name", "_cat", "_args", "_start")
+
+    def __init__(
+        self, tracer: Tracer, name: str, cat: str, args: Dict[str, Any]
+    ) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._cat = cat
+        self._args = args
+        self._start = 0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter_ns()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self._args["error"] = exc_type.__name__
+        self._tracer.complete(self._name, self._cat, self._start, end, self._args)
+
+
+class Tracer:
+    """收集trace events,save时写入path.
+    max_events: 最多保存的event数，超过后丢弃新的event."""
+
+    def __init__(self, path: Path, max_events: int = 1_000_000) -> None:
+        """path:trace JSON文件路径."""
+        self.path = path
+        self.max_events = max_events
+        self.dropped = 0
+        self._events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def span(self, name: str, cat: str = "bot_click", **args: Any) -> _Span:
+        """with block记录为名为name的span."""
+        return _Span(self, name, cat, args)
+
+    def complete(
+        self, name: str, cat: str, start_ns: int, end_ns: int, args: Dict[str, Any]
+    ) -> None:
+        """记录一个已结束的span(时间为time.perf_counter_ns)."""
+        tid = threading.get_native_id()
+        args.setdefault("display", _current_display())
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self._pid,
+            "tid": tid,
+            "args": args,
+        }
+        with self._lock:
+            if tid not in self._threads:
+                self._threads[tid] = threading.current_thread().name
+            if len(self._events) >= self.max_events:
+                self.dropped += 1
+                return
+            self._events.append(event)
+
+    def clear(self) -> None:
+        """清空已收集的events."""
+        with self._lock:
+            self._events.clear()
+
+    def to_json(self) -> Dict[str, Any]:
+        """Chrome trace-event JSON object format."""
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in threads.items()
+        ]
+        return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        """将trace写入path(默认为self.path)."""
+        path = path or self.path
+        path.parent.mkdir(exist_ok=True, parents=True)
+        path.write_text(json.dumps(self.to_json(), default=str))
+        logger.info(f"save the trace to {path}, dropped {self.dropped} events")
+        return path
+
+
+def _current_display() -> Optional[str]:
+    """当前BotContext的display."""
+    # context module依赖于metrics/tracing,故在此延迟import
+    from .context import get_context
+
+    return get_context().display or os.environ.get("DISPLAY")
+
+
+_tracer: Optional[Tracer] = None
+_NULL = contextlib.nullcontext()
+
+
+def get_tracer() -> Optional[Tracer]:
+    """进程级的Tracer,未启用时为None."""
+    return _tracer
+
+
+def enable_tracing(path: Path, max_events: int = 1_000_000) -> Tracer:
+    """启用进程级的Tracer,进程退出时写入path."""
+    global _tracer
+    disable_tracing()
+    _tracer = Tracer(path, max_events)
+    atexit.register(_tracer.save)
+    return _tracer
+
+
+def disable_tracing() -> None:
+    """关闭tracing,已收集的events会先写入文件."""
+    global _tracer
+    if _tracer is not None:
+        atexit.unregister(_tracer.save)
+        _tracer.save()
+    _tracer = None
+
+
+def span(name: str, cat: str = "bot_click", **args: Any) -> ContextManager[None]:
+    """with block记录为名为name的span,未启用时为no-op."""
+    tracer = _tracer
+    if tracer is None:
+        return _NULL
+    return tracer.span(name, cat, **args)
+
+
+def traced(func: Callable[P, R]) -> Callable[P, R]:
+    """用于function/method,每次调用记录为一个span(名为__qualname__)."""
+    name, cat = func.__qualname__, func.__module__
+
+    @wraps(func)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        tracer = _tracer
+        if tracer is None:
+            return func(*args, **kwargs)
+        with tracer.span(name, cat):
+            return func(*args, **kwargs)
+
+    return wrapper
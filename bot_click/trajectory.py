@@ -0,0 +1,118 @@
+"""Human-like mouse trajectory.
+一次性用NumPy生成整条鼠标轨迹(points, times),再交给input backend的move_path注入:
+1. 路径:起点到终点的三次Bezier曲线，控制点在垂直方向随机偏移，使轨迹略带弧度.
+2. 速度:minimum-jerk profile(10t^3 - 15t^4 + 6t^5),起止慢，中间快.
+3. 抖动:叠加在两端衰减为0的高斯抖动，不影响起点与终点的准确性.
+4. 时长:未指定时按Fitts' law: T = a + b * log2(D / W + 1),短距离更快，长距离更自然.
+>>> points, times = Trajectory(seed=1).plan((0, 0), (800, 300))
+"""
+from __future__ import annotations
+
+import logging
+import math
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from ._lazy import np
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+
+def fitts_duration(
+    distance: float,
+    target_width: float = 20,
+    a: float = 0.08,
+    b: float = 0.1,
+    minimum: float = 0.05,
+    maximum: float = 1.2,
+) -> float:
+    """按Fitts' law计算移动时长(s): a + b * log2(distance / target_width + 1).
+    结果限制在[minimum, maximum]之间."""
+    index_of_difficulty = math.log2(distance / max(target_width, 1) + 1)
+    return min(max(a + b * index_of_difficulty, minimum), maximum)
+
+
+def minimum_jerk(t: NDArray[np.float64]) -> NDArray[np.float64]:
+    """minimum-jerk位移profile,t与返回值均在[0, 1]."""
+    return t**3 * (10 - 15 * t + 6 * t**2)
+
+
+class Trajectory:
+    """鼠标轨迹生成器.
+    rate: 每秒的采样点数.
+    curvature: Bezier控制点垂直偏移的最大比例(相对于距离).
+    jitter: 高斯抖动的标准差(pixel).
+    target_width/fitts_a/fitts_b: 见fitts_duration.
+    seed: 随机数种子，默认不固定."""
+
+    def __init__(
+        self,
+        rate: int = 120,
+        curvature: float = 0.15,
+        jitter: float = 0.8,
+        target_width: float = 20,
+        fitts_a: float = 0.08,
+        fitts_b: float = 0.1,
+        seed: Optional[int] = None,
+    ) -> None:
+        """参数见class说明."""
+        self.rate = rate
+        self.curvature = curvature
+        self.jitter = jitter
+        self.target_width = target_width
+        self.fitts_a = fitts_a
+        self.fitts_b = fitts_b
+        self._rng = np.random.default_rng(seed)
+
+    def duration(self, distance: float) -> float:
+        """按Fitts' law计算移动distance所需的时长(s)."""
+        return fitts_duration(distance, self.target_width, self.fitts_a, self.fitts_b)
+
+    def plan(
+        self,
+        start: Tuple[int, int],
+        end: Tuple[int, int],
+        duration: Optional[float] = None,
+    ) -> Tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """生成从start到end的轨迹.
+        duration:None时按Fitts' law自适应.
+        return: (points, times). points为shape (N, 2)的整数坐标，最后一点必为end;
+        times为每个点相对于开始移动的时间(s),单调递增."""
+        p0 = np.asarray(start, dtype=np.float64)
+        p3 = np.asarray(end, dtype=np.float64)
+        delta = p3 - p0
+        distance = float(np.hypot(*delta))
+        if duration is None:
+            duration = self.duration(distance)
+        count = max(int(duration * self.rate), 1)
+        if distance < 1 or duration <= 0:
+            return p3.astype(np.int64).reshape(1, 2), np.array([max(duration, 0.0)])
+
+        # 控制点在1/3, 2/3处，沿法线方向随机偏移，得到一条自然的弧线
+        normal = np.array([-delta[1], delta[0]]) / distance
+        offsets = self._rng.uniform(-self.curvature, self.curvature, 2) * distance
+        p1 = p0 + delta / 3 + normal * offsets[0]
+        p2 = p0 + delta * 2 / 3 + normal * offsets[1]
+
+        times = np.linspace(0, 1, count + 1)[1:]
+        s = minimum_jerk(times)[:, None]
+        curve = (
+            (1 - s) ** 3 * p0
+            + 3 * (1 - s) ** 2 * s * p1
+            + 3 * (1 - s) * s**2 * p2
+            + s**3 * p3
+        )
+        # 抖动在两端衰减为0
+        taper = np.sin(np.pi * s)
+        curve += self._rng.normal(0, self.jitter, curve.shape) * taper
+        points = np.rint(curve).astype(np.int64)
+        points[-1] = p3
+        times = times * duration
+
+        # 去掉与前一点重复的坐标，减少注入的事件数
+        keep = np.ones(len(points), dtype=bool)
+        keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+        keep[-1] = True
+        return points[keep], times[keep]
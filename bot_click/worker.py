@@ -0,0 +1,405 @@
+"""Long-lived bot worker with a local RPC API.
+worker进程常驻，保持以下资源warm,每个scenario只需通过Unix socket提交步骤:
+import好的OpenCV/NumPy/pytesseract, display(可选启动Xvfb)以及其输入连接，
+needle图像cache,可选的LocationCache以及可选的预先启动的浏览器.
+协议为每行一个JSON:
+    request: {"id": 1, "method": "locate_word", "params": {"text": "Login"}}
+    response: {"id": 1, "result": [x, y]} 或者 {"id": 1, "error": {"type", "message"}}
+同一个worker只有一个鼠标键盘，所以请求是串行执行的.
+>>> python -m bot_click.worker --socket /tmp/bot_click.sock --virtual-display 1440x900
+...     --launch "chromium --no-first-run http://192.168.254.168/"
+>>> with WorkerClient("/tmp/bot_click.sock") as worker:
+...     worker.click(worker.locate_word("Login", timeout=30))
+...     worker.send_keys("hello", append_enter=True)
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shlex
+import signal
+import socket
+import socketserver
+import subprocess
+import threading
+import time
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Dict, List, Optional, Type
+
+from . import bot_click
+from ._lazy import pytesseract
+from .bot_click import BotClickError, NeedleNotFoundError, Point
+from .cache import LocationCache
+from .context import BotContext, use_context
+from .inputs import FixedInterval, HumanInterval, Instant, KeyTiming
+from .preprocess import Pipeline, Stage, parse_pipeline
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_TIMEOUT = int(os.environ.get("DEFAULT_TIMEOUT", "60"))  # in sec
+_DEFAULT_CHECK_INTERVAL = 5
+
+
+class WorkerError(BotClickError):
+    """worker执行请求时出现的除NeedleNotFoundError之外的错误."""
+
+    pass
+
+
+def _timing(name: str, interval: float) -> KeyTiming:
+    """按名称选择键盘输入的时间模型:fixed, human, instant."""
+    if name == "human":
+        return HumanInterval()
+    if name == "instant":
+        return Instant()
+    return FixedInterval(interval)
+
+
+class Worker:
+    """在context中执行RPC请求.方法rpc_<name>即为RPC的method name.
+    location_cache: 设置时，locate_word/locate_img的cache参数为True时使用."""
+
+    def __init__(
+        self, context: BotContext, location_cache: Optional[LocationCache] = None
+    ) -> None:
+        """不会立即连接display,见warm_up."""
+        self.context = context
+        self.location_cache = location_cache
+        self.started_at = time.time()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        """提前import重型模块，连接输入backend并截屏一次，确认Tesseract可用."""
+        with use_context(self.context):
+            self.context.input.position()
+            self.context.screenshot_ndarray()
+        logger.info(f"tesseract {pytesseract.get_tesseract_version()} is ready")
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """执行一个请求，返回response."""
+        request_id = request.get("id")
+        method = getattr(self, f"rpc_{request.get('method')}", None)
+        if method is None:
+            error = {"type": "WorkerError", "message": f"no method {request}"}
+            return {"id": request_id, "error": error}
+        try:
+            with self._lock, use_context(self.context):
+                self.requests += 1
+                result = method(**request.get("params", {}))
+        except Exception as exc:
+            logger.exception(f"failed to handle {request}")
+            error = {"type": exc.__class__.__name__, "message": str(exc)}
+            return {"id": request_id, "error": error}
+        return {"id": request_id, "result": result}
+
+    def rpc_ping(self) -> Dict[str, Any]:
+        """worker的状态."""
+        return {
+            "pid": os.getpid(),
+            "display": self.context.display,
+            "uptime": time.time() - self.started_at,
+            "requests": self.requests,
+        }
+
+    def rpc_locate_word(
+        self,
+        text: str,
+        confidence: float = 0.7,
+        timeout: int = _DEFAULT_TIMEOUT,
+        ocr_config: str = "",
+        check_interval: int = _DEFAULT_CHECK_INTERVAL,
+        cache: bool = False,
+        min_similarity: float = 1.0,
+        preprocess: Optional[str | List[List[Any]]] = None,
+        tag: str = "",
+    ) -> List[int]:
+        """见bot_click.locate_word.等待单词出现也使用此方法.
+        preprocess: pipeline的名称(如"adaptive")或者spec(如[["Gray"], ["Threshold", 200]]),
+        见preprocess.parse_pipeline.
+        tag: 页面/场景名，cache的fingerprint,见bot_click.screen_fingerprint."""
+        pipeline = None if preprocess is None else parse_pipeline(preprocess)
+
+        def locate() -> Point:
+            return bot_click.locate_word(
+                text,
+                confidence,
+                timeout,
+                ocr_config,
+                pipeline,
+                check_interval=check_interval,
+                min_similarity=min_similarity,
+            )
+
+        settings = {
+            "confidence": confidence,
+            "ocr_config": ocr_config,
+            "min_similarity": min_similarity,
+            "preprocess": None if pipeline is None else pipeline.spec(),
+        }
+        return list(self._locate(f"word:{text}", locate, cache, tag, settings))
+
+    def rpc_locate_img(
+        self,
+        path: str,
+        confidence: float = 0.7,
+        timeout: int = _DEFAULT_TIMEOUT,
+        check_interval: int = _DEFAULT_CHECK_INTERVAL,
+        cache: bool = False,
+        tag: str = "",
+    ) -> List[int]:
+        """见bot_click.locate_img,path为worker可访问的文件路径.
+        tag: 页面/场景名，cache的fingerprint,见bot_click.screen_fingerprint."""
+
+        def locate() -> Point:
+            return bot_click.locate_img(Path(path), confidence, timeout, check_interval)
+
+        settings = {"confidence": confidence}
+        return list(self._locate(f"img:{path}", locate, cache, tag, settings))
+
+    def _locate(
+        self,
+        query: str,
+        locate: Any,
+        cache: bool,
+        tag: str,
+        settings: Dict[str, Any],
+    ) -> Point:
+        """cache为True时经过LocationCache.
+        查找参数(settings)计入fingerprint,不同参数下找到的位置互不复用,
+        而rpc_invalidate(query)仍可清除该query在所有参数下的cache."""
+        if cache and self.location_cache is not None:
+            fingerprint = (
+                f"{bot_click.screen_fingerprint(tag)}"
+                f"#{json.dumps(settings, sort_keys=True)}"
+            )
+            return self.location_cache.locate(query, locate, fingerprint)
+        point: Point = locate()
+        return point
+
+    def rpc_click(
+        self, x: int, y: int, duration: Optional[float] = None, clicks: int = 1
+    ) -> None:
+        """见bot_click.click/double_click."""
+        if clicks == 2:
+            bot_click.double_click(Point(x, y), duration)
+        else:
+            bot_click.click(Point(x, y), duration)
+
+    def rpc_move_to(self, x: int, y: int, duration: Optional[float] = None) -> None:
+        """见bot_click.move_to."""
+        bot_click.move_to(Point(x, y), duration)
+
+    def rpc_send_keys(
+        self,
+        message: str | List[str],
+        append_enter: bool = False,
+        paste: bool = False,
+        timing: str = "fixed",
+        interval: float = 0.1,
+    ) -> None:
+        """见bot_click.send_keys.timing: fixed, human或者instant."""
+        bot_click.send_keys(
+            message,
+            append_enter,
+            timing=_timing(timing, interval),
+            paste=paste,
+        )
+
+    def rpc_hotkey(self, keys: List[str]) -> None:
+        """见bot_click.hotkey."""
+        bot_click.hotkey(keys)
+
+    def rpc_position(self) -> List[int]:
+        """当前鼠标位置."""
+        return list(bot_click.position())
+
+    def rpc_screenshot(self, path: str) -> str:
+        """截屏并保存到worker可访问的path."""
+        bot_click.screenshot(path)
+        return path
+
+    def rpc_fingerprint(self, tag: str = "") -> str:
+        """见bot_click.screen_fingerprint."""
+        return bot_click.screen_fingerprint(tag)
+
+    def rpc_invalidate(self, query: Optional[str] = None) -> None:
+        """清除LocationCache中的query,None时清除所有."""
+        if self.location_cache is not None:
+            self.location_cache.invalidate(query)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """一个连接上可以依次发送多个请求."""
+
+    server: WorkerServer
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as exc:
+                error = {"type": "ValueError", "message": str(exc)}
+                response: Dict[str, Any] = {"id": None, "error": error}
+            else:
+                response = self.server.worker.handle(request)
+            self.wfile.write(json.dumps(response, default=int).encode() + b"\n")
+            self.wfile.flush()
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """监听Unix socket的RPC server."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str | Path, worker: Worker) -> None:
+        """已存在的socket文件会被删除，socket仅当前用户可访问."""
+        self.worker = worker
+        self.socket_path = Path(socket_path)
+        self.socket_path.unlink(missing_ok=True)
+        super().__init__(str(self.socket_path), _Handler)
+        self.socket_path.chmod(0o600)
+
+    def server_close(self) -> None:
+        """关闭并删除socket文件."""
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+
+class WorkerClient:
+    """worker的client.
+    timeout: socket超时(s),None时一直等待(查找本身有timeout)."""
+
+    def __init__(self, socket_path: str | Path, timeout: Optional[float] = None):
+        """立即连接worker."""
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(str(socket_path))
+        self._file = self._sock.makefile("rwb")
+        self._next_id = 0
+
+    def call(self, method: str, **params: Any) -> Any:
+        """执行一个RPC请求并返回result.
+        Raises: NeedleNotFoundError, WorkerError"""
+        self._next_id += 1
+        request = {"id": self._next_id, "method": method, "params": params}
+        self._file.write(json.dumps(request).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise WorkerError(f"worker closed the connection during {method}")
+        response = json.loads(line)
+        error = response.get("error")
+        if error is None:
+            return response.get("result")
+        if error["type"] == "NeedleNotFoundError":
+            raise NeedleNotFoundError(error["message"])
+        raise WorkerError(f"{error['type']}: {error['message']}")
+
+    def locate_word(self, text: str, **params: Any) -> Point:
+        """见Worker.rpc_locate_word.preprocess也可以是Pipeline或者Stage."""
+        preprocess = params.get("preprocess")
+        if isinstance(preprocess, Stage):
+            preprocess = Pipeline([preprocess])
+        if isinstance(preprocess, Pipeline):
+            params["preprocess"] = preprocess.spec()
+        return Point(*self.call("locate_word", text=text, **params))
+
+    def locate_img(self, path: str | Path, **params: Any) -> Point:
+        """见Worker.rpc_locate_img."""
+        return Point(*self.call("locate_img", path=str(path), **params))
+
+    def click(self, point: Point, **params: Any) -> None:
+        """见Worker.rpc_click."""
+        self.call("click", x=int(point.x), y=int(point.y), **params)
+
+    def send_keys(self, message: str | List[str], **params: Any) -> None:
+        """见Worker.rpc_send_keys."""
+        self.call("send_keys", message=message, **params)
+
+    def hotkey(self, *keys: str) -> None:
+        """见Worker.rpc_hotkey."""
+        self.call("hotkey", keys=list(keys))
+
+    def close(self) -> None:
+        """关闭连接，不会停止worker."""
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self) -> WorkerClient:
+        """with block结束时关闭连接."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """关闭连接."""
+        self.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """python -m bot_click.worker的入口."""
+    parser = argparse.ArgumentParser(prog="python -m bot_click.worker")
+    parser.add_argument("--socket", default="/tmp/bot_click.sock")
+    parser.add_argument("--display", help="existing X display, e.g. :5")
+    parser.add_argument("--virtual-display", metavar="WxH", help="start Xvfb")
+    parser.add_argument(
+        "--launch", help="command started on the display, e.g. a browser"
+    )
+    parser.add_argument("--location-cache", type=Path)
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(name)s | %(levelname)s | %(lineno)d | %(message)s",
+    )
+
+    # 每个资源启动后立即注册到stack,之后的步骤失败时也会被释放
+    with contextlib.ExitStack() as stack:
+        display = args.display
+        if args.virtual_display:
+            from pyvirtualdisplay import Display
+
+            width, height = (int(v) for v in args.virtual_display.split("x"))
+            vdisplay = Display(visible=False, size=(width, height), color_depth=24)
+            vdisplay.start()
+            stack.callback(vdisplay.stop)
+            display = f":{vdisplay.display}"
+        cache = LocationCache(args.location_cache) if args.location_cache else None
+        if cache is not None:
+            stack.callback(cache.close)
+        context = BotContext(display=display)
+        stack.callback(context.close)
+        worker = Worker(context, cache)
+        if args.launch:
+            env = dict(os.environ, DISPLAY=display) if display else None
+            launched = subprocess.Popen(shlex.split(args.launch), env=env)
+            stack.callback(_terminate, launched)
+        server = WorkerServer(args.socket, worker)
+        stack.callback(server.server_close)
+        signal.signal(
+            signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start()
+        )
+        worker.warm_up()
+        logger.info(
+            f"worker on {display or os.environ.get('DISPLAY')} at {args.socket}"
+        )
+        server.serve_forever()
+
+
+def _terminate(process: subprocess.Popen[bytes]) -> None:
+    """结束--launch启动的进程."""
+    process.terminate()
+    process.wait(10)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,4 +4,5 @@ import logging
 logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 from .guacamole import GuacaLoginScreen
+from .session import GuacaSession
 from .windows import AbstractWindowsBrowserScreen as WindowsBrowserScreen
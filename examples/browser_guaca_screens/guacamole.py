@@ -3,11 +3,25 @@ from __future__ import annotations
 
 import logging
 from pathlib import Path
-from typing import Any, Optional, ParamSpec
+from typing import Any, Callable, Optional, ParamSpec
 
-import cv2 as cv
+import numpy as np
 from libs.browser_bot import BrowserBot
+from numpy.typing import NDArray
 
+from bot_click import (
+    Gray,
+    LocationCache,
+    Point,
+    Region,
+    Threshold,
+    detect_viewport,
+    get_context,
+    invalidate_located,
+    located_property,
+    screen_fingerprint,
+    traced,
+)
 from bot_click.bot_click import NeedleNotFoundError
 
 P = ParamSpec("P")
@@ -19,49 +33,112 @@ class GuacaLoginScreen:
     """用Firefox/Chromium来处理，Guacamole web 登录页面.
     用Chromium的原因为：
     可以通过policy以及命令行来控制password manager,以不显示save password界面，
-    有助于提高后续界面的识别功能."""
+    有助于提高后续界面的识别功能.
+    若给定location_cache，登录页面元素的位置会跨run被cache,命中时仅做局部确认.
+    登录后可通过detect_viewport检测远程桌面canvas的位置，
+    以BotContext.restrict将之后的查找限定于远程桌面."""
 
-    def __init__(self, browser: BrowserBot) -> None:
+    # placeholder的颜色较浅，二值化后才能识别
+    _img_preprocess = Gray() | Threshold(200)
+
+    def __init__(
+        self, browser: BrowserBot, location_cache: Optional[LocationCache] = None
+    ) -> None:
         """给定Browserbot."""
         self._browser = browser
+        self._location_cache = location_cache
+        self._timeout = 120
+        # 提交登录之前的frame,用于检测远程桌面canvas
+        self._login_frame: Optional[NDArray[np.uint8]] = None
+
+    def _screenshot(self) -> NDArray[np.uint8]:
+        return (self._browser.bot_context or get_context()).screenshot_ndarray()
+
+    def _locate_word(
+        self, text: str, confidence: float, timeout: int, **kwargs: Any
+    ) -> Point:
+        """定位单词,若有location_cache，则先查cache."""
+
+        def locate() -> Point:
+            point: Point = self._browser.locate_word(
+                text, confidence=confidence, timeout=timeout, **kwargs
+            )
+            return point
+
+        if self._location_cache is None:
+            return locate()
+        return self._location_cache.locate(
+            f"guaca_login:{text}", locate, screen_fingerprint("guaca_login")
+        )
 
-    def _img_preprocess(self, img: cv.Mat) -> Any:
-        image = cv.cvtColor(img, cv.COLOR_RGB2GRAY)
-        return cv.threshold(image, 200, 255, cv.THRESH_BINARY)[1]
+    @located_property
+    def username_field(self) -> Point:
+        """Username输入框的位置."""
+        return self._locate_word(
+            "Username",
+            confidence=0.5,
+            timeout=self._timeout,
+            preprocess=self._img_preprocess,
+        )
+
+    @located_property
+    def password_field(self) -> Point:
+        """Password输入框的位置."""
+        return self._locate_word(
+            "Password",
+            confidence=0.5,
+            timeout=self._timeout,
+            preprocess=self._img_preprocess,
+        )
 
+    @traced
     def login(
         self,
         username: str,
         password: str,
         timeout: int,
         log_screenshot_folder: Optional[Path] = None,
+        before_submit: Optional[Callable[[], Any]] = None,
     ) -> None:
-        """登录guacamole页面."""
+        """登录guacamole页面.
+        before_submit: 提交登录之前调用，如等待vm开启完成(登录后Guacamole即连接远程桌面)."""
+        self._timeout = timeout
         # 将鼠标移出username输入框，使其失焦，以便定位元素
-        self._browser.click_by_word(
-            "APACHE", log_screenshot_folder=log_screenshot_folder
-        )
+        point = self._locate_word("APACHE", confidence=0.7, timeout=timeout)
+        self._browser.click(point, log_screenshot_folder=log_screenshot_folder)
 
-        point = self._browser.locate_word(
-            "Username", confidence=0.5, timeout=timeout, preprocess=self._img_preprocess
-        )
         self._browser.click_and_send_keys(
             username,
-            point=point,
+            point=self.username_field,
             append_enter=False,
             log_screenshot_folder=log_screenshot_folder,
         )
-        point = self._browser.locate_word(
-            "Password", confidence=0.5, timeout=timeout, preprocess=self._img_preprocess
-        )
         self._browser.click_and_send_keys(
             password,
-            point=point,
-            append_enter=True,
+            point=self.password_field,
+            append_enter=False,
             log_screenshot_folder=log_screenshot_folder,
         )
+        self._login_frame = self._screenshot()
+        if before_submit is not None:
+            before_submit()
+        self._browser.send_keys(["enter"])
+        # 登录后页面已切换，登录页面的元素位置不再有效
+        invalidate_located(self)
         self._dimiss_savepassword()
 
+    @traced
+    def detect_viewport(self) -> Optional[Region]:
+        """检测远程桌面canvas在屏幕中的位置，须在登录且远程桌面显示之后调用.
+        与提交登录之前的页面对比，大部分像素都发生变化的区域即为canvas,
+        浏览器的tab与地址栏等不包含在内.未登录或者检测失败时为None."""
+        if self._login_frame is None:
+            return None
+        region = detect_viewport(self._login_frame, self._screenshot())
+        logger.info(f"Remote desktop viewport: {region}")
+        return region
+
+    @traced
     def _dimiss_savepassword(self) -> None:
         try:
             self._browser.locate_word(
@@ -0,0 +1,242 @@
+"""Reusable logged-in Guacamole session.
+登录Guacamole(多次OCR等待，输入以及最长60s的"Save password?"等待)占短scenario的大部分时间.
+GuacaSession在pooled display上保持已登录的Guacamole浏览器以及RDP连接，连续的scenario借用同一个session:
+借出前以远程桌面上浏览器的启动图标做健康检查(模板匹配),归还时关闭残留的远程浏览器窗口,
+仅在浏览器退出，Guacamole session过期或者RDP断开等检查失败时才重新登录.
+登录后检测远程桌面canvas的位置，浏览器之后的查找(包括健康检查以及WindowsBrowserScreen)
+都限定于canvas,坐标自动转换，本地浏览器的tab与地址栏不会造成误匹配:
+>>> with DisplayPool(1) as displays:
+...     with GuacaSession(displays, "Chromium", url, "ie11", "test", "ie11") as session:
+...         with session.lease() as browser:
+...             with WindowsBrowserScreen.get("ie11", browser).open() as win_browser:
+...                 ...
+scenario函数可以通过GuacaSession.shared在同一进程内共享session(进程退出时关闭).
+"""
+from __future__ import annotations
+
+import atexit
+import contextlib
+import logging
+import threading
+from types import TracebackType
+from typing import Dict, Iterator, List, Optional, Tuple, Type
+
+from libs.browser_bot import BrowserBot
+from libs.utils import vm_context
+
+from bot_click import DisplayPool, LocationCache, NeedleNotFoundError, use_context
+
+from .guacamole import GuacaLoginScreen
+from .windows import AbstractWindowsBrowserScreen
+
+logger = logging.getLogger(__name__)
+
+_SessionKey = Tuple[str, str, str, str, Tuple[str, ...]]
+
+
+class GuacaSession:
+    """已登录的Guacamole浏览器以及RDP连接，同一时间只借给一个scenario.
+    displays: 浏览器所使用的DisplayPool,session占用其中一个display直到close.
+    None时session自行启动一个Xvfb.
+    browser_name: 访问Guacamole的浏览器，见BrowserBot.get.
+    windows_browser: 远程桌面上的被测浏览器，见WindowsBrowserScreen.get,
+    其启动图标用于健康检查.
+    vm: 首次登录时开启，close时关闭.登录在提交前等待vm开启完成.
+    health_timeout: 健康检查的最长时间(s)."""
+
+    _shared: Dict[_SessionKey, GuacaSession] = {}
+
+    def __init__(
+        self,
+        displays: Optional[DisplayPool],
+        browser_name: str,
+        guaca_url: str,
+        username: str,
+        password: str,
+        windows_browser: str,
+        extra_options: Optional[List[str]] = None,
+        location_cache: Optional[LocationCache] = None,
+        vm: Optional[vm_context] = None,
+        login_timeout: int = 120,
+        health_timeout: int = 3,
+    ) -> None:
+        """不会立即登录，见connect."""
+        self.displays = displays
+        self.browser_name = browser_name
+        self.guaca_url = guaca_url
+        self.username = username
+        self.password = password
+        self.windows_browser = windows_browser
+        self.extra_options = extra_options
+        self.location_cache = location_cache
+        self.vm = vm
+        self.login_timeout = login_timeout
+        self.health_timeout = health_timeout
+        self.browser: Optional[BrowserBot] = None
+        self.logins = 0
+        self.leases = 0
+        self._resources: Optional[contextlib.ExitStack] = None
+        self._connection: Optional[contextlib.ExitStack] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(
+        cls,
+        browser_name: str,
+        guaca_url: str,
+        username: str,
+        password: str,
+        windows_browser: str,
+        extra_options: Optional[List[str]] = None,
+        location_cache: Optional[LocationCache] = None,
+        vm: Optional[vm_context] = None,
+    ) -> GuacaSession:
+        """进程内共享的session(使用自己的Xvfb),相同的浏览器，url,用户返回同一个session.
+        其余参数仅在首次创建时生效.session在进程退出时关闭."""
+        key = (
+            browser_name,
+            guaca_url,
+            username,
+            windows_browser,
+            tuple(extra_options or ()),
+        )
+        session = cls._shared.get(key)
+        if session is None:
+            session = cls(
+                None,
+                browser_name,
+                guaca_url,
+                username,
+                password,
+                windows_browser,
+                extra_options,
+                location_cache,
+                vm,
+            )
+            cls._shared[key] = session
+            atexit.register(session.close)
+        return session
+
+    def _start(self) -> contextlib.ExitStack:
+        """启动session生命周期内的资源:display pool以及vm."""
+        if self._resources is None:
+            with contextlib.ExitStack() as stack:
+                if self.displays is None:
+                    self.displays = stack.enter_context(DisplayPool(1))
+                    stack.callback(setattr, self, "displays", None)
+                if self.vm is not None:
+                    stack.enter_context(self.vm)
+                self._resources = stack.pop_all()
+        return self._resources
+
+    def _desktop(self, browser: BrowserBot) -> AbstractWindowsBrowserScreen:
+        return AbstractWindowsBrowserScreen.get(
+            self.windows_browser, browser, self.location_cache
+        )
+
+    def connect(self) -> BrowserBot:
+        """(重新)启动浏览器并登录Guacamole,等待远程桌面显示，已有的连接先断开."""
+        self.disconnect()
+        self._start()
+        assert self.displays is not None
+        with contextlib.ExitStack() as stack:
+            lease = stack.enter_context(self.displays.lease())
+            browser = BrowserBot.get(
+                self.browser_name, self.extra_options, lease.context
+            ).open(self.guaca_url)
+            stack.enter_context(browser)
+            # location cache的fingerprint等不经过BrowserBot的操作也作用于该display
+            with use_context(lease.context):
+                login = GuacaLoginScreen(browser, self.location_cache)
+                login.login(
+                    self.username,
+                    self.password,
+                    self.login_timeout,
+                    before_submit=self.vm.wait_ready if self.vm else None,
+                )
+                self._restrict(browser, login)
+            self._connection = stack.pop_all()
+        self.browser = browser
+        self.logins += 1
+        logger.info(f"Guacamole session #{self.logins} on {lease.display} is ready")
+        return browser
+
+    def _restrict(self, browser: BrowserBot, login: GuacaLoginScreen) -> None:
+        """等待远程桌面显示，将browser之后的查找限定于远程桌面canvas,坐标自动转换.
+        检测失败时仍查找整个屏幕."""
+        if not self._desktop(browser).is_desktop_ready(self.login_timeout):
+            logger.warning("Remote desktop is not ready, keep the full screen")
+            return
+        region = login.detect_viewport()
+        if region is not None and browser.bot_context is not None:
+            browser.bot_context = browser.bot_context.restrict(region)
+
+    def disconnect(self) -> None:
+        """关闭浏览器并归还display,vm不受影响."""
+        self.browser = None
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            connection.close()
+
+    def healthy(self) -> bool:
+        """浏览器仍在运行，且远程桌面可见(Guacamole已登录,RDP已连接)且没有残留的窗口."""
+        if self.browser is None or not self.browser.is_running:
+            return False
+        return self._desktop(self.browser).is_desktop_ready(self.health_timeout)
+
+    def reset(self) -> bool:
+        """关闭scenario残留的远程浏览器窗口.
+        return: session是否可以交给下一个scenario."""
+        if self.browser is None or not self.browser.is_running:
+            return False
+        desktop = self._desktop(self.browser)
+        if desktop.is_desktop_ready(self.health_timeout):
+            return True
+        logger.info("Close the windows left on the remote desktop")
+        try:
+            desktop.close()
+        except NeedleNotFoundError:
+            logger.info("No window to close")
+        return desktop.is_desktop_ready(self.health_timeout)
+
+    @contextlib.contextmanager
+    def lease(self) -> Iterator[BrowserBot]:
+        """借出已登录的浏览器，健康检查失败时重新登录.
+        with block中bot_click的操作(包括location cache的确认)都作用于session的display.
+        with block结束时reset,无法reset的session被断开，下次lease时重新登录."""
+        with self._lock:
+            browser = self.browser
+            if browser is None or not self.healthy():
+                if browser is not None:
+                    logger.warning("Guacamole session is unhealthy, login again")
+                browser = self.connect()
+            self.leases += 1
+            try:
+                with use_context(browser.bot_context):
+                    yield browser
+            finally:
+                if not self.reset():
+                    logger.warning("Failed to reset the Guacamole session")
+                    self.disconnect()
+
+    def close(self) -> None:
+        """断开连接，关闭vm以及自行启动的Xvfb."""
+        self.disconnect()
+        if self._resources is not None:
+            resources, self._resources = self._resources, None
+            resources.close()
+        logger.info(
+            f"Guacamole session closed: {self.leases} leases, {self.logins} logins"
+        )
+
+    def __enter__(self) -> GuacaSession:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """断开连接，关闭vm."""
+        self.close()
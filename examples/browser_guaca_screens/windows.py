@@ -5,18 +5,25 @@ import logging
 import os
 from abc import ABC, abstractmethod
 from pathlib import Path
-from tempfile import mkstemp
-from typing import Any, List, Mapping, Optional, Type
+from tempfile import gettempdir, mkstemp
+from typing import List, Mapping, Optional, Type
 
-import cv2 as cv
 from libs.browser_bot import BrowserBot
 
 from bot_click import (
+    AdaptiveThreshold,
     BotClickError,
+    Gray,
+    LocationCache,
     NeedleIMGCriteria,
     NeedleNotFoundError,
     Point,
+    get_context,
+    invalidate_located,
+    located_property,
     print_enhance_ocr_tip,
+    screen_fingerprint,
+    traced,
 )
 
 logger = logging.getLogger(__name__)
@@ -30,16 +37,32 @@ class AbstractWindowsBrowserScreen(ABC):
     先检查是否有NeedleNotFoundError。
     若有,则先screenshot到环境变量SCREENSHOTS_FOLDER指定的路径。
     若无环境变量SCREENSHOTS_FOLDER，则存入临时文件夹。
+    若bot context启用了FlightRecorder，最近的frames以及操作记录也一并保存。
+    若给定location_cache,地址栏等位置会跨run被cache,命中时仅做局部确认。
     """
 
-    def __init__(self, browser: BrowserBot) -> None:
+    def __init__(
+        self, browser: BrowserBot, location_cache: Optional[LocationCache] = None
+    ) -> None:
         """给定browser，使其具备bot功能."""
         self.browser = browser
+        self._location_cache = location_cache
 
-    @property
+    @located_property
     def adddress_bar(self) -> Point:
-        """根据地址栏needle信息，返回地址栏中心点位置."""
-        return self.browser.locate_imgs(self._address_bar_needles, 60)  # type: ignore
+        """根据地址栏needle信息，返回地址栏中心点位置.
+        按实例cache,屏幕分辨率变化，局部确认失败或者close()后会重新定位."""
+
+        def locate() -> Point:
+            point: Point = self.browser.locate_imgs(self._address_bar_needles, 60)
+            return point
+
+        if self._location_cache is None:
+            return locate()
+        name = self.__class__.__name__
+        return self._location_cache.locate(
+            f"{name}:address_bar", locate, screen_fingerprint(name)
+        )
 
     @property
     @abstractmethod
@@ -56,6 +79,7 @@ class AbstractWindowsBrowserScreen(ABC):
     def _needle_close(self) -> NeedleIMGCriteria:
         """关闭窗口时所需要的图像needle信息."""
 
+    @traced
     def open(
         self, timeout: int = 120, log_screenshot_folder: Optional[Path] = None
     ) -> AbstractWindowsBrowserScreen:
@@ -69,9 +93,22 @@ class AbstractWindowsBrowserScreen(ABC):
         )
         return self
 
+    def is_desktop_ready(self, timeout: int = 3) -> bool:
+        """远程桌面上是否可见浏览器的启动图标，即已连接且没有遮挡桌面的窗口.
+        timeout内每秒做一次模板匹配，用于廉价地检查Guacamole session是否可用."""
+        try:
+            self.browser.locate_img(
+                self._logo.path, self._logo.confidence, timeout, check_interval=1
+            )
+        except NeedleNotFoundError:
+            return False
+        return True
+
+    @traced
     def close(self, log_screenshot_folder: Optional[Path] = None) -> None:
         """关闭浏览器窗口."""
         logger.info("Close window")
+        invalidate_located(self)
         self.browser.click_by_img(
             self._needle_close.path,
             self._needle_close.confidence,
@@ -80,27 +117,26 @@ class AbstractWindowsBrowserScreen(ABC):
         )
         self._dismiss_close_all(log_screenshot_folder)
 
+    @traced
     def _dismiss_close_all(self, log_screenshot_folder: Optional[Path]) -> None:
-        def _preprocess(image: cv.Mat) -> Any:
-            """图像预处理."""
-            img = cv.cvtColor(image, cv.COLOR_RGB2GRAY)
-            return cv.adaptiveThreshold(
-                img, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C, cv.THRESH_BINARY, 11, 2
-            )
-
         try:
             self.browser.click_by_word(
                 "Close All",
                 confidence=0.5,
                 timeout=10,
-                preprocess=_preprocess,
+                preprocess=Gray() | AdaptiveThreshold(11, 2),
                 log_screenshot_folder=log_screenshot_folder,
             )
         except NeedleNotFoundError:
             logger.info("No close all button, ingore")
 
     @classmethod
-    def get(cls, name: str, browser: BrowserBot) -> AbstractWindowsBrowserScreen:
+    def get(
+        cls,
+        name: str,
+        browser: BrowserBot,
+        location_cache: Optional[LocationCache] = None,
+    ) -> AbstractWindowsBrowserScreen:
         """根据名称，将现有的screen转换成特定的screen子类.
         当与with使用时，退出with时，会关闭浏览器
         """
@@ -112,7 +148,7 @@ class AbstractWindowsBrowserScreen(ABC):
             "ie8": _IE8DesktopScreen,
         }
         cls_ = _class_map[name]
-        return cls_(browser)
+        return cls_(browser, location_cache)
 
     def __enter__(self) -> AbstractWindowsBrowserScreen:
         return self
@@ -127,6 +163,9 @@ class AbstractWindowsBrowserScreen(ABC):
             name = mkstemp(".png", dir=dir, prefix="windows_exception")[1]
             self.browser.screenshot(name)
             logger.warning(f"Take screenshot {name} when exit with exception {exc}")
+            recorder = (self.browser.bot_context or get_context()).recorder
+            if recorder is not None:
+                recorder.dump(Path(dir or gettempdir()), repr(exc))
             print_enhance_ocr_tip()
         self.close()
 
@@ -1,5 +1,5 @@
 """此模块处理以命令行方式启动的浏览器,此浏览器带有文字与图像匹配功能.
-注意:每次启动的浏览器均使用全新的profile.
+注意:每次启动的浏览器均使用全新的profile(或者调用方通过profile_dir指定的profile).
 Basic usage:
 >>> import BrowserBot
 >>> with BrowserBot.get('Firefox').open(some_url) as browser:
@@ -17,7 +17,7 @@ import logging
 import os
 import shutil
 from pathlib import Path
-from tempfile import mkdtemp, mkstemp
+from tempfile import gettempdir, mkdtemp, mkstemp
 from types import TracebackType
 from typing import List, Mapping, Optional, Type
 
@@ -25,11 +25,14 @@ from easyprocess import EasyProcess, EasyProcessError
 
 from bot_click import (
     BotClickError,
+    BotContext,
     ClickWithSendKeysMixin,
     ImgClickerMixin,
     ScreenshotMixin,
     TextClickerMixin,
+    get_context,
     print_enhance_ocr_tip,
+    traced,
 )
 
 logger = logging.getLogger(__name__)
@@ -41,49 +44,85 @@ class BrowserBot(
     """Common parent class for managed Browsers. The browser has bot capability.
     支持上下文管理器，退出时会关闭浏览器进程以及清理生成的临时文件夹.
     若退出时，有未处理的BotClick错误，若传入SCREENSHOTS_FOLDER环境变量，
-    则会进行截图并保存到对应目录中.
-    若需要在退出时清理临时文件夹，请为self._managed_dir置值，为字符串全路径."""
+    则会进行截图并保存到对应目录中.若bot context启用了FlightRecorder,
+    还会将最近的frames以及操作记录一并保存.
+    若需要在退出时清理临时文件夹，请为self._managed_dir置值，为字符串全路径.
+    若给定bot_context，浏览器会在该context的display中启动，bot操作也作用于该display."""
 
     def __init__(
         self,
         cmd: List[str],
         extra_options: Optional[List[str]] = None,
+        bot_context: Optional[BotContext] = None,
+        profile_dir: Optional[str] = None,
     ) -> None:
         """新建浏览器实例，不会启动浏览器进程。是否启用新的profile取决于各子类.
-        extra_options:命令行启动实例时，额外的命令行参数"""
+        extra_options:命令行启动实例时，额外的命令行参数
+        profile_dir:使用该profile/userdata而非新建，由调用方负责清理"""
         super().__init__()
+        self.bot_context = bot_context
         self._extra_options: List[str] = extra_options if extra_options else []
         self._cmd = cmd + self._extra_options
         self._proc: Optional[EasyProcess] = None
         self._managed_dir: Optional[str] = None
+        self.profile_dir = profile_dir
+
+    def _profile_cmd(self, folder: str) -> Optional[List[str]]:
+        """以folder作为profile/userdata的命令行启动参数，不支持时为None."""
+        return None
 
     @property
     def _userdata_cmd(self) -> Optional[List[str]]:
-        """通过命令行启动参数传入userdata/profile."""
-        return None
+        """通过命令行启动参数传入userdata/profile.
+        未指定profile_dir时，仅在open的时候才会新建临时文件夹，并且一个BrowserBot仅创建一次."""
+        if self.profile_dir is None and self._profile_cmd("") is not None:
+            self.profile_dir = self._managed_dir = mkdtemp()
+        if self.profile_dir is None:
+            return None
+        return self._profile_cmd(self.profile_dir)
 
+    @traced
     def open(self, to: str) -> BrowserBot:
         """启动新的浏览器进程,并打开指定地址.
         注意：一个Browser进程实例只能open一次。要开启新的实例，须新建实例调用open"""
         if self._proc:
             raise RuntimeError("One proc can only start once.")
         self.start_url = to
-        cmd = self._cmd
+        cmd = list(self._cmd)
         if self._userdata_cmd:
             cmd += self._userdata_cmd
         cmd += [self.start_url]
         logger.info(f"Start process {cmd}")
-        self._proc = EasyProcess(cmd).start()
+        env = None
+        if self.bot_context and self.bot_context.display:
+            env = dict(os.environ, DISPLAY=self.bot_context.display)
+        self._proc = EasyProcess(cmd, env=env).start()
         return self
 
-    def close(self) -> None:
+    @property
+    def is_running(self) -> bool:
+        """浏览器进程是否仍在运行."""
+        return self._proc is not None and self._proc.is_alive()
+
+    def navigate(self, to: str) -> None:
+        """在已启动的浏览器中，通过地址栏打开指定地址."""
+        self.start_url = to
+        self.hotkey("ctrl", "l")
+        self.send_keys(to, append_enter=True)
+
+    @traced
+    def close(self, graceful: float = 0) -> None:
         """关闭浏览器以及停止浏览器进程.
+        graceful:大于0时，先SIGTERM并等待graceful(s),浏览器得以完整地保存profile.
         若浏览器使用了新建了profile/userdata,则会清理该临时目录."""
         if self._proc is None:
             logger.info("The process has been stopped")
             return
         logger.info(f"Stopping process. {self._proc}")
         try:
+            if graceful > 0 and self._proc.popen is not None:
+                self._proc.popen.terminate()
+                self._proc.wait(timeout=graceful)
             self._proc.stop()
         except EasyProcessError:
             # EasyProcess use subprocess.Popen.kill(),
@@ -122,11 +161,20 @@ class BrowserBot(
             logger.warning(
                 f"Take screenshot {name} when exit with exception {exception_instance}"
             )
+            recorder = (self.bot_context or get_context()).recorder
+            if recorder is not None:
+                recorder.dump(Path(dir or gettempdir()), repr(exception_instance))
             print_enhance_ocr_tip()
         self.close()
 
     @classmethod
-    def get(cls, name: str, extra_options: Optional[List[str]] = None) -> BrowserBot:
+    def get(
+        cls,
+        name: str,
+        extra_options: Optional[List[str]] = None,
+        bot_context: Optional[BotContext] = None,
+        profile_dir: Optional[str] = None,
+    ) -> BrowserBot:
         """根据name新建浏览器实例，由各子类决定是否共用profile."""
         _class_map: Mapping[str, Type[BrowserBot]] = {
             "Firefox": Firefox,
@@ -134,7 +182,7 @@ class BrowserBot(
             "Chromium": Chromium,
         }
         cls_ = _class_map[name]
-        return cls_(extra_options)  # type: ignore
+        return cls_(extra_options, bot_context, profile_dir)  # type: ignore
 
     def __str__(self) -> str:
         return f"{self.__class__.__name__}:cmd={self._cmd},{self._userdata_cmd}"
@@ -143,27 +191,29 @@ class BrowserBot(
 class Firefox(BrowserBot):
     """受管理的Firefox,总是使用新的profile."""
 
-    @property
-    def _userdata_cmd(self) -> List[str]:
-        # 仅在open的时候才会新建临时文件夹保存userdata,并且一个BrowserBot仅创建一次
-        cmd = getattr(self, "_userdata_cmd_", None)
-        if cmd is None:
-            folder = mkdtemp()
-            self._managed_dir = folder
-            self._userdata_cmd_ = ["-profile", self._managed_dir]
-        return self._userdata_cmd_
-
-    def __init__(self, extra_options: Optional[List[str]] = None) -> None:
+    def _profile_cmd(self, folder: str) -> List[str]:
+        return ["-profile", folder]
+
+    def __init__(
+        self,
+        extra_options: Optional[List[str]] = None,
+        bot_context: Optional[BotContext] = None,
+        profile_dir: Optional[str] = None,
+    ) -> None:
         """https://wiki.mozilla.org/Firefox/CommandLineOptions."""
         cmd = ["firefox", "-no-remote"]
-        super().__init__(cmd, extra_options)
+        super().__init__(cmd, extra_options, bot_context, profile_dir)
 
 
 class _ChromeBase(BrowserBot):
     """受管理的Chrome/Chromium,总是使用新的profile."""
 
     def __init__(
-        self, program_name: str, extra_options: Optional[List[str]] = None
+        self,
+        program_name: str,
+        extra_options: Optional[List[str]] = None,
+        bot_context: Optional[BotContext] = None,
+        profile_dir: Optional[str] = None,
     ) -> None:
         """Chrome更多启动项.
         https://peter.sh/experiments/chromium-command-line-switches/"""
@@ -182,38 +232,45 @@ class _ChromeBase(BrowserBot):
             # "--disable-save-password-bubble",
             "--simulate-outdated-no-au='Tue, 31 Dec 2099 23:59:59 GMT'",
         ]
-        super().__init__(cmd, extra_options)
+        super().__init__(cmd, extra_options, bot_context, profile_dir)
 
-    @property
-    def _userdata_cmd(self) -> List[str]:
-        # 仅在open的时候才会新建临时文件夹保存userdata,并且一个BrowserBot仅创建一次
-        cmd = getattr(self, "_userdata_cmd_", None)
-        if cmd is None:
-            folder = mkdtemp()
-            self._managed_dir = folder
-            self._userdata_cmd_ = [f"--user-data-dir={self._managed_dir}"]
-        return self._userdata_cmd_
+    def _profile_cmd(self, folder: str) -> List[str]:
+        return [f"--user-data-dir={folder}"]
 
 
 class Chrome(_ChromeBase):
     """受管理的Chrome,总是启用新的profile."""
 
-    def __init__(self, extra_options: Optional[List[str]] = None) -> None:
+    def __init__(
+        self,
+        extra_options: Optional[List[str]] = None,
+        bot_context: Optional[BotContext] = None,
+        profile_dir: Optional[str] = None,
+    ) -> None:
         """Chrome: https://peter.sh/experiments/chromium-command-line-switches/ ."""
         super().__init__(
             program_name="google-chrome",
             extra_options=extra_options,
+            bot_context=bot_context,
+            profile_dir=profile_dir,
         )
 
 
 class Chromium(_ChromeBase):
     """受管理的Chromium,总是启用新的profile."""
 
-    def __init__(self, extra_options: Optional[List[str]] = None) -> None:
+    def __init__(
+        self,
+        extra_options: Optional[List[str]] = None,
+        bot_context: Optional[BotContext] = None,
+        profile_dir: Optional[str] = None,
+    ) -> None:
         """更多启动项，请查阅.
         https://peter.sh/experiments/chromium-command-line-switches/
         """
         super().__init__(
             program_name="chromium",
             extra_options=extra_options,
+            bot_context=bot_context,
+            profile_dir=profile_dir,
         )
@@ -0,0 +1,222 @@
+"""BrowserBot pool.
+空profile的首次初始化是standalone用例中最慢的部分.BrowserPool为每种浏览器只初始化一次
+golden profile,每个lease使用其copy(cp --reflink=auto,文件系统支持时为CoW,否则为普通copy)，
+并在pooled display上预先启动若干浏览器(打开about:blank)，lease时只需在地址栏打开目标地址.
+归还后浏览器被关闭，display被reset,profile在后台删除，并在后台启动新的浏览器补充pool.
+每个lease的profile都是golden profile的独立copy,不会被其它lease使用，隔离性与每次新建profile相同.
+Basic usage:
+>>> with DisplayPool(2) as displays, BrowserPool("Chromium", displays, 2) as pool:
+...     with pool.lease(url) as browser:
+...         browser.click_by_word("SetUserCookie", timeout=60)
+"""
+from __future__ import annotations
+
+import contextlib
+import logging
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import mkdtemp
+from types import TracebackType
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Type
+
+from bot_click import DisplayLease, DisplayPool
+
+from .browser_bot import BrowserBot
+
+logger = logging.getLogger(__name__)
+
+# 首次启动完成后，profile中会出现的文件
+_READY_MARKERS = {
+    "Firefox": "times.json",
+    "Chrome": "Local State",
+    "Chromium": "Local State",
+}
+# 浏览器退出时遗留的锁文件，不应复制到新的profile
+_LOCK_FILES = (
+    "lock",
+    ".parentlock",
+    "SingletonLock",
+    "SingletonSocket",
+    "SingletonCookie",
+)
+
+_Warm = Tuple[BrowserBot, contextlib.ExitStack]
+
+
+class BrowserPool:
+    """预先启动的BrowserBot.
+    name: 浏览器名称，见BrowserBot.get.
+    displays: 浏览器所使用的DisplayPool,每个浏览器占用一个display.
+    size: 预先启动的浏览器数量.
+    golden_dir: golden profile的位置，已存在时直接使用.None时新建临时目录并在close时删除.
+    first_run_timeout: 初始化golden profile的最长等待时间(s)."""
+
+    def __init__(
+        self,
+        name: str,
+        displays: DisplayPool,
+        size: int = 1,
+        extra_options: Optional[List[str]] = None,
+        golden_dir: Optional[Path] = None,
+        first_run_timeout: float = 60,
+    ) -> None:
+        """不会立即启动浏览器，见start."""
+        self.name = name
+        self.displays = displays
+        self.size = size
+        self.extra_options = extra_options
+        self.golden_dir = golden_dir
+        self.first_run_timeout = first_run_timeout
+        self._owns_golden = golden_dir is None
+        # 后台启动失败时放入None,通知等待的lease在自己的thread中启动
+        self._warm: queue.Queue[Optional[_Warm]] = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="browser")
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def prepare_golden(self) -> Path:
+        """初始化golden profile:以空profile启动浏览器，等待首次初始化完成后正常退出."""
+        if self.golden_dir is not None and self.golden_dir.exists():
+            return self.golden_dir
+        folder = self.golden_dir or Path(mkdtemp(prefix=f"golden_{self.name}_"))
+        folder.mkdir(parents=True, exist_ok=True)
+        marker = folder / _READY_MARKERS[self.name]
+        with self.displays.lease() as lease:
+            browser = BrowserBot.get(
+                self.name, self.extra_options, lease.context, str(folder)
+            ).open("about:blank")
+            deadline = time.monotonic() + self.first_run_timeout
+            while not marker.exists() and time.monotonic() < deadline:
+                time.sleep(0.5)
+            # 首次启动的后台初始化(扩展，组件等)在marker出现后仍会持续片刻
+            time.sleep(3)
+            browser.close(graceful=10)
+        if not marker.exists():
+            logger.warning(f"{marker} is not created, the golden profile may be cold")
+        logger.info(f"golden profile of {self.name} is ready: {folder}")
+        self.golden_dir = folder
+        return folder
+
+    def _clone(self) -> str:
+        """复制golden profile到新的临时目录."""
+        golden = self.prepare_golden()
+        folder = mkdtemp(prefix=f"profile_{self.name}_")
+        subprocess.run(
+            ["cp", "-a", "--reflink=auto", f"{golden}/.", folder], check=True
+        )
+        for name in _LOCK_FILES:
+            Path(folder, name).unlink(missing_ok=True)
+        return folder
+
+    def _launch(self) -> _Warm:
+        """在新借出的display上以golden profile的copy启动浏览器."""
+        stack = contextlib.ExitStack()
+        try:
+            lease: DisplayLease = stack.enter_context(self.displays.lease())
+            profile = self._clone()
+            stack.callback(self._remove_later, profile)
+            browser = BrowserBot.get(
+                self.name, self.extra_options, lease.context, profile
+            ).open("about:blank")
+        except BaseException:
+            stack.close()
+            raise
+        return browser, stack
+
+    def _replenish(self) -> None:
+        if self._closed:
+            return
+        try:
+            self._warm.put(self._launch())
+        except Exception:
+            logger.exception(f"failed to pre-launch {self.name}")
+            self._warm.put(None)
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> bool:
+        """在后台执行fn,pool已关闭时返回False."""
+        with self._lock:
+            if self._closed:
+                return False
+            self._executor.submit(fn, *args)
+            return True
+
+    def _remove_later(self, folder: str) -> None:
+        """在后台删除folder,pool关闭后则立即删除."""
+        if not self._submit(shutil.rmtree, folder, True):
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def _take(self, timeout: Optional[float]) -> _Warm:
+        """取出一个仍在运行的预先启动的浏览器.
+        超时，后台启动失败或者浏览器已退出时在当前thread启动."""
+        try:
+            warm = self._warm.get(timeout=timeout)
+        except queue.Empty:
+            warm = None
+        if warm is None:
+            return self._launch()
+        browser, stack = warm
+        if browser.is_running:
+            return warm
+        logger.warning(f"pre-launched {self.name} has exited, launch a new one")
+        with stack:
+            browser.close()
+        # 补充已退出的浏览器所占的位置
+        self._submit(self._replenish)
+        return self._launch()
+
+    def start(self) -> BrowserPool:
+        """初始化golden profile并预先启动size个浏览器."""
+        self.prepare_golden()
+        for _ in range(self.size - self._warm.qsize()):
+            self._warm.put(self._launch())
+        return self
+
+    @contextlib.contextmanager
+    def lease(self, to: str, timeout: Optional[float] = None) -> Iterator[BrowserBot]:
+        """借出一个预先启动的浏览器并打开to,with block结束时关闭，并在后台补充新的浏览器.
+        浏览器作为context manager使用，出现BotClickError时的截图等行为与BrowserBot相同.
+        timeout: 等待预先启动的浏览器的时间(s),超时后在当前thread启动.
+        后台补充失败时，等待中的lease也会在当前thread启动，不会一直等待."""
+        browser, stack = self._take(timeout)
+        try:
+            with stack, browser:
+                browser.navigate(to)
+                yield browser
+        finally:
+            self._submit(self._replenish)
+
+    def close(self) -> None:
+        """关闭所有预先启动的浏览器，等待后台任务完成."""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                warm = self._warm.get_nowait()
+            except queue.Empty:
+                break
+            if warm is None:
+                continue
+            browser, stack = warm
+            with stack:
+                browser.close()
+        if self._owns_golden and self.golden_dir is not None:
+            shutil.rmtree(self.golden_dir, ignore_errors=True)
+
+    def __enter__(self) -> BrowserPool:
+        """初始化golden profile并预先启动浏览器."""
+        return self.start()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        """关闭所有浏览器."""
+        self.close()
@@ -1,14 +1,30 @@
 """The utility module provided for examples."""
 from __future__ import annotations
 
+import atexit
 import contextlib
 import logging
 import os
+from concurrent.futures import Future
 from functools import wraps
-from typing import Any, Callable, List, Optional, ParamSpec, TypeVar
-from urllib.request import urlopen
-
-import cv2 as cv
+from pathlib import Path
+from typing import Callable, List, Optional, ParamSpec, TypeVar
+
+from bot_click import (
+    AdaptiveThreshold,
+    BotContext,
+    FlightRecorder,
+    Gray,
+    VideoArtifactWriter,
+    enable_metrics,
+    enable_tracing,
+    serve_metrics,
+    set_artifact_writer,
+    set_default_context,
+)
+from bot_click.scheduler import SchedulerClient, set_scheduler
+
+from .vm_manager import VmManagerClient
 
 logger = logging.getLogger(__name__)
 
@@ -40,24 +56,54 @@ def validate_environ(envs: List[str]) -> None:
             raise ValueError(f"environment with {name} should be set")
 
 
-def preprocess_embeded_testweb(image: cv.Mat) -> Any:
-    """当testweb嵌入到多个浏览器时，需要预处理以提高ocr准确度."""
-    img = cv.cvtColor(image, cv.COLOR_RGB2GRAY)
-    return cv.adaptiveThreshold(
-        img, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C, cv.THRESH_BINARY, 11, 2
-    )
+def configure_bot_context() -> None:
+    """根据环境变量配置默认的BotContext.
+    FLIGHT_RECORDER: 在内存中保存最近N个frame以及操作,仅在出错时写入SCREENSHOTS_FOLDER.
+    VIDEO_RECORDING: 将debug artifact写入该视频文件(及同名的.json索引)而非逐个PNG.
+    METRICS_PORT: 启用metrics,并在该端口提供Prometheus endpoint(/metrics).
+    METRICS_FILE: 启用metrics,并在进程退出时将其以JSON写入该文件.
+    TRACE_FILE: 启用tracing,并在进程退出时将timeline写入该文件(Chrome trace-event).
+    OCR_SCHEDULER: 通过该socket上的scheduler执行OCR以及模板匹配."""
+    capacity = int(os.environ.get("FLIGHT_RECORDER", "0"))
+    recorder = FlightRecorder(capacity) if capacity > 0 else None
+    set_default_context(BotContext(recorder=recorder))
+    if video := os.environ.get("VIDEO_RECORDING"):
+        set_artifact_writer(VideoArtifactWriter(Path(video)))
+    port, metrics_file = os.environ.get("METRICS_PORT"), os.environ.get("METRICS_FILE")
+    if port or metrics_file:
+        metrics = enable_metrics()
+        if port:
+            serve_metrics(int(port), host="0.0.0.0")
+        if metrics_file:
+            atexit.register(metrics.dump, Path(metrics_file))
+    if trace_file := os.environ.get("TRACE_FILE"):
+        enable_tracing(Path(trace_file))
+    if scheduler := os.environ.get("OCR_SCHEDULER"):
+        set_scheduler(SchedulerClient(scheduler))
+
+
+# 当testweb嵌入到多个浏览器时，需要预处理以提高ocr准确度
+preprocess_embeded_testweb = Gray() | AdaptiveThreshold(11, 2)
 
 
 class vm_context(contextlib.ContextDecorator):
-    """开启与关闭vm."""
+    """开启与关闭vm.
+    wait为False时，__enter__在后台开启vm并立即返回，调用方可以同时启动浏览器，登录Guacamole,
+    在需要远程桌面之前调用wait_ready.start与stop复用同一个HTTP连接."""
 
     def __init__(
-        self, vmananager_server: Optional[str] = None, vm_key: Optional[str] = None
+        self,
+        vmananager_server: Optional[str] = None,
+        vm_key: Optional[str] = None,
+        wait: bool = True,
     ) -> None:
         """vmananager_server: 监听开启与关闭的rest api server."""
         super().__init__()
         self.vm_manager = vmananager_server
         self.vm_key = vm_key
+        self.wait = wait
+        self.ready: Optional[Future[str]] = None
+        self._client: Optional[VmManagerClient] = None
 
     def __enter__(self) -> vm_context:
         """开启vm.
@@ -68,17 +114,43 @@ class vm_context(contextlib.ContextDecorator):
                 Or. specify the restapi server to start and stop the vm"""
             )
             return self
-        url = f"{self.vm_manager}/vms/{self.vm_key}/start"
-        with urlopen(url, data=b"", timeout=120) as resp:
-            logger.info(f'Start vm: {resp.read().decode("utf-8")}')
+        self._client = VmManagerClient(self.vm_manager)
+        self.ready = self._client.start_async(self.vm_key)
+        if self.wait:
+            try:
+                self.wait_ready()
+            except BaseException:
+                # __exit__不会被调用，在这里关闭vm以及连接
+                self._stop()
+                raise
         return self
 
+    def wait_ready(self, timeout: Optional[float] = 120) -> None:
+        """等待vm开启完成，未管理vm时立即返回.
+        Raises: urllib.error.HTTPError, concurrent.futures.TimeoutError"""
+        if self.ready is not None:
+            self.ready.result(timeout)
+
+    def _stop(self) -> None:
+        """等待start请求结束后关闭vm,并关闭连接.
+        start失败(如vm启动较慢导致超时)时vm仍可能已开启，所以总是发送stop,失败只记录日志."""
+        assert self._client is not None and self.vm_key is not None
+        try:
+            if self.ready is not None and self.ready.exception() is not None:
+                logger.warning(
+                    f"Start vm {self.vm_key} failed: {self.ready.exception()}"
+                )
+            try:
+                self._client.stop(self.vm_key)
+            except Exception:
+                logger.exception(f"Failed to stop vm {self.vm_key}")
+        finally:
+            self._client.close()
+            self._client = self.ready = None
+
     def __exit__(self, exc_type, exc, exc_tb):  # type: ignore
-        """关闭vm.
-        Raises: urllib.error.HTTPError"""
-        if self.vm_manager is None or self.vm_key is None:
+        """关闭vm(开启请求结束之后),失败只记录日志."""
+        if self._client is None or self.vm_key is None:
             logger.warning("The vm is not managed by the script,ignore.")
-        else:
-            url = f"{self.vm_manager}/vms/{self.vm_key}/stop"
-            with urlopen(url, data=b"", timeout=120) as resp:
-                logger.info(f'Stop vm: {resp.read().decode("utf-8")}')
+            return
+        self._stop()
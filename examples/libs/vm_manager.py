@@ -0,0 +1,109 @@
+"""Client of the vm manager rest api.
+rest api: POST {server}/vms/{vm_key}/start 与 POST {server}/vms/{vm_key}/stop,
+start在vm启动完成后才返回.
+VmManagerClient在start与stop之间复用同一个HTTP/1.1 keep-alive连接,
+start_async在后台启动vm并返回readiness future,调用方可以同时启动浏览器,
+打开并登录Guacamole,仅在需要远程桌面之前等待vm:
+>>> client = VmManagerClient("http://192.168.254.139:8000")
+>>> ready = client.start_async("ie8")
+>>> ...  # launch browser, load Guacamole
+>>> ready.result(timeout=120)
+>>> client.stop("ie8")
+"""
+from __future__ import annotations
+
+import http.client
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Tuple
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class VmManagerClient:
+    """vm manager rest api的client,线程安全.
+    timeout: 每个请求的超时(s),start在vm启动完成后才返回，所以须大于vm的启动时间."""
+
+    def __init__(self, server: str, timeout: float = 120) -> None:
+        """不会立即连接server."""
+        url = urlsplit(server)
+        self.server = server.rstrip("/")
+        self.timeout = timeout
+        self._https = url.scheme == "https"
+        self._netloc = url.netloc
+        self._prefix = url.path.rstrip("/")
+        self._conn: http.client.HTTPConnection | None = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vm")
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            cls = (
+                http.client.HTTPSConnection
+                if self._https
+                else http.client.HTTPConnection
+            )
+            self._conn = cls(self._netloc, timeout=self.timeout)
+        return self._conn
+
+    def _reset(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _request(self, path: str) -> Tuple[http.client.HTTPResponse, str]:
+        conn = self._connection()
+        try:
+            conn.request("POST", f"{self._prefix}{path}", body=b"")
+            resp = conn.getresponse()
+            body = resp.read().decode("utf-8")
+        except BaseException:
+            self._reset()
+            raise
+        if resp.will_close:
+            self._reset()
+        return resp, body
+
+    def _post(self, path: str) -> str:
+        """POST并返回response body.
+        Raises: urllib.error.HTTPError"""
+        with self._lock:
+            try:
+                resp, body = self._request(path)
+            except (http.client.RemoteDisconnected, ConnectionError):
+                # server关闭了空闲的keep-alive连接，重新连接一次
+                resp, body = self._request(path)
+        if resp.status >= 400:
+            raise HTTPError(
+                f"{self.server}{path}", resp.status, body, resp.headers, None
+            )
+        return body
+
+    def start(self, vm_key: str) -> str:
+        """启动vm,在vm启动完成后返回.
+        Raises: urllib.error.HTTPError"""
+        result = self._post(f"/vms/{vm_key}/start")
+        logger.info(f"Start vm: {result}")
+        return result
+
+    def start_async(self, vm_key: str) -> Future[str]:
+        """在后台启动vm,返回的future在vm启动完成后完成."""
+        return self._executor.submit(self.start, vm_key)
+
+    def stop(self, vm_key: str) -> str:
+        """关闭vm.
+        Raises: urllib.error.HTTPError"""
+        result = self._post(f"/vms/{vm_key}/stop")
+        logger.info(f"Stop vm: {result}")
+        return result
+
+    def close(self) -> None:
+        """关闭连接，等待后台的start完成."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
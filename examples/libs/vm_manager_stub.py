@@ -0,0 +1,103 @@
+"""Local stand-in of the vm manager rest api.
+实现与vm manager相同的rest api(HTTP/1.1 keep-alive),start在boot_seconds后返回,
+用于在没有vm的情况下测试vm_context以及与vm启动并行的流程:
+>>> python -m libs.vm_manager_stub --port 8000 --boot-seconds 30
+>>> VM_RESTAPI=http://127.0.0.1:8000 python test_browser_in_guca.py
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PATH = re.compile(r"/vms/(?P<key>[^/]+)/(?P<action>start|stop)$")
+
+
+class VmManagerStub(ThreadingHTTPServer):
+    """vm manager的替身.
+    boot_seconds: start的耗时.
+    vms: 各vm的状态,"running"或者"stopped".
+    requests: 收到的请求(vm_key, action, 连接的client port),用于确认连接被复用."""
+
+    daemon_threads = True
+
+    def __init__(
+        self, address: Tuple[str, int] = ("127.0.0.1", 0), boot_seconds: float = 0
+    ) -> None:
+        """port为0时由系统分配，见url."""
+        super().__init__(address, _Handler)
+        self.boot_seconds = boot_seconds
+        self.vms: Dict[str, str] = {}
+        self.requests: List[Tuple[str, str, int]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """rest api的地址."""
+        host, port = self.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def serve_in_background(self) -> VmManagerStub:
+        """在daemon thread中运行."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: VmManagerStub
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        match = _PATH.match(self.path)
+        if match is None:
+            self._reply(404, f"no route {self.path}")
+            return
+        key, action = match["key"], match["action"]
+        with self.server._lock:
+            self.server.requests.append((key, action, self.client_address[1]))
+        if action == "start":
+            time.sleep(self.server.boot_seconds)
+        with self.server._lock:
+            self.server.vms[key] = "running" if action == "start" else "stopped"
+        self._reply(200, f"{key} {self.server.vms[key]}")
+
+    def _reply(self, status: int, body: str) -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """python -m libs.vm_manager_stub的入口."""
+    parser = argparse.ArgumentParser(prog="python -m libs.vm_manager_stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--boot-seconds", type=float, default=30)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG)
+    server = VmManagerStub((args.host, args.port), args.boot_seconds)
+    logger.info(f"vm manager stub at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,32 +6,24 @@ import os
 from pathlib import Path
 from typing import Optional
 
+from browser_guaca_screens import GuacaSession, WindowsBrowserScreen
 from libs.utils import preprocess_embeded_testweb as prepress
-from libs.utils import require_environ, vm_context
-from pyvirtualdisplay import Display
+from libs.utils import configure_bot_context, require_environ, vm_context
 
-logger = logging.getLogger(__name__)
-
-# workaround for mouseinfo 初始化的时候DISPLAY未知或者无法连接
-# 1. 先start VirtualDisplay,再引入pyautogui/mouseinfo依赖的包
-disp = Display(visible=False, size=(1440, 900), color_depth=24, use_xauth=True).start()
-from browser_guaca_screens import GuacaLoginScreen  # noqa: E402
-from browser_guaca_screens import WindowsBrowserScreen  # noqa: E402
-from libs.browser_bot import BrowserBot  # noqa: E402
-
-# # 2. 通过atexit.register注册关闭display的handler.
-# # 本module不会当成共用lib被其它modulee使用，所以不用这种方案
+from bot_click import LocationCache
 
-# 2. 在__main__函数中try finally中关闭即可，见__main__
+logger = logging.getLogger(__name__)
 
 
 @require_environ(["TESTWEB", "GUACA_URL", "BROWSER_NAME", "GUACA_BROWSER"])
-@vm_context(os.environ.get("VM_RESTAPI"), os.environ.get("GUACA_BROWSER"))
 def test_windows_browser(screenshots: Optional[Path]) -> None:
-    """Test IE/Edge through remote desktop."""
-    browser_name = os.environ.get("BROWSER_NAME")
-    guaca_browser = guaca_user = os.environ.get("GUACA_BROWSER")
-    guaca = os.environ.get("GUACA_URL")
+    """Test IE/Edge through remote desktop.
+    同一进程中的连续调用共享已登录的Guacamole session,仅在session不可用时重新登录.
+    首次登录时vm在后台开启，同时启动浏览器并填写Guacamole登录页面，仅在提交登录之前等待vm,
+    vm在进程退出时关闭."""
+    browser_name = os.environ.get("BROWSER_NAME", "")
+    guaca_browser = guaca_user = os.environ.get("GUACA_BROWSER", "")
+    guaca = os.environ.get("GUACA_URL", "")
 
     # Chrome doesn't honor policy PasswordManagerEnabled:false.
     # The Save Password bubble still show. Need to use --incognito.
@@ -40,10 +32,22 @@ def test_windows_browser(screenshots: Optional[Path]) -> None:
     # 故：推荐使用FF或者Chromium来测试Guacamole场景
     # extra_options = ["--incognito"] if browser_name == "Chrome" else None
     extra_options = None
+    # 设置LOCATION_CACHE时，页面元素位置跨run cache,相同分辨率下仅做局部确认
+    cache_path = os.environ.get("LOCATION_CACHE")
+    cache = LocationCache(cache_path) if cache_path else None
 
-    with BrowserBot.get(browser_name, extra_options).open(guaca) as browser:
-        GuacaLoginScreen(browser).login(guaca_user, "test", 120, screenshots)
-        with WindowsBrowserScreen.get(guaca_browser, browser).open(
+    session = GuacaSession.shared(
+        browser_name,
+        guaca,
+        guaca_user,
+        "test",
+        guaca_browser,
+        extra_options,
+        cache,
+        vm_context(os.environ.get("VM_RESTAPI"), guaca_browser, wait=False),
+    )
+    with session.lease() as browser:
+        with WindowsBrowserScreen.get(guaca_browser, browser, cache).open(
             timeout=120, log_screenshot_folder=screenshots
         ) as win_browser:
             _test_action(win_browser, os.environ.get("TESTWEB", ""), screenshots)
@@ -83,8 +87,6 @@ if __name__ == "__main__":
     )
     _screenshoot_evn = os.environ.get("SCREENSHOTS_FOLDER", None)
     screenshots = Path(_screenshoot_evn) if _screenshoot_evn and _DEBUG else None
-
-    try:
-        test_windows_browser(screenshots)
-    finally:
-        disp.stop()
+    configure_bot_context()
+    # Guacamole session自行启动Xvfb,并在进程退出时关闭
+    test_windows_browser(screenshots)
@@ -4,7 +4,8 @@ import os
 from pathlib import Path
 from typing import Optional
 
-from libs.utils import require_environ
+from libs.browser_bot import BrowserBot
+from libs.utils import configure_bot_context, require_environ
 from pyvirtualdisplay.display import Display
 
 logger = logging.getLogger(__name__)
@@ -12,14 +13,7 @@ logger = logging.getLogger(__name__)
 
 @require_environ(["BROWSER_NAME", "TESTWEB"])
 def test_click_link(screenshots: Optional[Path]) -> None:
-    """Test click link through the BrowserBot.
-    说明：此样例中，import放在函数内的原因为：
-    1. pyautogui依赖的mouseinfo，在引入与初始化时，依赖于环境变量DISPLAY,而该变量在
-    VirutalDisplay新建实例之前是未知以及无法连接的.
-    2. 使用IDE的自动补全功能.
-    其它workaround的方法，见test_browser_in_guaca.py"""
-    from libs.browser_bot import BrowserBot
-
+    """Test click link through the BrowserBot."""
     with BrowserBot.get(os.environ.get("BROWSER_NAME")).open(
         os.environ.get("TESTWEB")
     ) as browser:
@@ -42,5 +36,6 @@ if __name__ == "__main__":
     # 的时候使用
     _screenshoot_evn = os.environ.get("SCREENSHOTS_FOLDER", None)
     screenshot_folder = Path(_screenshoot_evn) if _screenshoot_evn and _DEBUG else None
+    configure_bot_context()
     with Display(visible=False, size=(1200, 800), color_depth=24, use_xauth=True):
         test_click_link(screenshot_folder)